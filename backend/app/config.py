@@ -11,6 +11,13 @@ class Settings:
     PORT: int = int(os.getenv("PORT", 8000))
     DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
     
+    # Pre-fork deployment settings (see gunicorn.conf.py)
+    WORKERS: int = int(os.getenv("WORKERS", 1))  # > 1 runs the pre-fork gunicorn server
+    PRELOAD_SESSIONS: int = int(os.getenv("PRELOAD_SESSIONS", 20))  # hot indexes loaded before fork and on worker start
+    PRELOAD_MEMORY_MB: int = int(os.getenv("PRELOAD_MEMORY_MB", 512))  # index memory budget for preloading (0 = none)
+    WARMUP_ON_START: bool = os.getenv("WARMUP_ON_START", "True").lower() == "true"  # background warm-up in each worker
+    TORCH_THREADS_PER_WORKER: int = int(os.getenv("TORCH_THREADS_PER_WORKER", 0))  # 0 = cores / workers
+    
     # CORS settings
     CORS_ORIGINS: list = [
         "http://localhost:5173",  # Vite default
@@ -23,8 +30,111 @@ class Settings:
     OPENROUTER_API_KEY: str = os.getenv("OPENROUTER_API_KEY", "")
     OPENROUTER_MODEL: str = os.getenv("OPENROUTER_MODEL", "google/gemma-3-27b-it:free")
     
+    # Upstream LLM limits (shared by all requests in a worker)
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))  # 0 = no rate limit
+    
+    # Admission control: concurrent requests and queued requests per endpoint group (0 = no limit)
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "True").lower() == "true"
+    ADMISSION_UPLOAD_CONCURRENCY: int = int(os.getenv("ADMISSION_UPLOAD_CONCURRENCY", 2))
+    ADMISSION_UPLOAD_QUEUE: int = int(os.getenv("ADMISSION_UPLOAD_QUEUE", 8))
+    ADMISSION_GENERATE_CONCURRENCY: int = int(os.getenv("ADMISSION_GENERATE_CONCURRENCY", 4))
+    ADMISSION_GENERATE_QUEUE: int = int(os.getenv("ADMISSION_GENERATE_QUEUE", 16))
+    ADMISSION_ASK_CONCURRENCY: int = int(os.getenv("ADMISSION_ASK_CONCURRENCY", 16))
+    ADMISSION_ASK_QUEUE: int = int(os.getenv("ADMISSION_ASK_QUEUE", 64))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))  # seconds a request may wait
+    
+    # Batch question paper generation
+    BATCH_MAX_PAPERS: int = int(os.getenv("BATCH_MAX_PAPERS", 12))
+    BATCH_PARALLEL_PAPERS: int = int(os.getenv("BATCH_PARALLEL_PAPERS", 3))
+    BATCH_OVERGENERATE: float = float(os.getenv("BATCH_OVERGENERATE", 0.3))  # extra questions asked per section for de-duplication
+    
+    # Batch question answering (/student/ask-batch)
+    ASK_BATCH_MAX_QUESTIONS: int = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", 50))
+    ASK_BATCH_PARALLEL: int = int(os.getenv("ASK_BATCH_PARALLEL", 4))  # LLM calls in flight per batch
+    ASK_BATCH_MERGE_MAX: int = int(os.getenv("ASK_BATCH_MERGE_MAX", 3))  # questions per merged LLM call (1 = no merging)
+    ASK_BATCH_MERGE_OVERLAP: float = float(os.getenv("ASK_BATCH_MERGE_OVERLAP", 0.5))  # shared chunks needed to merge
+    
+    # Structured output for question generation: auto, json_schema, json_object, off
+    # ("auto" uses json_schema and falls back to free text if the model rejects it)
+    STRUCTURED_OUTPUT: str = os.getenv("STRUCTURED_OUTPUT", "auto").lower()
+    STRUCTURED_MAX_REASKS: int = int(os.getenv("STRUCTURED_MAX_REASKS", 2))
+    
+    # Query caches (entries; 0 disables): query text -> embedding, query -> retrieved chunk rows
+    QUERY_CACHE_SIZE: int = int(os.getenv("QUERY_CACHE_SIZE", 2048))
+    RETRIEVAL_CACHE_SIZE: int = int(os.getenv("RETRIEVAL_CACHE_SIZE", 4096))
+    
     # Vector store settings
     VECTOR_STORE_PATH: str = os.getenv("VECTOR_STORE_PATH", "./vector_stores")
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "faiss").lower()  # faiss or sqlite
+    VECTOR_DB_PATH: str = os.getenv("VECTOR_DB_PATH", "./vectors.db")  # sqlite backend database
+    VECTOR_PRECISION: str = os.getenv("VECTOR_PRECISION", "float32").lower()  # float32, float16, int8 or binary
+    VECTOR_RESCORE_FACTOR: int = int(os.getenv("VECTOR_RESCORE_FACTOR", 4))  # binary: candidates rescored per result
+    
+    # Embedding runtime: torch (sentence-transformers) or onnx (onnxruntime,
+    # model exported with `python -m scripts.onnx_embeddings export`)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    ONNX_MODEL_DIR: str = os.getenv("ONNX_MODEL_DIR", "./models/all-MiniLM-L6-v2-onnx")
+    ONNX_QUANTIZED: bool = os.getenv("ONNX_QUANTIZED", "False").lower() == "true"  # int8 weights
+    ONNX_MIN_COSINE: float = float(os.getenv("ONNX_MIN_COSINE", 0.99))  # verified similarity to torch vectors
+    
+    # Session lifecycle (0 disables TTL expiry / a quota)
+    SESSION_DB_PATH: str = os.getenv("SESSION_DB_PATH", "./sessions.db")  # SQLite registry, keep on a local disk
+    SESSION_TTL_HOURS: float = float(os.getenv("SESSION_TTL_HOURS", 72))
+    SESSION_REAP_INTERVAL: int = int(os.getenv("SESSION_REAP_INTERVAL", 600))  # seconds, 0 disables the reaper
+    SESSION_DISK_QUOTA_MB: int = int(os.getenv("SESSION_DISK_QUOTA_MB", 0))
+    SESSION_USER_QUOTA_MB: int = int(os.getenv("SESSION_USER_QUOTA_MB", 0))
+    SESSION_TOUCH_INTERVAL: int = int(os.getenv("SESSION_TOUCH_INTERVAL", 60))  # seconds between last-access writes
+    SESSION_HEAT_HALF_LIFE_HOURS: float = float(os.getenv("SESSION_HEAT_HALF_LIFE_HOURS", 24))  # decay of access frequency
+    
+    # Chunking (tokens counted with the embedding model's tokenizer; all-MiniLM-L6-v2 truncates at 256)
+    CHUNK_TOKENS: int = int(os.getenv("CHUNK_TOKENS", 200))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", 0))
+    
+    # Questions whose best retrieval score (cosine similarity) is below this get
+    # the "not available" reply without an LLM call (0 = off). Thresholds
+    # calibrated per session with scripts/calibrate_answer_threshold.py override it.
+    ANSWER_MIN_SCORE: float = float(os.getenv("ANSWER_MIN_SCORE", 0))
+    
+    # Cross-encoder reranking of the chunks retrieved for a question
+    # (over-retrieve RERANK_CANDIDATES, send the best RERANK_TOP_K to the LLM)
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "False").lower() == "true"
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", 30))
+    RERANK_TOP_K: int = int(os.getenv("RERANK_TOP_K", 4))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", 16))
+    
+    # Question paper context: stratified (k-means clusters), mmr or similarity
+    PAPER_RETRIEVAL: str = os.getenv("PAPER_RETRIEVAL", "stratified").lower()
+    PAPER_CONTEXT_CHUNKS: int = int(os.getenv("PAPER_CONTEXT_CHUNKS", 10))
+    
+    # Document summary tree (built in the background after student uploads)
+    SUMMARY_TREE_ENABLED: bool = os.getenv("SUMMARY_TREE_ENABLED", "False").lower() == "true"
+    SUMMARY_MAP_CHARS: int = int(os.getenv("SUMMARY_MAP_CHARS", 8000))  # characters per map section
+    SUMMARY_REDUCE_FANOUT: int = int(os.getenv("SUMMARY_REDUCE_FANOUT", 6))
+    SUMMARY_PARALLEL: int = int(os.getenv("SUMMARY_PARALLEL", 4))
+    
+    # Question bank (pre-generated in the background after teacher uploads)
+    QUESTION_BANK_ENABLED: bool = os.getenv("QUESTION_BANK_ENABLED", "False").lower() == "true"
+    QUESTION_BANK_SIZE: int = int(os.getenv("QUESTION_BANK_SIZE", 30))  # questions per kind and difficulty
+    QUESTION_BANK_DIFFICULTIES: str = os.getenv("QUESTION_BANK_DIFFICULTIES", "medium")  # comma separated
+    QUESTION_BANK_GROUPS: int = int(os.getenv("QUESTION_BANK_GROUPS", 6))  # contexts questions are written from
+    QUESTION_BANK_PARALLEL: int = int(os.getenv("QUESTION_BANK_PARALLEL", 4))
+    QUESTION_BANK_MIN_SCORE: float = float(os.getenv("QUESTION_BANK_MIN_SCORE", 0.2))  # topic relevance (cosine)
+    
+    # Tracing settings (opt-in, requires opentelemetry-sdk)
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "False").lower() == "true"
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "file")  # file, otlp, console
+    TRACING_FILE_PATH: str = os.getenv("TRACING_FILE_PATH", "./traces/spans.jsonl")
+    TRACING_OTLP_ENDPOINT: str = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    TRACING_SAMPLE_RATE: float = float(os.getenv("TRACING_SAMPLE_RATE", 1.0))
+    
+    # Admin / profiling settings
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")  # admin endpoints are disabled when empty
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "./profiles")
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", 50))
+    SLOW_REQUEST_THRESHOLD: float = float(os.getenv("SLOW_REQUEST_THRESHOLD", 30.0))  # seconds, 0 disables
+    SLOW_REQUEST_SAMPLE_INTERVAL: float = float(os.getenv("SLOW_REQUEST_SAMPLE_INTERVAL", 0.05))
     
     # File upload settings
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
@@ -1,7 +1,15 @@
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from app.config import settings
-from app.routers import student, teacher
+from app.routers import student, teacher, sessions, admin
+from app.services.metrics import REQUEST_SECONDS, set_request_labels, render_metrics
+from app.services.tracing import init_tracing, request_span
+from app.services.profiling import slow_request_sampler
+from app.services.session_manager import start_reaper
+from app.services.admission import AdmissionMiddleware
+from app.startup import start_warmup, warmup_status
 
 # Create FastAPI app
 app = FastAPI(
@@ -10,6 +18,12 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Configure tracing (no-op unless TRACING_ENABLED)
+init_tracing()
+
+# Admission control for expensive endpoints (inside CORS so shed responses carry CORS headers)
+app.add_middleware(AdmissionMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +36,86 @@ app.add_middleware(
 # Include routers
 app.include_router(student.router)
 app.include_router(teacher.router)
+app.include_router(sessions.router)
+app.include_router(admin.router)
+
+
+def _route_template(scope: dict) -> str:
+    """Resolve the route path template for a request (keeps metric labels bounded)."""
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware that records request latency, labels stage metrics with
+    the route, opens the request span and profiles the request if it runs
+    past the slow threshold.
+
+    All of them end when the last body message is sent, so streamed
+    responses count until they are complete but the response's background
+    tasks, which run afterwards, do not.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = _route_template(scope)
+        set_request_labels(route=route, test_mode="none")
+        
+        start = time.perf_counter()
+        status = 500
+        finished = False
+
+        async with slow_request_sampler.track(f"{method} {route}") as profile:
+            with request_span(f"{method} {route}", **{"http.method": method, "http.route": route}) as s:
+
+                def finish():
+                    nonlocal finished
+                    if finished:
+                        return
+                    finished = True
+                    slow_request_sampler.finish(profile)
+                    if s is not None:
+                        s.set_attribute("http.status_code", status)
+                        s.end()
+                    REQUEST_SECONDS.labels(method, route, str(status)).observe(time.perf_counter() - start)
+
+                async def send_and_finish(message):
+                    nonlocal status
+                    if message["type"] == "http.response.start":
+                        status = message["status"]
+                    await send(message)
+                    if message["type"] == "http.response.body" and not message.get("more_body", False):
+                        finish()
+
+                try:
+                    await self.app(scope, receive, send_and_finish)
+                finally:
+                    finish()
+
+
+# Outermost middleware: times the whole request, including admission queueing
+app.add_middleware(RequestTimingMiddleware)
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """
+    Start the session reaper (TTL expiry and disk quotas) and the background
+    warm-up (embedding model and hot session indexes) in each worker.
+    """
+    start_reaper()
+    start_warmup()
 
 
 @app.get("/")
@@ -37,15 +131,28 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Health check endpoint (healthy while warming up; warm-up progress is reported alongside)."""
     return {
         "status": "healthy",
         "llm_provider": "openrouter",
-        "model": settings.OPENROUTER_MODEL
+        "model": settings.OPENROUTER_MODEL,
+        "warmup": warmup_status()
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics endpoint."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 if __name__ == "__main__":
+    if settings.WORKERS > 1:
+        # Multi-worker mode: hand over to gunicorn's pre-fork master
+        import os
+        os.execvp("gunicorn", ["gunicorn", "-c", "gunicorn.conf.py", "app.main:app"])
+    
     import uvicorn
     uvicorn.run(
         "app.main:app",
@@ -1,5 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List
+import re
+
+# Session ids are the uuid4 strings generated at upload
+SESSION_ID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+_SESSION_ID_FIELD = f"^{SESSION_ID_PATTERN.pattern}$"
 
 
 # -------------------------
@@ -9,12 +14,18 @@ from typing import Optional, List
 class QuestionRequest(BaseModel):
     """Request model for asking questions about uploaded PDF."""
     question: str
-    session_id: str
+    session_id: str = Field(pattern=_SESSION_ID_FIELD)
+
+
+class BatchQuestionRequest(BaseModel):
+    """Request model for asking several questions about the same PDF at once."""
+    session_id: str = Field(pattern=_SESSION_ID_FIELD)
+    questions: List[str] = Field(min_length=1)
 
 
 class QuestionPaperRequest(BaseModel):
     """Request model for teacher question paper generation."""
-    session_id: str
+    session_id: str = Field(pattern=_SESSION_ID_FIELD)
     topic: str
     num_questions: int = 10
     difficulty: str = "medium"
@@ -23,6 +34,17 @@ class QuestionPaperRequest(BaseModel):
     question_types: Optional[List[str]] = ["mcq", "short_answer", "long_answer"]
 
 
+class BatchQuestionPaperRequest(BaseModel):
+    """Request model for generating several question papers (topics x variants) at once."""
+    session_id: str = Field(pattern=_SESSION_ID_FIELD)
+    topics: List[str] = Field(min_length=1)
+    variants: int = Field(default=1, ge=1, le=10)
+    num_questions: int = 10
+    difficulty: str = "medium"
+    include_answers: bool = False
+    test_mode: str = "mcq"  # mcq, theory (short+long), hybrid
+
+
 # -------------------------
 # Response Models
 # -------------------------
@@ -35,11 +57,33 @@ class UploadResponse(BaseModel):
     filename: str
 
 
+class SourceChunk(BaseModel):
+    """A retrieved chunk with its position in the document."""
+    text: str
+    page: Optional[int] = None  # 1-based page the chunk starts on
+    page_end: Optional[int] = None
+    heading: Optional[str] = None
+    start: Optional[int] = None  # character offset in the start page
+    end: Optional[int] = None  # character offset in the end page
+
+
+class RerankReport(BaseModel):
+    """Cross-encoder reranking of the chunks retrieved for one question."""
+    candidates: int  # chunks retrieved for reranking
+    kept: int  # chunks sent to the LLM
+    latency_ms: float
+    context_tokens: int  # estimated tokens of the kept chunks
+    baseline_tokens: int  # estimated tokens of the context without reranking
+    tokens_saved: int
+
+
 class AnswerResponse(BaseModel):
     """Response model for Q&A."""
     success: bool
     answer: str
     sources: Optional[List[str]] = None
+    source_details: Optional[List[SourceChunk]] = None
+    rerank: Optional[RerankReport] = None
 
 
 class QuestionPaperResponse(BaseModel):
@@ -52,6 +96,62 @@ class QuestionPaperResponse(BaseModel):
     duration: Optional[str] = None
 
 
+# -------------------------
+# Structured LLM Output Models
+# -------------------------
+
+class GeneratedMCQ(BaseModel):
+    """One MCQ item as returned by the model in structured output mode."""
+    question: str = Field(min_length=5)
+    options: List[str] = Field(min_length=4, max_length=4)
+    answer: Optional[str] = None
+
+    @field_validator("options")
+    @classmethod
+    def strip_option_labels(cls, options: List[str]) -> List[str]:
+        # Models often include "A) " prefixes themselves
+        cleaned = [re.sub(r"^\s*[A-Da-d][\.\)\:]\s*", "", o).strip() for o in options]
+        if any(not o for o in cleaned):
+            raise ValueError("options must not be empty")
+        return cleaned
+
+    @field_validator("answer")
+    @classmethod
+    def answer_letter(cls, answer: Optional[str]) -> Optional[str]:
+        if answer is None:
+            return None
+        match = re.match(r"^\s*([A-Da-d])\b", answer)
+        if not match:
+            raise ValueError("answer must be one of A, B, C, D")
+        return match.group(1).upper()
+
+
+class GeneratedTheoryQuestion(BaseModel):
+    """One short/long answer item as returned by the model in structured output mode."""
+    question: str = Field(min_length=5)
+    answer: Optional[str] = None
+
+
+class SessionInfo(BaseModel):
+    """Metadata of an uploaded session."""
+    session_id: str
+    owner: str
+    kind: Optional[str] = None  # student or teacher
+    filename: Optional[str] = None
+    pages: Optional[int] = None
+    chunks: Optional[int] = None
+    created: float  # unix timestamps
+    last_accessed: float
+    size_bytes: int
+
+
+class SessionDeleteResponse(BaseModel):
+    """Response model for session deletion."""
+    success: bool
+    message: str
+    session_id: str
+
+
 class ErrorResponse(BaseModel):
     """Generic error response."""
     success: bool = False
@@ -0,0 +1,113 @@
+import os
+import secrets
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse
+from app.config import settings
+from app.services.backends import get_backend
+from app.services.query_cache import cache_stats
+from app.services.profiling import (
+    capture_cpu_profile, format_collapsed, save_profile, list_profiles,
+    start_heap_tracking, stop_heap_tracking, heap_snapshot
+)
+
+
+def require_admin(x_admin_token: str = Header(default="")):
+    """Allow the request only if it carries the configured admin token."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)],
+    include_in_schema=False
+)
+
+
+@router.post("/profile/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(10, gt=0, le=120),
+    interval_ms: float = Query(10, ge=1, le=1000)
+):
+    """
+    Capture a sampling CPU profile of this worker for the given duration.
+    Returns collapsed stacks (flamegraph format); a copy is stored in PROFILE_DIR.
+    """
+    samples = await run_in_threadpool(capture_cpu_profile, seconds, interval_ms / 1000)
+    content = format_collapsed(samples, header={
+        "duration_seconds": seconds,
+        "interval_seconds": interval_ms / 1000,
+        "pid": os.getpid(),
+    })
+    await run_in_threadpool(save_profile, f"cpu-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded", content)
+    return content
+
+
+@router.post("/heap/start")
+async def heap_start():
+    """Start tracemalloc heap tracking and take a baseline snapshot."""
+    start_heap_tracking()
+    return {"success": True, "tracking": True}
+
+
+@router.get("/heap/snapshot")
+async def heap_snapshot_endpoint(
+    limit: int = Query(25, ge=1, le=500),
+    reset_baseline: bool = False
+):
+    """Report the allocation sites with the largest growth since the baseline."""
+    try:
+        return await run_in_threadpool(heap_snapshot, limit, reset_baseline)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/heap/stop")
+async def heap_stop():
+    """Stop tracemalloc heap tracking."""
+    stop_heap_tracking()
+    return {"success": True, "tracking": False}
+
+
+@router.get("/profiles")
+async def get_profiles():
+    """List stored CPU and slow-request profiles."""
+    return {"profiles": await run_in_threadpool(list_profiles)}
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str):
+    """Download a stored profile."""
+    path = os.path.join(settings.PROFILE_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=os.path.basename(path))
+
+
+@router.get("/indexes")
+async def get_indexes():
+    """List the session indexes resident in this worker with their memory and disk size."""
+    backend = get_backend()
+    indexes = []
+    for session_id in backend.loaded_sessions():
+        try:
+            indexes.append({"session_id": session_id, **backend.stats(session_id)})
+        except ValueError:
+            continue
+    return {
+        "backend": backend.name,
+        "pid": os.getpid(),
+        "memory_bytes": sum(index["memory_bytes"] for index in indexes),
+        "indexes": indexes
+    }
+
+
+@router.get("/caches")
+async def get_caches():
+    """Size and hit rate of the query embedding and retrieval caches in this worker."""
+    return {"pid": os.getpid(), **cache_stats()}
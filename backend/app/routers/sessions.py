@@ -0,0 +1,44 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from app.models.schemas import SessionInfo, SessionDeleteResponse
+from app.services.session_manager import get_session, delete_session
+
+router = APIRouter(prefix="/sessions", tags=["Sessions"])
+
+
+def _get_owned_session(session_id: str, x_user_id: Optional[str]) -> dict:
+    """Look up a session, checking it belongs to the requesting user."""
+    metadata = get_session(session_id)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    # Sessions uploaded with an X-User-Id can only be managed by that user
+    if metadata["owner"] != "anonymous" and metadata["owner"] != x_user_id:
+        raise HTTPException(status_code=403, detail="Session belongs to another user")
+    return metadata
+
+
+@router.get("/{session_id}", response_model=SessionInfo)
+async def get_session_info(session_id: str, x_user_id: Optional[str] = Header(default=None)):
+    """
+    Get a session's metadata: owner, upload time, last access and disk size.
+    """
+    return SessionInfo(**_get_owned_session(session_id, x_user_id))
+
+
+@router.delete("/{session_id}", response_model=SessionDeleteResponse)
+async def delete_session_endpoint(session_id: str, x_user_id: Optional[str] = Header(default=None)):
+    """
+    Delete a session and its stored index.
+    Requests already using the session finish first; new requests get 404.
+    """
+    _get_owned_session(session_id, x_user_id)
+    
+    if not delete_session(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    return SessionDeleteResponse(
+        success=True,
+        message="Session deleted",
+        session_id=session_id
+    )
@@ -1,18 +1,36 @@
+import json
 import uuid
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.models.schemas import QuestionRequest, UploadResponse, AnswerResponse
-from app.services.pdf_service import extract_text_from_pdf, split_text_into_chunks
+from contextlib import closing
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.config import settings
+from app.models.schemas import QuestionRequest, BatchQuestionRequest, UploadResponse, AnswerResponse
+from app.services.pdf_service import extract_pages_from_pdf, pages_to_text, split_pages_into_chunks
 from app.services.vector_store import create_vector_store, session_exists
 from app.services.llm_service import answer_question
+from app.services.batch_qa import answer_questions_batch
+from app.services.summary_service import build_summary_tree, summary_question_kind, answer_from_summary
+from app.services.admission import admit, Overloaded
+from app.services.profiling import request_thread
+from app.services.session_manager import register_session, session_lease, SessionUnavailable
 
 router = APIRouter(prefix="/student", tags=["Student"])
 
 
 @router.post("/upload", response_model=UploadResponse)
-async def upload_pdf(file: UploadFile = File(...)):
+async def upload_pdf(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    x_user_id: Optional[str] = Header(default=None, max_length=128)
+):
     """
     Upload a PDF file for processing.
     Returns a session_id for subsequent queries.
+    The optional X-User-Id header assigns the session to a user for disk quotas.
+    When SUMMARY_TREE_ENABLED is set, the document summary tree is built
+    in the background after the response is sent.
     """
     # Validate file type
     if not file.filename.lower().endswith('.pdf'):
@@ -25,17 +43,32 @@ async def upload_pdf(file: UploadFile = File(...)):
         # Generate unique session ID
         session_id = str(uuid.uuid4())
         
-        # Extract text from PDF
-        text = extract_text_from_pdf(content)
+        # Extract text from PDF (pages are kept for the summary tree)
+        pages = await run_in_threadpool(request_thread(extract_pages_from_pdf), content)
+        text = pages_to_text(pages)
         
         if not text.strip():
             raise HTTPException(status_code=400, detail="Could not extract text from PDF")
         
-        # Split into chunks
-        chunks = split_text_into_chunks(text)
+        # Split into chunks (with page, heading and offset metadata)
+        chunks = await run_in_threadpool(request_thread(split_pages_into_chunks), pages)
         
-        # Create vector store
-        create_vector_store(chunks, session_id)
+        # Create vector store (the rest of each chunk dict is its metadata)
+        await run_in_threadpool(
+            request_thread(create_vector_store),
+            [chunk.pop("text") for chunk in chunks],
+            session_id,
+            metadatas=chunks
+        )
+        await run_in_threadpool(
+            request_thread(register_session),
+            session_id, x_user_id, "student", file.filename,
+            pages=len(pages), chunks=len(chunks)
+        )
+        
+        # Summarize the whole document once, for summary / key point questions
+        if settings.SUMMARY_TREE_ENABLED:
+            background_tasks.add_task(build_summary_tree, session_id, pages)
         
         return UploadResponse(
             success=True,
@@ -58,14 +91,82 @@ async def ask_question(request: QuestionRequest):
     if not session_exists(request.session_id):
         raise HTTPException(status_code=404, detail="Session not found. Please upload a PDF first.")
     
+    # The lease is taken and returned in the worker thread (registry writes stay off the event loop)
+    def answer_summary():
+        with session_lease(request.session_id):
+            return answer_from_summary(request.session_id, request.question)
+    
+    def answer():
+        with session_lease(request.session_id):
+            return answer_question(request.session_id, request.question, use_summary=False)
+    
     try:
-        result = answer_question(request.session_id, request.question)
+        # Summary and key point questions are answered from the precomputed
+        # tree without an LLM call, so they are not queued behind the ask gate
+        result = None
+        if summary_question_kind(request.question) is not None:
+            result = await run_in_threadpool(request_thread(answer_summary))
+        if result is None:
+            async with admit("ask"):
+                result = await run_in_threadpool(request_thread(answer))
         
         return AnswerResponse(
             success=True,
             answer=result["answer"],
-            sources=result.get("sources", [])[:2]  # Return first 2 source chunks
+            sources=result.get("sources", [])[:2],  # Return first 2 source chunks
+            source_details=result.get("source_details", [])[:2],
+            rerank=result.get("rerank")
         )
         
+    except SessionUnavailable:
+        # Deleted after the check above
+        raise HTTPException(status_code=404, detail="Session not found. Please upload a PDF first.")
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
+
+
+@router.post("/ask-batch")
+async def ask_questions(request: BatchQuestionRequest):
+    """
+    Ask several questions about the uploaded PDF in one request.
+    The questions share one embedding pass and one index search, and
+    questions about the same chunks are answered together. Answers stream
+    back as newline-delimited JSON, one line per question as it completes
+    (with its index in the request), followed by a summary line.
+    """
+    if not session_exists(request.session_id):
+        raise HTTPException(status_code=404, detail="Session not found. Please upload a PDF first.")
+    
+    if len(request.questions) > settings.ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions. Maximum is {settings.ASK_BATCH_MAX_QUESTIONS}."
+        )
+    
+    def stream():
+        completed = failed = 0
+        try:
+            # closing(): a disconnect closes the batch (and its executor) before the lease ends
+            with session_lease(request.session_id), \
+                    closing(answer_questions_batch(request.session_id, request.questions)) as results:
+                for result in results:
+                    if result["success"]:
+                        completed += 1
+                        answer = result.pop("result")
+                        result["response"] = AnswerResponse(
+                            success=True,
+                            answer=answer["answer"],
+                            sources=answer.get("sources", [])[:2],  # Return first 2 source chunks
+                            source_details=answer.get("source_details", [])[:2],
+                            rerank=answer.get("rerank")
+                        ).model_dump()
+                    else:
+                        failed += 1
+                    yield json.dumps(result) + "\n"
+        except Exception as e:
+            yield json.dumps({"success": False, "error": f"Error generating answers: {str(e)}"}) + "\n"
+        yield json.dumps({"done": True, "completed": completed, "failed": failed}) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
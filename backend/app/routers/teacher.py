@@ -1,20 +1,38 @@
+import json
 import uuid
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from contextlib import closing
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.config import settings
 from app.models.schemas import (
-    QuestionPaperRequest, UploadResponse, QuestionPaperResponse
+    QuestionPaperRequest, BatchQuestionPaperRequest, UploadResponse, QuestionPaperResponse
 )
-from app.services.pdf_service import extract_text_from_pdf, split_text_into_chunks
+from app.services.pdf_service import extract_pages_from_pdf, pages_to_text, split_pages_into_chunks
 from app.services.vector_store import create_vector_store, session_exists
 from app.services.llm_service import generate_question_paper
+from app.services.batch_generation import generate_papers_batch
+from app.services.question_bank import build_question_bank
+from app.services.metrics import set_request_labels
+from app.services.profiling import request_thread
+from app.services.session_manager import register_session, session_lease, SessionUnavailable
 
 router = APIRouter(prefix="/teacher", tags=["Teacher"])
 
 
 @router.post("/upload", response_model=UploadResponse)
-async def upload_topic_material(file: UploadFile = File(...)):
+async def upload_topic_material(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    x_user_id: Optional[str] = Header(default=None, max_length=128)
+):
     """
     Upload a PDF with topic material for question paper generation.
     Returns a session_id for generating question papers.
+    The optional X-User-Id header assigns the session to a user for disk quotas.
+    When QUESTION_BANK_ENABLED is set, the question bank is generated in the
+    background after the response is sent.
     """
     # Validate file type
     if not file.filename.lower().endswith('.pdf'):
@@ -28,16 +46,31 @@ async def upload_topic_material(file: UploadFile = File(...)):
         session_id = str(uuid.uuid4())
         
         # Extract text from PDF
-        text = extract_text_from_pdf(content)
+        pages = await run_in_threadpool(request_thread(extract_pages_from_pdf), content)
+        text = pages_to_text(pages)
         
         if not text.strip():
             raise HTTPException(status_code=400, detail="Could not extract text from PDF")
         
-        # Split into chunks
-        chunks = split_text_into_chunks(text)
+        # Split into chunks (with page, heading and offset metadata)
+        chunks = await run_in_threadpool(request_thread(split_pages_into_chunks), pages)
         
-        # Create vector store
-        create_vector_store(chunks, session_id)
+        # Create vector store (the rest of each chunk dict is its metadata)
+        await run_in_threadpool(
+            request_thread(create_vector_store),
+            [chunk.pop("text") for chunk in chunks],
+            session_id,
+            metadatas=chunks
+        )
+        await run_in_threadpool(
+            request_thread(register_session),
+            session_id, x_user_id, "teacher", file.filename,
+            pages=len(pages), chunks=len(chunks)
+        )
+        
+        # Pre-generate questions so papers can be assembled without waiting on the LLM
+        if settings.QUESTION_BANK_ENABLED:
+            background_tasks.add_task(build_question_bank, session_id)
         
         return UploadResponse(
             success=True,
@@ -59,16 +92,23 @@ async def generate_paper(request: QuestionPaperRequest):
     if not session_exists(request.session_id):
         raise HTTPException(status_code=404, detail="Session not found. Please upload topic material first.")
     
+    set_request_labels(test_mode=request.test_mode)
+    
+    # The lease is taken and returned in the worker thread (registry writes stay off the event loop)
+    def generate():
+        with session_lease(request.session_id):
+            return generate_question_paper(
+                session_id=request.session_id,
+                topic=request.topic,
+                num_questions=request.num_questions,
+                difficulty=request.difficulty,
+                include_answers=request.include_answers,
+                test_mode=request.test_mode,
+                question_types=request.question_types
+            )
+    
     try:
-        paper = generate_question_paper(
-            session_id=request.session_id,
-            topic=request.topic,
-            num_questions=request.num_questions,
-            difficulty=request.difficulty,
-            include_answers=request.include_answers,
-            test_mode=request.test_mode,
-            question_types=request.question_types
-        )
+        paper = await run_in_threadpool(request_thread(generate))
         
         return QuestionPaperResponse(
             success=True,
@@ -79,5 +119,61 @@ async def generate_paper(request: QuestionPaperRequest):
             duration=paper.get("duration")
         )
         
+    except SessionUnavailable:
+        # Deleted after the check above
+        raise HTTPException(status_code=404, detail="Session not found. Please upload topic material first.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating question paper: {str(e)}")
+
+
+@router.post("/generate-papers")
+async def generate_papers(request: BatchQuestionPaperRequest):
+    """
+    Generate question papers for several topics and variants in one request.
+    Papers stream back as newline-delimited JSON, one line per paper as it
+    completes, followed by a summary line.
+    """
+    if not session_exists(request.session_id):
+        raise HTTPException(status_code=404, detail="Session not found. Please upload topic material first.")
+    
+    if len(request.topics) * request.variants > settings.BATCH_MAX_PAPERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many papers requested. Maximum is {settings.BATCH_MAX_PAPERS} (topics x variants)."
+        )
+    
+    set_request_labels(test_mode=request.test_mode)
+    
+    def stream():
+        completed = failed = 0
+        try:
+            # closing(): a disconnect closes the batch (and its executor) before the lease ends
+            with session_lease(request.session_id), closing(generate_papers_batch(
+                session_id=request.session_id,
+                topics=request.topics,
+                variants=request.variants,
+                num_questions=request.num_questions,
+                difficulty=request.difficulty,
+                include_answers=request.include_answers,
+                test_mode=request.test_mode
+            )) as results:
+                for result in results:
+                    if result["success"]:
+                        completed += 1
+                        paper = result.pop("paper")
+                        result["paper"] = QuestionPaperResponse(
+                            success=True,
+                            title=paper.get("title", f"Question Paper - {result['topic']}"),
+                            instructions=paper.get("instructions", "Answer all questions carefully."),
+                            sections=paper.get("sections", []),
+                            total_marks=paper.get("total_marks", request.num_questions),
+                            duration=paper.get("duration")
+                        ).model_dump()
+                    else:
+                        failed += 1
+                    yield json.dumps(result) + "\n"
+        except Exception as e:
+            yield json.dumps({"success": False, "error": f"Error generating question papers: {str(e)}"}) + "\n"
+        yield json.dumps({"done": True, "completed": completed, "failed": failed}) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
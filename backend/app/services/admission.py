@@ -0,0 +1,194 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from starlette.responses import JSONResponse
+from app.config import settings
+from app.services.metrics import observe_stage, set_admission_depth, count_shed
+
+# Expensive endpoints and the gate that admits them. Other routes (health,
+# metrics, session metadata) are never queued or shed. /student/ask takes
+# the "ask" gate itself with admit(), after answering summary questions from
+# the precomputed tree without one.
+GATED_ROUTES = {
+    "/student/upload": "upload",
+    "/teacher/upload": "upload",
+    "/teacher/generate-paper": "generate",
+    "/teacher/generate-papers": "generate",
+    "/student/ask-batch": "ask",
+}
+
+# Gates of this process, shared by the middleware and admit()
+_gates: Optional[Dict[str, "AdmissionGate"]] = None
+
+
+class Overloaded(Exception):
+    """A request was shed: its gate's queue is full (429) or it waited past the deadline (503)."""
+
+    def __init__(self, gate: str, status_code: int, retry_after: int):
+        self.gate = gate
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = f"Server is busy ({gate}). Please retry in {retry_after} seconds."
+        super().__init__(f"{gate} is overloaded")
+
+
+class AdmissionGate:
+    """
+    Caps the concurrent requests of one endpoint group in this process.
+
+    Up to `limit` requests run at once and up to `queue_size` more wait, each
+    for at most `timeout` seconds. A request arriving at a full queue is
+    rejected immediately with 429; one that is still queued at its deadline
+    gets 503. Both carry a Retry-After estimated from the recent service time
+    and the queue length.
+
+    Gates live on the event loop of one worker (no locking needed).
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+        self._service_seconds: Optional[float] = None
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free (time for the queue ahead to drain)."""
+        service = self._service_seconds or self.timeout or 1.0
+        return max(1, math.ceil(service * (self.waiting + 1) / self.limit))
+
+    async def acquire(self):
+        """
+        Wait for a slot.
+
+        Raises:
+            Overloaded: If the queue is full or the deadline passes
+        """
+        if self._semaphore.locked() and self.waiting >= self.queue_size:
+            count_shed(self.name, "queue_full")
+            raise Overloaded(self.name, 429, self.retry_after())
+
+        start = time.perf_counter()
+        self.waiting += 1
+        set_admission_depth(self.name, self.waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout if self.timeout > 0 else None)
+        except asyncio.TimeoutError:
+            count_shed(self.name, "timeout")
+            raise Overloaded(self.name, 503, self.retry_after())
+        finally:
+            self.waiting -= 1
+            set_admission_depth(self.name, self.waiting)
+        observe_stage("admission_queue", time.perf_counter() - start)
+
+    def release(self, seconds: float):
+        """Free a slot and fold the request's service time into the estimate."""
+        self._semaphore.release()
+        if self._service_seconds is None:
+            self._service_seconds = seconds
+        else:
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * seconds
+
+
+def build_gates() -> Dict[str, AdmissionGate]:
+    """Create the gates configured in settings (a limit of 0 leaves a group ungated)."""
+    if not settings.ADMISSION_ENABLED:
+        return {}
+
+    limits = {
+        "upload": (settings.ADMISSION_UPLOAD_CONCURRENCY, settings.ADMISSION_UPLOAD_QUEUE),
+        "generate": (settings.ADMISSION_GENERATE_CONCURRENCY, settings.ADMISSION_GENERATE_QUEUE),
+        "ask": (settings.ADMISSION_ASK_CONCURRENCY, settings.ADMISSION_ASK_QUEUE),
+    }
+    return {
+        name: AdmissionGate(name, limit, queue_size, settings.ADMISSION_QUEUE_TIMEOUT)
+        for name, (limit, queue_size) in limits.items() if limit > 0
+    }
+
+
+def get_gates() -> Dict[str, AdmissionGate]:
+    """The gates of this process (created from settings on first use)."""
+    global _gates
+    if _gates is None:
+        _gates = build_gates()
+    return _gates
+
+
+@asynccontextmanager
+async def admit(name: str):
+    """
+    Hold a slot of a gate for a block, for handlers that only need one on
+    some paths (a gate with a limit of 0 or admission off lets everything in).
+
+    Raises:
+        Overloaded: If the gate's queue is full or the deadline passes
+    """
+    gate = get_gates().get(name)
+    if gate is None:
+        yield
+        return
+
+    await gate.acquire()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        gate.release(time.perf_counter() - start)
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that puts the gated routes behind their admission gate.
+
+    The slot is held until the response has been sent completely, so
+    streaming endpoints count as busy for as long as they stream, but not
+    while the response's background tasks run afterwards.
+    """
+
+    def __init__(self, app, gates: Optional[Dict[str, AdmissionGate]] = None):
+        self.app = app
+        self.gates = get_gates() if gates is None else gates
+
+    async def __call__(self, scope, receive, send):
+        gate = None
+        if scope["type"] == "http" and scope.get("method") == "POST":
+            gate = self.gates.get(GATED_ROUTES.get(scope["path"]))
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await gate.acquire()
+        except Overloaded as e:
+            response = JSONResponse(
+                status_code=e.status_code,
+                content={"detail": e.detail},
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                gate.release(time.perf_counter() - start)
+
+        # Free the slot once the last body message is sent: the app only
+        # returns after the response's background tasks have run
+        async def send_and_release(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, send_and_release)
+        finally:
+            release()
@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+from app.config import settings
+from app.services.session_registry import session_dir
+
+# Per-session threshold written by scripts/calibrate_answer_threshold.py
+CALIBRATION_FILE = "calibration.json"
+
+# Thresholds by session_id: (threshold or None, time to check the file again).
+# Re-checked periodically so a calibration written by the offline tool is
+# picked up by running workers.
+_thresholds: dict = {}
+_thresholds_lock = threading.Lock()
+_RECHECK_SECONDS = 60
+
+
+def _calibration_path(session_id: str) -> str:
+    return os.path.join(session_dir(session_id), CALIBRATION_FILE)
+
+
+def _read_calibration(session_id: str) -> Optional[float]:
+    try:
+        with open(_calibration_path(session_id), encoding="utf-8") as f:
+            return float(json.load(f)["threshold"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def get_answer_threshold(session_id: str) -> float:
+    """
+    Minimum best retrieval score for a question to be sent to the LLM.
+    
+    Returns:
+        The session's calibrated threshold, or ANSWER_MIN_SCORE (0 = no short-circuit)
+    """
+    now = time.monotonic()
+    
+    # Check in-memory cache first
+    cached = _thresholds.get(session_id)
+    if cached is None or cached[1] <= now:
+        cached = (_read_calibration(session_id), now + _RECHECK_SECONDS)
+        with _thresholds_lock:
+            _thresholds[session_id] = cached
+    
+    return cached[0] if cached[0] is not None else settings.ANSWER_MIN_SCORE
+
+
+def is_unanswerable(session_id: str, best_score: Optional[float]) -> bool:
+    """Whether retrieval is too weak for the PDF to contain the answer."""
+    threshold = get_answer_threshold(session_id)
+    if threshold <= 0:
+        return False
+    return best_score is None or best_score < threshold
+
+
+def save_answer_threshold(session_id: str, threshold: float, details: Optional[dict] = None):
+    """
+    Store a calibrated threshold next to the session index.
+    
+    Args:
+        session_id: Session identifier
+        threshold: Minimum best retrieval score
+        details: Calibration statistics to keep with it
+    """
+    path = _calibration_path(session_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"threshold": threshold, **(details or {})}, f, indent=2)
+    os.replace(tmp_path, path)
+    
+    with _thresholds_lock:
+        _thresholds[session_id] = (threshold, time.monotonic() + _RECHECK_SECONDS)
+
+
+def forget_answer_threshold(session_id: str):
+    """Drop a session's threshold from the in-memory cache."""
+    with _thresholds_lock:
+        _thresholds.pop(session_id, None)
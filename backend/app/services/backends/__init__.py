@@ -0,0 +1,40 @@
+# Vector Store Backends Package
+import threading
+from typing import Optional
+from app.config import settings
+from app.services.backends.base import VectorBackend
+
+BACKENDS = ("faiss", "sqlite")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name: str, precision: Optional[str] = None) -> VectorBackend:
+    """
+    Build a vector backend by name.
+
+    Args:
+        name: "faiss" (FAISS index files in each session directory) or
+            "sqlite" (NumPy brute force over one shared SQLite database)
+        precision: Storage precision (default: VECTOR_PRECISION)
+    """
+    precision = precision or settings.VECTOR_PRECISION
+    if name == "faiss":
+        from app.services.backends.faiss_backend import FaissBackend
+        from app.services.session_registry import session_dir
+        return FaissBackend(session_dir, precision, settings.VECTOR_RESCORE_FACTOR)
+    if name == "sqlite":
+        from app.services.backends.sqlite_backend import SqliteBackend
+        return SqliteBackend(settings.VECTOR_DB_PATH, precision, settings.VECTOR_RESCORE_FACTOR)
+    raise ValueError(f"Unknown vector backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+
+def get_backend() -> VectorBackend:
+    """Get the backend selected by VECTOR_BACKEND (created once per process)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(settings.VECTOR_BACKEND)
+    return _backend
@@ -0,0 +1,186 @@
+import itertools
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import numpy as np
+from app.services.backends.quantization import PRECISIONS, BYTES_PER_DIMENSION
+
+
+# Index versions are unique across sessions and backends, so a version is never reused
+_versions = itertools.count(1)
+
+
+class VectorBackend(ABC):
+    """
+    Stores the chunk embeddings of each session and searches them.
+
+    Rows are numbered in insertion order starting at 0. Distances are
+    squared L2 (the same metric as FAISS IndexFlatL2), smaller is closer.
+    Sessions are loaded into memory on first use and stay resident until
+    evict() is called. Below float32 precision, distances are computed on
+    the quantized vectors (binary codes only pick candidates, which are
+    then rescored with the float vectors).
+    """
+
+    name = "base"
+
+    # Whether the backend writes its data into the session directory
+    # (otherwise it lives in a shared database and is sized by stats())
+    stores_in_session_dir = True
+
+    def __init__(self, precision: str = "float32", rescore_factor: int = 4):
+        """
+        Args:
+            precision: Storage precision of new indexes (see quantization.PRECISIONS)
+            rescore_factor: With binary codes, candidates rescored per result
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown vector precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+        self.precision = precision
+        self.rescore_factor = max(1, rescore_factor)
+        self._lock = threading.RLock()
+        self._versions: dict = {}
+        self._sessions: dict = {}  # in-memory data by session_id
+
+    # -------------------------
+    # Writes
+    # -------------------------
+
+    @abstractmethod
+    def create(
+        self,
+        session_id: str,
+        texts: List[str],
+        vectors: np.ndarray,
+        metadatas: Optional[List[dict]] = None
+    ):
+        """Create (or replace) a session's index and keep it in memory."""
+
+    @abstractmethod
+    def append(
+        self,
+        session_id: str,
+        texts: List[str],
+        vectors: np.ndarray,
+        metadatas: Optional[List[dict]] = None
+    ) -> int:
+        """
+        Add chunks to an existing session.
+
+        Returns:
+            Total number of vectors in the session
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Remove a session's index from memory and storage."""
+
+    # -------------------------
+    # Reads
+    # -------------------------
+
+    def load(self, session_id: str) -> bool:
+        """Make a session resident in memory. Returns False if it is not stored."""
+        return self._resident(session_id) is not None
+
+    @abstractmethod
+    def _load(self, session_id: str):
+        """Read a session into memory (under the lock) and return its data, or None if it is not stored."""
+
+    @abstractmethod
+    def evict(self, session_id: str):
+        """Drop a session from memory (storage is kept)."""
+
+    @abstractmethod
+    def loaded_sessions(self) -> List[str]:
+        """Sessions currently resident in memory."""
+
+    def is_loaded(self, session_id: str) -> bool:
+        return session_id in self.loaded_sessions()
+
+    @abstractmethod
+    def search(self, session_id: str, query: np.ndarray, k: int) -> List[dict]:
+        """
+        Find the k nearest chunks to a query vector.
+
+        Returns:
+            List of {"row", "text", "metadata", "distance"}, nearest first
+        """
+
+    def search_batch(self, session_id: str, queries: np.ndarray, k: int) -> List[List[dict]]:
+        """
+        Find the k nearest chunks to each of several query vectors.
+
+        Args:
+            queries: (m, d) query matrix
+
+        Returns:
+            One result list per query, as returned by search()
+        """
+        return [self.search(session_id, query, k) for query in queries]
+
+    @abstractmethod
+    def vectors(self, session_id: str, rows: Optional[List[int]] = None) -> np.ndarray:
+        """Vectors of a session (all, or the given rows) as a float32 matrix in row order."""
+
+    @abstractmethod
+    def documents(self, session_id: str, rows: List[int]) -> List[dict]:
+        """Texts and metadata of the given rows: [{"row", "text", "metadata"}]."""
+
+    @abstractmethod
+    def stats(self, session_id: str) -> dict:
+        """
+        Size of a session's index.
+
+        Returns:
+            {"backend", "precision", "vectors", "dim", "memory_bytes", "disk_bytes"}
+        """
+
+    def estimate_memory(self, vectors: int, dim: int, text_bytes: int = 0) -> int:
+        """Approximate memory_bytes (see stats()) of a session before loading it, at this backend's precision."""
+        return int(vectors * dim * BYTES_PER_DIMENSION[self.precision]) + text_bytes
+
+    def version(self, session_id: str) -> int:
+        """
+        Version of a session's in-memory index (0 if never loaded).
+
+        It changes whenever the index is created, appended to, loaded or
+        dropped, so results cached under an older version are never reused.
+        """
+        return self._versions.get(session_id, 0)
+
+    def _changed(self, session_id: str):
+        self._versions[session_id] = next(_versions)
+
+    def _resident(self, session_id: str):
+        """In-memory data of a session, loaded if needed (None if it is not stored)."""
+        session = self._sessions.get(session_id)
+        return session if session is not None else self._load(session_id)
+
+    def _require(self, session_id: str):
+        """
+        In-memory data of a session, loaded if needed.
+
+        Readers keep the returned reference instead of indexing _sessions
+        again, so a concurrent evict() cannot pull the session from under them.
+
+        Raises:
+            ValueError: If the session is not stored (the error vector_store callers expect)
+        """
+        session = self._resident(session_id)
+        if session is None:
+            raise ValueError(f"No vector store found for session: {session_id}")
+        return session
+
+
+def top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k smallest distances, nearest first."""
+    k = min(k, len(distances))
+    if k <= 0:
+        return np.empty(0, dtype="int64")
+    if k < len(distances):
+        candidates = np.argpartition(distances, k - 1)[:k]
+    else:
+        candidates = np.arange(len(distances))
+    return candidates[np.argsort(distances[candidates], kind="stable")]
+
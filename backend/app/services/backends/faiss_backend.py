@@ -0,0 +1,269 @@
+import json
+import os
+from typing import List, Optional
+import numpy as np
+from app.services.backends.base import VectorBackend
+from app.services.backends.quantization import binary_codes, rescore
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.json"
+
+# Float vectors of binary indexes, memory-mapped for rescoring
+VECTORS_FILE = "vectors.npy"
+
+# Written by the LangChain FAISS wrapper used before the backends existed
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+_FILES = (INDEX_FILE, CHUNKS_FILE, VECTORS_FILE)
+
+
+class _Session:
+    __slots__ = ("index", "texts", "metadatas", "precision", "dim", "center", "floats")
+
+    def __init__(self, index, texts: List[str], metadatas: List[dict], precision: str = "float32",
+                 dim: Optional[int] = None, center: Optional[np.ndarray] = None, floats=None):
+        self.index = index
+        self.texts = texts
+        self.metadatas = metadatas
+        self.precision = precision
+        self.dim = dim or index.d
+        self.center = center
+        self.floats = floats
+
+
+class FaissBackend(VectorBackend):
+    """
+    Search with a FAISS index per session.
+
+    Each session directory holds index.faiss and chunks.json (texts,
+    metadata in row order and the index precision). The precision of an
+    index is fixed when it is created:
+
+    - float32: IndexFlatL2 (exact)
+    - float16 / int8: IndexScalarQuantizer (QT_fp16 / per-dimension QT_8bit)
+    - binary: IndexBinaryFlat over sign codes; the top candidates are
+      rescored with the float vectors in vectors.npy, which is memory-mapped
+      rather than loaded
+
+    Directories written by the LangChain FAISS wrapper (index.faiss +
+    index.pkl) are read and converted on first load.
+    """
+
+    name = "faiss"
+
+    def __init__(self, session_path, precision: str = "float32", rescore_factor: int = 4):
+        """
+        Args:
+            session_path: Function mapping a session id to its directory
+            precision: Storage precision of new indexes
+            rescore_factor: With binary codes, candidates rescored per result
+        """
+        super().__init__(precision, rescore_factor)
+        self._session_path = session_path
+
+    # -------------------------
+    # Writes
+    # -------------------------
+
+    def create(self, session_id, texts, vectors, metadatas=None):
+        import faiss
+
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        dim = vectors.shape[1]
+        center = floats = None
+
+        if self.precision == "binary":
+            center = vectors.mean(axis=0)
+            codes = binary_codes(vectors, center)
+            index = faiss.IndexBinaryFlat(codes.shape[1] * 8)
+            index.add(codes)
+            floats = vectors
+        elif self.precision == "float32":
+            index = faiss.IndexFlatL2(dim)
+            index.add(vectors)
+        else:
+            qtype = faiss.ScalarQuantizer.QT_fp16 if self.precision == "float16" else faiss.ScalarQuantizer.QT_8bit
+            index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+            index.train(vectors)
+            index.add(vectors)
+
+        session = _Session(
+            index, list(texts), list(metadatas or [{} for _ in texts]),
+            self.precision, dim, center, floats
+        )
+        with self._lock:
+            self._save(session_id, session)
+            self._sessions[session_id] = session
+            self._changed(session_id)
+
+    def append(self, session_id, texts, vectors, metadatas=None):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        with self._lock:
+            session = self._require(session_id)
+            if session.precision == "binary":
+                session.index.add(binary_codes(vectors, session.center))
+                session.floats = np.concatenate([session.floats, vectors])
+            else:
+                session.index.add(vectors)
+            session.texts.extend(texts)
+            session.metadatas.extend(metadatas or [{} for _ in texts])
+            self._save(session_id, session)
+            self._changed(session_id)
+            return session.index.ntotal
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._changed(session_id)
+            path = self._session_path(session_id)
+            for name in _FILES + (LEGACY_DOCSTORE_FILE,):
+                try:
+                    os.remove(os.path.join(path, name))
+                except FileNotFoundError:
+                    pass
+
+    def _save(self, session_id: str, session: _Session):
+        import faiss
+
+        path = self._session_path(session_id)
+        os.makedirs(path, exist_ok=True)
+
+        # Write every file under a temporary name so readers never see a partial index
+        chunks = {"texts": session.texts, "metadatas": session.metadatas, "precision": session.precision}
+        if session.precision == "binary":
+            chunks["dim"] = session.dim
+            chunks["center"] = session.center.tolist()
+            with open(os.path.join(path, VECTORS_FILE + ".tmp"), "wb") as f:
+                np.save(f, np.asarray(session.floats, dtype="float32"))
+            faiss.write_index_binary(session.index, os.path.join(path, INDEX_FILE + ".tmp"))
+        else:
+            faiss.write_index(session.index, os.path.join(path, INDEX_FILE + ".tmp"))
+        with open(os.path.join(path, CHUNKS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+            json.dump(chunks, f)
+
+        if session.precision == "binary":
+            os.replace(os.path.join(path, VECTORS_FILE + ".tmp"), os.path.join(path, VECTORS_FILE))
+            # Keep the float vectors on disk instead of in memory
+            session.floats = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        os.replace(os.path.join(path, CHUNKS_FILE + ".tmp"), os.path.join(path, CHUNKS_FILE))
+        os.replace(os.path.join(path, INDEX_FILE + ".tmp"), os.path.join(path, INDEX_FILE))
+
+    # -------------------------
+    # Reads
+    # -------------------------
+
+    def _load(self, session_id):
+        import faiss
+
+        path = self._session_path(session_id)
+        index_file = os.path.join(path, INDEX_FILE)
+        if not os.path.exists(index_file):
+            return None
+
+        with self._lock:
+            if session_id in self._sessions:
+                return self._sessions[session_id]
+
+            chunks_file = os.path.join(path, CHUNKS_FILE)
+            if os.path.exists(chunks_file):
+                with open(chunks_file, encoding="utf-8") as f:
+                    chunks = json.load(f)
+                precision = chunks.get("precision", "float32")
+                if precision == "binary":
+                    session = _Session(
+                        faiss.read_index_binary(index_file), chunks["texts"], chunks["metadatas"], precision,
+                        chunks["dim"], np.asarray(chunks["center"], dtype="float32"),
+                        np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+                    )
+                else:
+                    session = _Session(faiss.read_index(index_file), chunks["texts"], chunks["metadatas"], precision)
+            else:
+                index = faiss.read_index(index_file)
+                session = _Session(index, *self._read_legacy_docstore(path, index.ntotal))
+                self._save(session_id, session)
+
+            self._sessions[session_id] = session
+            self._changed(session_id)
+            return session
+
+    @staticmethod
+    def _read_legacy_docstore(path: str, count: int) -> tuple:
+        """Read texts and metadata from a LangChain FAISS docstore pickle."""
+        import pickle
+
+        with open(os.path.join(path, LEGACY_DOCSTORE_FILE), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        documents = [docstore.search(index_to_docstore_id[row]) for row in range(count)]
+        return [doc.page_content for doc in documents], [dict(doc.metadata) for doc in documents]
+
+    def evict(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._changed(session_id)
+
+    def loaded_sessions(self):
+        return list(self._sessions)
+
+    def search(self, session_id, query, k):
+        return self.search_batch(session_id, np.asarray(query, dtype="float32").reshape(1, -1), k)[0]
+
+    def search_batch(self, session_id, queries, k):
+        session = self._require(session_id)
+        queries = np.ascontiguousarray(queries, dtype="float32")
+
+        # One FAISS call for all queries
+        if session.precision == "binary":
+            _, candidates = session.index.search(
+                binary_codes(queries, session.center), min(k * self.rescore_factor, session.index.ntotal)
+            )
+            results = []
+            for query, rows in zip(queries, candidates):
+                rows = rows[rows >= 0]
+                results.append(self._results(session, *rescore(query, rows, session.floats[rows], k)))
+            return results
+
+        distances, rows = session.index.search(queries, min(k, session.index.ntotal))
+        return [self._results(session, r, d) for r, d in zip(rows, distances)]
+
+    @staticmethod
+    def _results(session: _Session, rows, distances) -> List[dict]:
+        return [
+            {
+                "row": int(row),
+                "text": session.texts[row],
+                "metadata": session.metadatas[row],
+                "distance": float(distance)
+            }
+            for row, distance in zip(rows, distances) if row >= 0
+        ]
+
+    def vectors(self, session_id, rows=None):
+        session = self._require(session_id)
+        if session.precision == "binary":
+            floats = session.floats if rows is None else session.floats[np.asarray(rows, dtype="int64")]
+            return np.asarray(floats, dtype="float32")
+        if rows is None:
+            return session.index.reconstruct_n(0, session.index.ntotal)
+        if len(rows) == 0:
+            return np.empty((0, session.dim), dtype="float32")
+        return session.index.reconstruct_batch(np.asarray(rows, dtype="int64"))
+
+    def documents(self, session_id, rows):
+        session = self._require(session_id)
+        return [{"row": row, "text": session.texts[row], "metadata": session.metadatas[row]} for row in rows]
+
+    def stats(self, session_id):
+        session = self._require(session_id)
+        path = self._session_path(session_id)
+        disk = sum(
+            os.path.getsize(os.path.join(path, name))
+            for name in _FILES if os.path.exists(os.path.join(path, name))
+        )
+        return {
+            "backend": self.name,
+            "precision": session.precision,
+            "vectors": session.index.ntotal,
+            "dim": session.dim,
+            "memory_bytes": session.index.ntotal * session.index.code_size + sum(len(t) for t in session.texts),
+            "disk_bytes": disk
+        }
@@ -0,0 +1,138 @@
+import copy
+from typing import Optional
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8", "binary")
+
+# In-memory bytes per vector dimension at each precision
+BYTES_PER_DIMENSION = {"float32": 4, "float16": 2, "int8": 1, "binary": 0.125}
+
+# Number of set bits in every byte value, for Hamming distances
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype="uint8")
+
+
+def binary_codes(vectors: np.ndarray, center: np.ndarray) -> np.ndarray:
+    """One bit per dimension (above the center or not), packed into bytes."""
+    return np.packbits(np.atleast_2d(vectors) > center, axis=1)
+
+
+def hamming(codes: np.ndarray, code: np.ndarray) -> np.ndarray:
+    """Hamming distances from one packed code to every row of codes."""
+    return _POPCOUNT[np.bitwise_xor(codes, code)].sum(axis=1, dtype="int32")
+
+
+def rescore(query: np.ndarray, rows: np.ndarray, vectors: np.ndarray, k: int) -> tuple:
+    """
+    Re-rank candidate rows by exact squared L2 distance.
+
+    Args:
+        query: (d,) query vector
+        rows: Candidate row indices
+        vectors: (len(rows), d) float vectors of the candidates
+        k: Number of results to keep
+
+    Returns:
+        Tuple of (rows, distances), nearest first
+    """
+    distances = ((np.asarray(vectors, dtype="float32") - query) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return np.asarray(rows)[order], distances[order]
+
+
+class QuantizedVectors:
+    """
+    A matrix of vectors held in memory at reduced precision.
+
+    - float32: as given (4 bytes per dimension)
+    - float16: half precision (2 bytes)
+    - int8: per-dimension min/max scalar quantization to 256 levels (1 byte)
+    - binary: one bit per dimension; distances() returns Hamming distances,
+      which only rank candidates for rescoring with the float vectors
+    """
+
+    def __init__(self, vectors: np.ndarray, precision: str = "float32"):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown vector precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        self.precision = precision
+        self.dim = vectors.shape[1]
+
+        if precision == "int8":
+            self.low = vectors.min(axis=0)
+            self.scale = (vectors.max(axis=0) - self.low) / 255
+            self.scale[self.scale == 0] = 1.0
+        elif precision == "binary":
+            self.center = vectors.mean(axis=0)
+
+        self.codes = self._encode(vectors)
+        self.norms = self._norms(self.codes)
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.precision == "float16":
+            return vectors.astype("float16")
+        if self.precision == "int8":
+            return np.clip(np.rint((vectors - self.low) / self.scale), 0, 255).astype("uint8")
+        if self.precision == "binary":
+            return binary_codes(vectors, self.center)
+        return vectors
+
+    def _norms(self, codes: np.ndarray) -> Optional[np.ndarray]:
+        if self.precision == "binary":
+            return None
+        decoded = self._decode(codes)
+        return (decoded * decoded).sum(axis=1)
+
+    def _decode(self, codes: np.ndarray) -> np.ndarray:
+        if self.precision == "int8":
+            return self.low + codes.astype("float32") * self.scale
+        return codes.astype("float32", copy=False)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.norms.nbytes if self.norms is not None else 0)
+
+    def extended(self, vectors: np.ndarray) -> "QuantizedVectors":
+        """
+        A copy with rows added, encoded with the existing quantization
+        parameters (this instance is left unchanged for concurrent readers).
+        """
+        codes = self._encode(np.ascontiguousarray(vectors, dtype="float32"))
+        result = copy.copy(self)
+        result.codes = np.concatenate([self.codes, codes])
+        if self.norms is not None:
+            result.norms = np.concatenate([self.norms, self._norms(codes)])
+        return result
+
+    def decode(self, rows=None) -> Optional[np.ndarray]:
+        """Float32 approximation of the vectors (None for binary codes)."""
+        if self.precision == "binary":
+            return None
+        return self._decode(self.codes if rows is None else self.codes[rows])
+
+    def distances_batch(self, queries: np.ndarray) -> np.ndarray:
+        """Distances from each query to every row, as an (m, n) matrix (see distances())."""
+        if self.precision == "binary":
+            return np.vstack([self.distances(query) for query in queries])
+        if self.precision == "int8":
+            dots = (queries * self.scale) @ self.codes.T + (queries @ self.low)[:, None]
+        else:
+            dots = queries @ self.codes.T
+        return self.norms[None, :] - 2.0 * dots + (queries * queries).sum(axis=1)[:, None]
+
+    def distances(self, query: np.ndarray) -> np.ndarray:
+        """
+        Distances from a query to every row: squared L2 to the stored
+        (dequantized) vectors, or Hamming distances for binary codes.
+        """
+        if self.precision == "binary":
+            return hamming(self.codes, binary_codes(query, self.center)[0])
+        if self.precision == "int8":
+            # x = low + code * scale, so x.q = low.q + code.(scale * q)
+            dots = self.codes @ (self.scale * query) + float(self.low @ query)
+        else:
+            dots = self.codes @ query
+        return self.norms - 2.0 * dots + float(query @ query)
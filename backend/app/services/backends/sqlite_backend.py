@@ -0,0 +1,240 @@
+import json
+import os
+import sqlite3
+from typing import List
+import numpy as np
+from app.services.backends.base import VectorBackend, top_k
+from app.services.backends.quantization import QuantizedVectors, rescore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    session_id TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (session_id, row)
+) WITHOUT ROWID;
+"""
+
+
+class _Session:
+    __slots__ = ("vectors", "texts", "metadatas")
+
+    def __init__(self, vectors: QuantizedVectors, texts: List[str], metadatas: List[dict]):
+        self.vectors = vectors
+        self.texts = texts
+        self.metadatas = metadatas
+
+
+class SqliteBackend(VectorBackend):
+    """
+    Brute-force NumPy search over vectors stored in one SQLite database.
+
+    All sessions share a single database file (WAL mode) instead of
+    per-session files. WAL needs shared memory between the processes using
+    the database, so it must be on a local disk: the backend serves the
+    workers of one host, not several hosts. A session is read into a matrix on first use; search is one
+    matrix-vector product, equivalent to IndexFlatL2 at float32 precision.
+
+    Vectors are always stored as float32, and the precision only applies to
+    the in-memory copy, so changing it takes effect when a session is next
+    loaded. Binary codes are rescored with the stored float vectors.
+    """
+
+    name = "sqlite"
+    stores_in_session_dir = False
+
+    def __init__(self, db_path: str, precision: str = "float32", rescore_factor: int = 4):
+        super().__init__(precision, rescore_factor)
+        self.db_path = db_path
+        self._conn = None
+        self._conn_pid = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database (again after a fork: connections must not cross processes)."""
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        directory = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(_SCHEMA)
+        self._conn, self._conn_pid = conn, os.getpid()
+        return conn
+
+    # -------------------------
+    # Writes
+    # -------------------------
+
+    def create(self, session_id, texts, vectors, metadatas=None):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        metadatas = list(metadatas or [{} for _ in texts])
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM chunks WHERE session_id = ?", (session_id,))
+                self._insert(conn, session_id, 0, texts, vectors, metadatas)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._sessions[session_id] = _Session(QuantizedVectors(vectors, self.precision), list(texts), metadatas)
+            self._changed(session_id)
+
+    def append(self, session_id, texts, vectors, metadatas=None):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        metadatas = list(metadatas or [{} for _ in texts])
+        with self._lock:
+            session = self._require(session_id)
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._insert(conn, session_id, len(session.texts), texts, vectors, metadatas)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._sessions[session_id] = _Session(
+                session.vectors.extended(vectors),
+                session.texts + list(texts),
+                session.metadatas + metadatas
+            )
+            self._changed(session_id)
+            return len(session.texts) + len(texts)
+
+    @staticmethod
+    def _insert(conn, session_id, start, texts, vectors, metadatas):
+        conn.executemany(
+            "INSERT INTO chunks (session_id, row, text, metadata, vector) VALUES (?, ?, ?, ?, ?)",
+            (
+                (session_id, start + offset, text, json.dumps(metadata), vector.tobytes())
+                for offset, (text, vector, metadata) in enumerate(zip(texts, vectors, metadatas))
+            )
+        )
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._changed(session_id)
+            self._connect().execute("DELETE FROM chunks WHERE session_id = ?", (session_id,))
+
+    # -------------------------
+    # Reads
+    # -------------------------
+
+    def _load(self, session_id):
+        with self._lock:
+            if session_id in self._sessions:
+                return self._sessions[session_id]
+            rows = self._connect().execute(
+                "SELECT text, metadata, vector FROM chunks WHERE session_id = ? ORDER BY row",
+                (session_id,)
+            ).fetchall()
+            if not rows:
+                return None
+
+            vectors = np.frombuffer(b"".join(row[2] for row in rows), dtype="float32").reshape(len(rows), -1)
+            session = self._sessions[session_id] = _Session(
+                QuantizedVectors(vectors, self.precision),
+                [row[0] for row in rows],
+                [json.loads(row[1]) for row in rows]
+            )
+            self._changed(session_id)
+            return session
+
+    def evict(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._changed(session_id)
+
+    def loaded_sessions(self):
+        return list(self._sessions)
+
+    def search(self, session_id, query, k):
+        session = self._require(session_id)
+        query = np.asarray(query, dtype="float32")
+        distances = session.vectors.distances(query)
+
+        if session.vectors.precision == "binary":
+            candidates = top_k(distances, k * self.rescore_factor)
+            rows, distances = rescore(query, candidates, self._read_vectors(session_id, session.vectors.dim, candidates), k)
+        else:
+            rows = top_k(distances, k)
+            distances = distances[rows]
+        return self._results(session, rows, distances)
+
+    def search_batch(self, session_id, queries, k):
+        session = self._require(session_id)
+        if session.vectors.precision == "binary":
+            return super().search_batch(session_id, queries, k)
+
+        # One matrix product for all queries
+        distances = session.vectors.distances_batch(np.asarray(queries, dtype="float32"))
+        results = []
+        for row_distances in distances:
+            rows = top_k(row_distances, k)
+            results.append(self._results(session, rows, row_distances[rows]))
+        return results
+
+    @staticmethod
+    def _results(session: _Session, rows, distances) -> List[dict]:
+        return [
+            {
+                "row": int(row),
+                "text": session.texts[row],
+                "metadata": session.metadatas[row],
+                "distance": float(distance)
+            }
+            for row, distance in zip(rows, distances)
+        ]
+
+    def vectors(self, session_id, rows=None):
+        vectors = self._require(session_id).vectors
+        if vectors.precision == "binary":
+            return self._read_vectors(session_id, vectors.dim, rows)
+        return vectors.decode(rows)
+
+    def _read_vectors(self, session_id: str, dim: int, rows=None) -> np.ndarray:
+        """Float32 vectors from the database (all, or the given rows in that order)."""
+        with self._lock:
+            conn = self._connect()
+            if rows is None:
+                blobs = [row[0] for row in conn.execute(
+                    "SELECT vector FROM chunks WHERE session_id = ? ORDER BY row", (session_id,)
+                )]
+            elif len(rows) == 0:
+                blobs = []
+            else:
+                rows = [int(row) for row in rows]
+                found = dict(conn.execute(
+                    f"SELECT row, vector FROM chunks WHERE session_id = ? AND row IN ({', '.join('?' * len(rows))})",
+                    [session_id, *rows]
+                ).fetchall())
+                blobs = [found[row] for row in rows]
+        return np.frombuffer(b"".join(blobs), dtype="float32").reshape(len(blobs), dim)
+
+    def documents(self, session_id, rows):
+        session = self._require(session_id)
+        return [{"row": row, "text": session.texts[row], "metadata": session.metadatas[row]} for row in rows]
+
+    def stats(self, session_id):
+        session = self._require(session_id)
+        with self._lock:
+            disk = self._connect().execute(
+                "SELECT COALESCE(SUM(LENGTH(vector) + LENGTH(text) + LENGTH(metadata)), 0) "
+                "FROM chunks WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()[0]
+        return {
+            "backend": self.name,
+            "precision": session.vectors.precision,
+            "vectors": len(session.vectors),
+            "dim": session.vectors.dim,
+            "memory_bytes": session.vectors.nbytes + sum(len(t) for t in session.texts),
+            "disk_bytes": disk
+        }
@@ -0,0 +1,114 @@
+import math
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from typing import Iterator, List
+from app.config import settings
+from app.services.llm_service import generate_question_paper, retrieve_paper_chunks
+from app.services.profiling import request_thread
+
+_NON_WORD = re.compile(r"\W+")
+
+
+class QuestionPool:
+    """
+    Keeps questions unique across the variants (sets) of one topic.
+
+    Each section asks the LLM for a few extra questions; claim() then keeps
+    only questions no other variant has claimed yet, up to the section size.
+    Variants run concurrently, so claims are made under a lock.
+    """
+
+    def __init__(self, overgenerate: float = 0.0):
+        self.overgenerate = overgenerate
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def request_count(self, count: int) -> int:
+        """Number of questions to ask the LLM for a section of `count` questions."""
+        if self.overgenerate <= 0:
+            return count
+        return count + max(1, math.ceil(count * self.overgenerate))
+
+    def claim(self, questions: List[dict], count: int) -> List[dict]:
+        """
+        Keep up to `count` questions not already used by another variant.
+
+        Returns:
+            Renumbered copies of the accepted questions
+        """
+        accepted = []
+        with self._lock:
+            for question in questions:
+                if len(accepted) >= count:
+                    break
+                key = _NON_WORD.sub(" ", question.get("question", "").lower()).strip()
+                if key in self._seen:
+                    continue
+                self._seen.add(key)
+                accepted.append(question)
+        return [{**q, "number": number} for number, q in enumerate(accepted, start=1)]
+
+
+def generate_papers_batch(
+    session_id: str,
+    topics: List[str],
+    variants: int = 1,
+    num_questions: int = 10,
+    difficulty: str = "medium",
+    include_answers: bool = False,
+    test_mode: str = "mcq"
+) -> Iterator[dict]:
+    """
+    Generate question papers for several topics and variants.
+
+    Retrieval runs once per topic and is shared by its variants. Papers are
+    generated concurrently (BATCH_PARALLEL_PAPERS at a time, with LLM calls
+    bounded by the upstream limiter) and yielded as soon as each completes.
+
+    Yields:
+        One dict per paper: {"topic", "variant", "success", "paper" | "error"}
+    """
+    # Shared retrieval and de-duplication pool per topic
+    jobs = []
+    for topic in topics:
+        chunks = retrieve_paper_chunks(session_id, topic)
+        pool = QuestionPool(settings.BATCH_OVERGENERATE if variants > 1 else 0.0)
+        for index in range(variants):
+            jobs.append((topic, index, chunks, pool))
+
+    # Shut down without waiting: when the client disconnects this generator
+    # is closed mid-iteration and must not block on the papers still running
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, settings.BATCH_PARALLEL_PAPERS),
+        thread_name_prefix="batch-paper"
+    )
+    try:
+        futures = {}
+        for topic, index, chunks, pool in jobs:
+            future = executor.submit(
+                copy_context().run, request_thread(generate_question_paper),
+                session_id=session_id,
+                topic=topic,
+                num_questions=num_questions,
+                difficulty=difficulty,
+                include_answers=include_answers,
+                test_mode=test_mode,
+                chunks=chunks,
+                variant=(index, variants),
+                pool=pool
+            )
+            futures[future] = (topic, index)
+
+        for future in as_completed(futures):
+            topic, index = futures[future]
+            try:
+                paper = future.result()
+                if variants > 1:
+                    paper["title"] = f"{paper['title']} (Set {index + 1})"
+                yield {"topic": topic, "variant": index + 1, "success": True, "paper": paper}
+            except Exception as e:
+                yield {"topic": topic, "variant": index + 1, "success": False, "error": str(e)}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
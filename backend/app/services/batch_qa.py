@@ -0,0 +1,190 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from typing import Dict, Iterator, List
+from app.config import settings
+from app.services.vector_store import similarity_search_batch_with_score
+from app.services.summary_service import answer_from_summary
+from app.services.metrics import time_stage
+from app.services.profiling import request_thread
+from app.services.llm_service import (
+    qa_retrieval_k, select_context, unavailable_answer, answer_from_context,
+    get_multi_qa_prompt, get_llm, invoke_llm
+)
+
+# "Answer 2:" headers in a merged response (tolerates markdown bold and headings)
+_ANSWER_HEADER = re.compile(r"^[\s*#]*Answer\s+(\d+)\s*\**\s*:\s*\**", re.IGNORECASE | re.MULTILINE)
+
+# A merged context may grow to this multiple of the largest single-question context
+_MERGED_CONTEXT_GROWTH = 1.5
+
+
+def group_questions(contexts: Dict[int, List[dict]], max_size: int, min_overlap: float) -> List[List[int]]:
+    """
+    Group questions whose retrieved chunks overlap, so each group is answered
+    from one merged context in a single LLM call.
+
+    A question joins the first group that already holds at least min_overlap
+    of its chunks, as long as the group has fewer than max_size questions and
+    the merged context stays within _MERGED_CONTEXT_GROWTH times the largest
+    single-question context.
+
+    Args:
+        contexts: Selected sources per question index
+        max_size: Maximum questions per group (1 disables merging)
+        min_overlap: Fraction of a question's chunks that must already be in the group
+
+    Returns:
+        Lists of question indexes, in question order
+    """
+    groups = []
+    for index, sources in contexts.items():
+        keys = {source["text"] for source in sources}
+        for group in groups:
+            if len(group["members"]) >= max_size or not keys:
+                continue
+            union = group["keys"] | keys
+            limit = _MERGED_CONTEXT_GROWTH * max(group["largest"], len(keys))
+            if len(keys & group["keys"]) / len(keys) >= min_overlap and len(union) <= limit:
+                group["members"].append(index)
+                group["keys"] = union
+                group["largest"] = max(group["largest"], len(keys))
+                break
+        else:
+            groups.append({"members": [index], "keys": keys, "largest": len(keys)})
+    return [group["members"] for group in groups]
+
+
+def merge_sources(source_lists: List[List[dict]]) -> List[dict]:
+    """Union of several questions' sources, interleaved by rank so each keeps its best chunks first."""
+    merged, seen = [], set()
+    for rank in range(max(len(sources) for sources in source_lists)):
+        for sources in source_lists:
+            if rank < len(sources) and sources[rank]["text"] not in seen:
+                seen.add(sources[rank]["text"])
+                merged.append(sources[rank])
+    return merged
+
+
+def split_answers(response: str, count: int) -> Dict[int, str]:
+    """
+    Split a merged response into answers by their "Answer N:" headers.
+
+    Returns:
+        Answer text by question number (1-based); numbers the response
+        skipped or left empty are missing
+    """
+    headers = list(_ANSWER_HEADER.finditer(response))
+    answers = {}
+    for position, header in enumerate(headers):
+        number = int(header.group(1))
+        end = headers[position + 1].start() if position + 1 < len(headers) else len(response)
+        text = response[header.end():end].strip()
+        if 1 <= number <= count and text and number not in answers:
+            answers[number] = text
+    return answers
+
+
+def _answer_group(questions: List[str], members: List[int], contexts: Dict[int, tuple]) -> List[tuple]:
+    """
+    Answer a group of questions, in one LLM call when there are several.
+
+    Questions the merged response does not answer are asked again on their own.
+
+    Returns:
+        List of (question index, result dict as returned by answer_question())
+    """
+    if len(members) == 1:
+        index = members[0]
+        return [(index, answer_from_context(questions[index], *contexts[index]))]
+
+    merged = merge_sources([contexts[index][0] for index in members])
+    with time_stage("prompt_build"):
+        prompt = get_multi_qa_prompt().format(
+            context="\n\n".join(source["text"] for source in merged),
+            questions="\n".join(f"{number}. {questions[index]}" for number, index in enumerate(members, start=1))
+        )
+    answers = split_answers(invoke_llm(get_llm(temperature=0), prompt, section="qa_batch"), len(members))
+
+    results = []
+    for number, index in enumerate(members, start=1):
+        sources, report = contexts[index]
+        if number not in answers:
+            results.append((index, answer_from_context(questions[index], sources, report)))
+            continue
+        results.append((index, {
+            "answer": answers[number],
+            "sources": [source["text"] for source in sources],
+            "source_details": sources,
+            "rerank": report
+        }))
+    return results
+
+
+def answer_questions_batch(session_id: str, questions: List[str]) -> Iterator[dict]:
+    """
+    Answer several questions about one session.
+
+    All questions are embedded in one batch and searched with one backend
+    call. Summary and unanswerable questions are answered without the LLM.
+    Questions whose chunks overlap are answered together from one merged
+    context; the remaining LLM calls run concurrently (ASK_BATCH_PARALLEL at
+    a time, bounded by the upstream limiter). Results are yielded as soon as
+    each is ready, not in question order.
+
+    Yields:
+        One dict per question: {"index", "question", "success", "merged",
+        "result" | "error"}, where merged is the number of questions answered
+        by the same LLM call (0 when no call was made)
+    """
+    pending = []
+    for index, question in enumerate(questions):
+        # Whole-document summaries come from the precomputed summary tree
+        summary = answer_from_summary(session_id, question)
+        if summary is not None:
+            yield {"index": index, "question": question, "success": True, "merged": 0, "result": summary}
+        else:
+            pending.append(index)
+
+    if not pending:
+        return
+
+    # One batched embedding and one multi-query search for all remaining questions
+    scored = similarity_search_batch_with_score(session_id, [questions[i] for i in pending], k=qa_retrieval_k())
+
+    contexts = {}
+    for index, results in zip(pending, scored):
+        context = select_context(session_id, questions[index], results)
+        if context is None:
+            yield {"index": index, "question": questions[index], "success": True, "merged": 0, "result": unavailable_answer()}
+        else:
+            contexts[index] = context
+
+    groups = group_questions(
+        {index: sources for index, (sources, _) in contexts.items()},
+        max(1, settings.ASK_BATCH_MERGE_MAX),
+        settings.ASK_BATCH_MERGE_OVERLAP
+    )
+
+    # Shut down without waiting: when the client disconnects this generator
+    # is closed mid-iteration and must not block on the remaining LLM calls
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, settings.ASK_BATCH_PARALLEL),
+        thread_name_prefix="batch-qa"
+    )
+    try:
+        futures = {
+            executor.submit(copy_context().run, request_thread(_answer_group), questions, members, contexts): members
+            for members in groups
+        }
+
+        for future in as_completed(futures):
+            members = futures[future]
+            try:
+                for index, result in future.result():
+                    yield {"index": index, "question": questions[index], "success": True, "merged": len(members), "result": result}
+            except Exception as e:
+                for index in members:
+                    yield {"index": index, "question": questions[index], "success": False, "merged": len(members), "error": str(e)}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
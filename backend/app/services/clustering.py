@@ -0,0 +1,136 @@
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+
+CLUSTERS_FILE = "clusters.npz"
+
+
+def num_clusters(n_chunks: int, max_clusters: int = 32) -> int:
+    """Pick a cluster count for a document: ~sqrt(n/2), at least 1."""
+    return max(1, min(max_clusters, int(round(np.sqrt(n_chunks / 2)))))
+
+
+def build_clusters(vectors: np.ndarray, max_clusters: int = 32, seed: int = 1234) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster chunk embeddings with k-means.
+
+    Args:
+        vectors: (n, d) float32 embedding matrix, rows in index order
+        max_clusters: Upper bound on the number of clusters
+        seed: Random seed (clusters are reproducible for the same document)
+
+    Returns:
+        Tuple of (labels (n,) int32, centroids (k, d) float32)
+    """
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    k = num_clusters(len(vectors), max_clusters)
+    if k == 1:
+        return np.zeros(len(vectors), dtype="int32"), vectors.mean(axis=0, keepdims=True)
+
+    kmeans = faiss.Kmeans(
+        vectors.shape[1], k, niter=20, seed=seed, verbose=False, min_points_per_centroid=1
+    )
+    kmeans.train(vectors)
+    _, labels = kmeans.index.search(vectors, 1)
+    return labels.ravel().astype("int32"), kmeans.centroids.astype("float32")
+
+
+def save_clusters(store_path: str, labels: np.ndarray, centroids: np.ndarray):
+    """Persist cluster assignments next to the session index."""
+    np.savez(os.path.join(store_path, CLUSTERS_FILE), labels=labels, centroids=centroids)
+
+
+def load_clusters(store_path: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Load cluster assignments saved by save_clusters(), or None if missing."""
+    path = os.path.join(store_path, CLUSTERS_FILE)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return data["labels"], data["centroids"]
+
+
+def stratified_select(
+    vectors: np.ndarray,
+    labels: np.ndarray,
+    centroids: np.ndarray,
+    query: np.ndarray,
+    k: int
+) -> List[int]:
+    """
+    Pick k chunks spread across clusters, favouring clusters close to the query.
+
+    Clusters are ranked by centroid distance to the query and the nearest
+    k // 2 (at least 2) are used; chunks are taken round-robin, best-first
+    within each cluster, so the context covers several distinct parts of
+    the document instead of near-duplicates from one section.
+
+    Args:
+        vectors: (n, d) chunk embeddings in index order
+        labels: (n,) cluster label per chunk
+        centroids: (c, d) cluster centroids
+        query: (d,) query embedding
+        k: Number of chunks to select
+
+    Returns:
+        Selected row indices, in selection order
+    """
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    cluster_order = np.argsort(((centroids - query) ** 2).sum(axis=1))
+
+    # Members of each cluster, nearest to the query first
+    members = []
+    for cluster in cluster_order:
+        rows = np.flatnonzero(labels == cluster)
+        if len(rows):
+            members.append(rows[np.argsort(distances[rows])].tolist())
+
+    nearest, rest = members[:max(2, k // 2)], members[max(2, k // 2):]
+
+    selected = []
+    depth = 0
+    while len(selected) < k and any(depth < len(m) for m in nearest):
+        for rows in nearest:
+            if depth < len(rows):
+                selected.append(rows[depth])
+                if len(selected) == k:
+                    break
+        depth += 1
+
+    # Small documents: top up from the remaining clusters by distance
+    if len(selected) < k and rest:
+        remaining = sorted((row for rows in rest for row in rows), key=lambda row: distances[row])
+        selected.extend(remaining[:k - len(selected)])
+    return selected
+
+
+def mmr_select(query: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Maximal marginal relevance: pick k rows relevant to the query but unlike each other.
+
+    Args:
+        query: (d,) query embedding
+        vectors: (n, d) candidate embeddings
+        k: Number of rows to select
+        lambda_mult: 1 favours relevance only, 0 favours diversity only
+
+    Returns:
+        Selected row indices into `vectors`, in selection order
+    """
+    if len(vectors) == 0 or k <= 0:
+        return []
+
+    # Cosine similarities (same scoring as LangChain's max_marginal_relevance_search)
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    relevance = unit @ (query / max(np.linalg.norm(query), 1e-12))
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = unit @ unit[selected[0]]
+    while len(selected) < min(k, len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, unit @ unit[best])
+    return selected
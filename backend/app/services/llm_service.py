@@ -1,15 +1,44 @@
-from typing import List, Optional
-from langchain.chains.question_answering import load_qa_chain
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain.schema import Document
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, List, Optional, Tuple, TYPE_CHECKING
 from app.config import settings
-from app.services.vector_store import similarity_search, load_vector_store
+from app.services.vector_store import similarity_search_with_score, coverage_search
+from app.services.metrics import time_stage, observe_stage, count_tokens, count_unanswerable, count_bank_questions
+from app.services.tracing import span
+from app.services.profiling import request_thread
+from app.services.response_parser import ResponseParser
+from app.services.structured_output import structured_output_enabled, generate_structured_questions
+from app.services.rate_limiter import upstream_limiter
+from app.services.summary_service import answer_from_summary
+from app.services.reranker import rerank
+from app.services.answerability import is_unanswerable
+from app.services.question_bank import get_question_bank, bank_topic_scores, bank_candidates
 import json
+import time
+
+# LangChain is imported on first use to keep worker startup fast
+if TYPE_CHECKING:
+    from langchain.prompts import PromptTemplate
+    from app.services.batch_generation import QuestionPool
+
+# Sections of a paper are generated in parallel; upstream_limiter bounds the
+# number of LLM calls actually in flight.
+_section_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="paper-section")
+
+# Fields of a bank question that go into a paper (the rest are bank tags)
+_BANK_QUESTION_FIELDS = ("question", "options", "answer")
+
+# Chunks sent to the LLM for a question when reranking is off
+QA_CONTEXT_CHUNKS = 12
+
+# Reply the QA prompt asks for when the context does not contain the answer
+NOT_AVAILABLE_ANSWER = "The answer is not available in the provided PDF."
 
 
 def get_llm(temperature: float = 0):
     """Get OpenRouter LLM instance (OpenAI-compatible)."""
+    from langchain_openai import ChatOpenAI
+    
     return ChatOpenAI(
         model=settings.OPENROUTER_MODEL,
         api_key=settings.OPENROUTER_API_KEY,
@@ -18,11 +47,50 @@ def get_llm(temperature: float = 0):
     )
 
 
-def get_qa_chain():
+def invoke_llm(llm, prompt: str, section: str = "qa", on_chunk: Optional[Callable[[str], object]] = None) -> str:
     """
-    Get the RAG-based question answering chain.
-    Uses a strict prompt to only answer from provided context.
+    Run a prompt through the LLM and return the response text.
+    
+    The response is streamed so that time-to-first-token can be recorded
+    alongside the total generation time and token counts. Calls wait for a
+    slot from the shared upstream limiter.
+    
+    Args:
+        llm: Chat model instance from get_llm()
+        prompt: Fully formatted prompt
+        section: Name of the paper section or task (used as a span attribute)
+        on_chunk: Called with each streamed text chunk (e.g. ResponseParser.feed)
+    """
+    count_tokens("in", prompt)
+    
+    parts = []
+    first_token = False
+    with upstream_limiter.slot(), span("llm.invoke", section=section, prompt_chars=len(prompt)) as s:
+        start = time.perf_counter()
+        for chunk in llm.stream(prompt):
+            if chunk.content and not first_token:
+                ttft = time.perf_counter() - start
+                observe_stage("llm_ttft", ttft)
+                if s is not None:
+                    s.set_attribute("llm.ttft_seconds", ttft)
+                first_token = True
+            parts.append(chunk.content)
+            if on_chunk is not None:
+                on_chunk(chunk.content)
+        observe_stage("llm_total", time.perf_counter() - start)
+    
+    response = "".join(parts)
+    count_tokens("out", response)
+    return response
+
+
+def get_qa_prompt() -> "PromptTemplate":
     """
+    Get the strict RAG prompt used for question answering.
+    Instructs the model to only answer from provided context.
+    """
+    from langchain.prompts import PromptTemplate
+    
     prompt_template = """
     You are an AI assistant answering questions based on the provided PDF content.
 
@@ -45,82 +113,209 @@ def get_qa_chain():
     Provide a comprehensive answer covering all relevant points from the PDF:
     """
 
-    llm = get_llm(temperature=0)
-    prompt = PromptTemplate(
+    return PromptTemplate(
         template=prompt_template,
         input_variables=["context", "question"]
     )
 
-    return load_qa_chain(llm, chain_type="stuff", prompt=prompt)
 
+def get_multi_qa_prompt() -> "PromptTemplate":
+    """
+    Get the QA prompt for several questions answered from one shared context.
+    Same rules as get_qa_prompt(); each answer starts with an "Answer N:" line.
+    """
+    from langchain.prompts import PromptTemplate
+    
+    prompt_template = """
+    You are an AI assistant answering questions based on the provided PDF content.
+
+    Rules you MUST follow:
+    1. Use ONLY the information present in the given context.
+    2. DO NOT use any external knowledge.
+    3. DO NOT guess or assume missing information.
+    4. Answer every question separately. If the answer to a question is NOT present in the context, its answer must be exactly:
+       "The answer is not available in the provided PDF."
+    5. Provide COMPREHENSIVE and DETAILED answers.
+    6. If a question asks about multiple items (e.g., types, methods, categories), explain ALL of them in detail, not just the first one.
+    7. Use bullet points or numbered lists for clarity when explaining multiple concepts.
+    8. Start the answer to question N with a line "Answer N:" and answer the questions in order.
+
+    Context:
+    {context}
+
+    Questions:
+    {questions}
 
-def answer_question(session_id: str, question: str) -> dict:
+    Provide a comprehensive answer to each question covering all relevant points from the PDF:
+    """
+
+    return PromptTemplate(
+        template=prompt_template,
+        input_variables=["context", "questions"]
+    )
+
+
+def answer_question(session_id: str, question: str, use_summary: bool = True) -> dict:
     """
     Answer a question based on the uploaded PDF content.
     
     Args:
         session_id: Session identifier with uploaded PDF
         question: User's question
+        use_summary: Try the precomputed summary tree first (False if the
+            caller already did)
+        
+    Returns:
+        Dictionary with answer, source chunks and their page/heading details,
+        and the rerank report when reranking is enabled
+    """
+    # Whole-document summaries come from the precomputed summary tree
+    summary = answer_from_summary(session_id, question) if use_summary else None
+    if summary is not None:
+        return summary
+    
+    # Get relevant chunks - increased k for more comprehensive answers, or
+    # over-retrieve and keep only the few the cross-encoder ranks highest
+    scored = similarity_search_with_score(session_id, question, k=qa_retrieval_k())
+    
+    context = select_context(session_id, question, scored)
+    if context is None:
+        return unavailable_answer()
+    return answer_from_context(question, *context)
+
+
+def qa_retrieval_k() -> int:
+    """Chunks retrieved per question (rerank candidates when reranking is enabled)."""
+    return settings.RERANK_CANDIDATES if settings.RERANK_ENABLED else QA_CONTEXT_CHUNKS
+
+
+def select_context(session_id: str, question: str, scored: List[Tuple[dict, float]]) -> Optional[Tuple[List[dict], Optional[dict]]]:
+    """
+    Pick the chunks to answer a question from, out of its scored retrieval results.
+    
+    Args:
+        session_id: Session identifier (for the answerability threshold)
+        question: User's question
+        scored: (source, score) pairs from similarity search, best first
         
     Returns:
-        Dictionary with answer and source chunks
+        Tuple of (sources, rerank report or None), or None when nothing in
+        the PDF is close enough to hold the answer
     """
-    # Get relevant chunks - increased k for more comprehensive answers
-    relevant_chunks = similarity_search(session_id, question, k=12)
+    # Nothing in the PDF is close enough to hold the answer: skip the LLM call
+    if is_unanswerable(session_id, scored[0][1] if scored else None):
+        return None
     
-    # Convert to Document objects for the chain
-    docs = [Document(page_content=chunk) for chunk in relevant_chunks]
+    sources = [source for source, _ in scored]
+    report = None
+    if settings.RERANK_ENABLED:
+        sources, report = rerank(question, sources, settings.RERANK_TOP_K, baseline_k=QA_CONTEXT_CHUNKS)
+    return sources, report
+
+
+def unavailable_answer() -> dict:
+    """Result for a question the PDF cannot answer (no LLM call is made)."""
+    count_unanswerable()
+    return {
+        "answer": NOT_AVAILABLE_ANSWER,
+        "sources": [],
+        "source_details": [],
+        "rerank": None
+    }
+
+
+def answer_from_context(question: str, sources: List[dict], report: Optional[dict] = None) -> dict:
+    """
+    Answer a question from already selected sources with one LLM call.
+    
+    Returns:
+        Dictionary as returned by answer_question()
+    """
+    relevant_chunks = [source["text"] for source in sources]
+    
+    # Stuff the chunks into the QA prompt (same layout as the "stuff" chain)
+    with time_stage("prompt_build"):
+        prompt = get_qa_prompt().format(
+            context="\n\n".join(relevant_chunks),
+            question=question
+        )
     
     # Get answer
-    chain = get_qa_chain()
-    response = chain(
-        {"input_documents": docs, "question": question},
-        return_only_outputs=True
-    )
+    answer = invoke_llm(get_llm(temperature=0), prompt)
     
     return {
-        "answer": response["output_text"],
-        "sources": relevant_chunks
+        "answer": answer,
+        "sources": relevant_chunks,
+        "source_details": sources,
+        "rerank": report
     }
 
 
 
-def generate_question_paper(
-    session_id: str,
-    topic: str,
-    num_questions: int = 10,
-    difficulty: str = "medium",
-    include_answers: bool = False,
-    test_mode: str = "mcq",
-    question_types: Optional[List[str]] = None
-) -> dict:
+
+# Question kinds used in paper sections
+QUESTION_KINDS = {
+    "mcq": {"parser": "mcq", "marks": 1},
+    "short": {"parser": "theory", "marks": 2},
+    "long": {"parser": "theory", "marks": 5},
+}
+
+
+def plan_sections(test_mode: str, num_questions: int) -> tuple:
     """
-    Generate a formatted question paper for teachers.
+    Work out the sections of a paper for a test mode.
     
     Test modes:
     - mcq: Only MCQs (1 mark each)
     - theory: Short answers (2 marks) + Long answers (5 marks)
     - hybrid: MCQs (1 mark) + Short (2 marks) + Long (5 marks)
-    """
-    db = load_vector_store(session_id)
-    if db is None:
-        raise ValueError(f"No vector store found for session: {session_id}")
     
-    # Get relevant content (increased k for more comprehensive coverage)
-    docs = db.similarity_search(f"{topic} concepts definitions explanations", k=20)
-    context = "\n\n".join([doc.page_content for doc in docs])
+    Returns:
+        Tuple of (list of section dicts with kind/count/name/marks_per_question, instructions)
+    """
+    if test_mode == "mcq":
+        return [
+            {"kind": "mcq", "count": num_questions, "name": "Section A: Multiple Choice Questions"},
+        ], "Choose the correct answer for each question. Each question carries 1 mark."
     
-    sections = []
-    total_marks = 0
+    if test_mode == "theory":
+        num_short = max(1, num_questions // 2)
+        num_long = max(1, num_questions - num_short)
+        return [
+            {"kind": "short", "count": num_short, "name": "Section A: Short Answer Questions (2 Marks Each)"},
+            {"kind": "long", "count": num_long, "name": "Section B: Long Answer Questions (5 Marks Each)"},
+        ], "Answer all questions. Section A carries 2 marks each. Section B carries 5 marks each."
+    
+    # hybrid mode
+    num_mcq = max(1, num_questions // 3)
+    num_short = max(1, num_questions // 3)
+    num_long = max(1, num_questions - num_mcq - num_short)
+    return [
+        {"kind": "mcq", "count": num_mcq, "name": "Section A: Multiple Choice Questions (1 Mark Each)"},
+        {"kind": "short", "count": num_short, "name": "Section B: Short Answer Questions (2 Marks Each)"},
+        {"kind": "long", "count": num_long, "name": "Section C: Long Answer Questions (5 Marks Each)"},
+    ], "Answer all questions. Section A: 1 mark each, Section B: 2 marks each, Section C: 5 marks each."
+
+
+def build_section_prompt(
+    kind: str,
+    count: int,
+    topic: str,
+    difficulty: str,
+    context: str,
+    include_answers: bool,
+    extra_instructions: str = ""
+) -> str:
+    """Build the free-text generation prompt for one section."""
+    note = f"\n{extra_instructions}" if extra_instructions else ""
     
-    if test_mode == "mcq":
-        # All MCQs - 1 mark each
-        prompt = f"""You are an expert teacher creating a {difficulty} difficulty MCQ exam on "{topic}".
+    if kind == "mcq":
+        return f"""You are an expert teacher creating a {difficulty} difficulty MCQ exam on "{topic}".
 
 Based on this content:
 {context}
 
-Create exactly {num_questions} multiple choice questions.
+Create exactly {count} multiple choice questions.{note}
 
 Format each question EXACTLY like this:
 1. [Question text here]
@@ -135,34 +330,16 @@ D) [Option D]
 
 IMPORTANT: Start directly with question 1. No introductions, no markdown formatting (like ** or __), no explanations or commentary.
 
-Generate {num_questions} MCQ questions now:"""
-        
-        llm = get_llm(temperature=0.4)
-        response = llm.invoke(prompt).content
-        response = clean_llm_response(response)
-        questions = parse_mcq_response(response, include_answers)
-        
-        sections = [{
-            "name": "Section A: Multiple Choice Questions",
-            "marks_per_question": 1,
-            "questions": questions
-        }]
-        total_marks = len(questions) * 1
-        instructions = "Choose the correct answer for each question. Each question carries 1 mark."
-        
-    elif test_mode == "theory":
-        # Short (2 marks) + Long (5 marks) answers
-        num_short = max(1, num_questions // 2)
-        num_long = max(1, num_questions - num_short)
-        
-        # Generate short answer questions
-        short_prompt = f"""You are an expert teacher creating {difficulty} difficulty short answer questions on "{topic}".
+Generate {count} MCQ questions now:"""
+    
+    if kind == "short":
+        return f"""You are an expert teacher creating {difficulty} difficulty short answer questions on "{topic}".
 
 Based on this content:
 {context}
 
-Create exactly {num_short} short answer questions (2 marks each).
-These should be questions that can be answered in 2-3 lines or a brief explanation.
+Create exactly {count} short answer questions (2 marks each).
+These should be questions that can be answered in 2-3 lines or a brief explanation.{note}
 
 Format:
 1. [Question text]
@@ -173,21 +350,15 @@ Format:
 
 IMPORTANT: Start directly with question 1. No introductions, no markdown formatting (like ** or __), no commentary.
 
-Generate {num_short} short answer questions now:"""
-
-        llm = get_llm(temperature=0.4)
-        short_response = llm.invoke(short_prompt).content
-        short_response = clean_llm_response(short_response)
-        short_questions = parse_theory_response(short_response, include_answers)
-        
-        # Generate long answer questions
-        long_prompt = f"""You are an expert teacher creating {difficulty} difficulty long answer questions on "{topic}".
+Generate {count} short answer questions now:"""
+    
+    return f"""You are an expert teacher creating {difficulty} difficulty long answer questions on "{topic}".
 
 Based on this content:
 {context}
 
-Create exactly {num_long} long answer questions (5 marks each).
-These should be questions requiring detailed explanations, comparisons, or comprehensive answers.
+Create exactly {count} long answer questions (5 marks each).
+These should be questions requiring detailed explanations, comparisons, or comprehensive answers.{note}
 
 Format:
 1. [Question text - should require a paragraph or detailed explanation]
@@ -198,118 +369,190 @@ Format:
 
 IMPORTANT: Start directly with question 1. No introductions, no markdown formatting (like ** or __), no commentary.
 
-Generate {num_long} long answer questions now:"""
-
-        long_response = llm.invoke(long_prompt).content
-        long_response = clean_llm_response(long_response)
-        long_questions = parse_theory_response(long_response, include_answers)
-        
-        sections = [
-            {
-                "name": "Section A: Short Answer Questions (2 Marks Each)",
-                "marks_per_question": 2,
-                "questions": short_questions
-            },
-            {
-                "name": "Section B: Long Answer Questions (5 Marks Each)",
-                "marks_per_question": 5,
-                "questions": long_questions
-            }
-        ]
-        total_marks = (len(short_questions) * 2) + (len(long_questions) * 5)
-        instructions = "Answer all questions. Section A carries 2 marks each. Section B carries 5 marks each."
-        
-    else:  # hybrid mode
-        # MCQ (1 mark) + Short (2 marks) + Long (5 marks)
-        num_mcq = max(1, num_questions // 3)
-        num_short = max(1, num_questions // 3)
-        num_long = max(1, num_questions - num_mcq - num_short)
-        
-        # MCQ questions
-        mcq_prompt = f"""You are an expert teacher creating {difficulty} difficulty MCQ questions on "{topic}".
-
-Based on this content:
-{context}
-
-Create exactly {num_mcq} multiple choice questions.
-
-Format:
-1. [Question]
-A) [Option A]
-B) [Option B]
-C) [Option C]
-D) [Option D]
-{"Answer: [Correct letter]" if include_answers else ""}
-
-IMPORTANT: Start directly with question 1. No introductions, no markdown formatting (like ** or __), no commentary.
-
-Generate {num_mcq} MCQ questions now:"""
+Generate {count} long answer questions now:"""
 
-        llm = get_llm(temperature=0.4)
-        mcq_response = llm.invoke(mcq_prompt).content
-        mcq_response = clean_llm_response(mcq_response)
-        mcq_questions = parse_mcq_response(mcq_response, include_answers)
-        
-        # Short answer questions
-        short_prompt = f"""Create exactly {num_short} short answer questions (2 marks each) on "{topic}".
 
-Based on this content:
-{context}
-
-Format:
-1. [Question requiring 2-3 line answer]
-{"Answer: [Brief answer]" if include_answers else ""}
-
-IMPORTANT: Start directly with question 1. No introductions, no markdown formatting (like ** or __), no commentary.
+def generate_section_questions(
+    kind: str,
+    count: int,
+    topic: str,
+    difficulty: str,
+    context: str,
+    include_answers: bool,
+    extra_instructions: str = ""
+) -> list:
+    """
+    Generate the questions for one section.
+    
+    Uses structured JSON output when enabled and supported by the model,
+    otherwise the free-text prompt and the streaming response parser.
+    """
+    if structured_output_enabled():
+        questions = generate_structured_questions(
+            kind, count, topic, difficulty, context, include_answers, extra_instructions
+        )
+        if questions:
+            return questions
+    
+    with time_stage("prompt_build"):
+        prompt = build_section_prompt(
+            kind, count, topic, difficulty, context, include_answers, extra_instructions
+        )
+    
+    # Tokens are parsed as they stream in, so parse time is feed() plus close()
+    parser = ResponseParser(QUESTION_KINDS[kind]["parser"], include_answers)
+    parse_seconds = 0.0
+
+    def feed(text: str):
+        nonlocal parse_seconds
+        start = time.perf_counter()
+        parser.feed(text)
+        parse_seconds += time.perf_counter() - start
+
+    invoke_llm(get_llm(temperature=0.4), prompt, section=kind, on_chunk=feed)
+    with span("parse", section=kind) as s:
+        start = time.perf_counter()
+        questions = parser.close()
+        parse_seconds += time.perf_counter() - start
+        if s is not None:
+            s.set_attribute("parse.seconds", parse_seconds)
+            s.set_attribute("questions", len(questions))
+    observe_stage("parse", parse_seconds)
+    return questions
 
-Generate {num_short} short answer questions now:"""
 
-        short_response = llm.invoke(short_prompt).content
-        short_response = clean_llm_response(short_response)
-        short_questions = parse_theory_response(short_response, include_answers)
+def retrieve_paper_chunks(session_id: str, topic: str, k: Optional[int] = None) -> List[str]:
+    """
+    Retrieve the content used as context for a question paper on a topic.
+    
+    Uses PAPER_RETRIEVAL to pick a diverse, document-wide sample instead of
+    the top-k near-duplicates of a single query.
+    
+    Args:
+        session_id: Session identifier with uploaded material
+        topic: Paper topic
+        k: Number of chunks to retrieve (defaults to PAPER_CONTEXT_CHUNKS)
         
-        # Long answer questions  
-        long_prompt = f"""Create exactly {num_long} long answer questions (5 marks each) on "{topic}".
-
-Based on this content:
-{context}
-
-IMPORTANT: Start directly with question 1. No introductions. No markdown formatting.
+    Returns:
+        List of relevant document chunks
+    """
+    return coverage_search(
+        session_id,
+        f"{topic} concepts definitions explanations",
+        k=k or settings.PAPER_CONTEXT_CHUNKS,
+        strategy=settings.PAPER_RETRIEVAL
+    )
 
-Format:
-1. [Question requiring detailed explanation]
-{"Answer: [Detailed answer]" if include_answers else ""}
 
-2. [Next question]
-...
+def generate_question_paper(
+    session_id: str,
+    topic: str,
+    num_questions: int = 10,
+    difficulty: str = "medium",
+    include_answers: bool = False,
+    test_mode: str = "mcq",
+    question_types: Optional[List[str]] = None,
+    chunks: Optional[List[str]] = None,
+    variant: Optional[Tuple[int, int]] = None,
+    pool: Optional["QuestionPool"] = None
+) -> dict:
+    """
+    Generate a formatted question paper for teachers.
+    
+    Test modes:
+    - mcq: Only MCQs (1 mark each)
+    - theory: Short answers (2 marks) + Long answers (5 marks)
+    - hybrid: MCQs (1 mark) + Short (2 marks) + Long (5 marks)
+    
+    With QUESTION_BANK_ENABLED, questions are sampled from the session's
+    pre-generated question bank, and the LLM is only called for sections
+    the bank cannot fill.
+    
+    Batch generation passes pre-retrieved `chunks` shared across variants,
+    the `variant` as (index, total), and a `pool` that keeps questions
+    unique across the variants of a topic.
+    """
+    plan, instructions = plan_sections(test_mode, num_questions)
+    
+    # Take what the pre-generated question bank has; the LLM only tops up the rest
+    bank = get_question_bank(session_id) if settings.QUESTION_BANK_ENABLED else None
+    if bank is not None and bank["status"] != "ready":
+        bank = None
+    if bank is not None and pool is None:
+        from app.services.batch_generation import QuestionPool
+        pool = QuestionPool()
+    scores = bank_topic_scores(session_id, bank, topic) if bank is not None else None
+    
+    banked = []
+    for section in plan:
+        taken = []
+        if bank is not None:
+            candidates = bank_candidates(bank, section["kind"], difficulty, scores)
+            taken = [
+                {key: value for key, value in q.items() if key in _BANK_QUESTION_FIELDS and (include_answers or key != "answer")}
+                for q in pool.claim(candidates, section["count"])
+            ]
+            count_bank_questions("bank", len(taken))
+        banked.append(taken)
+    
+    shortfalls = [section["count"] - len(taken) for section, taken in zip(plan, banked)]
+    if not any(shortfalls):
+        return _assemble_paper(topic, instructions, plan, banked)
+    
+    # Get relevant content spread across the document
+    if chunks is None:
+        chunks = retrieve_paper_chunks(session_id, topic)
+    
+    extra_instructions = ""
+    if variant is not None and variant[1] > 1:
+        index, total = variant
+        # Rotate the context so each variant leads with different material
+        shift = (index * len(chunks)) // total
+        chunks = chunks[shift:] + chunks[:shift]
+        extra_instructions = (
+            f"This is question set {index + 1} of {total} on this topic. "
+            "Write questions that differ from the other sets by covering different details of the content."
+        )
+    context = "\n\n".join(chunks)
+    
+    # Generate all sections concurrently (each in a copy of this request's context)
+    futures = []
+    for section, shortfall in zip(plan, shortfalls):
+        if shortfall <= 0:
+            futures.append(None)
+            continue
+        count = pool.request_count(shortfall) if pool else shortfall
+        futures.append(_section_executor.submit(
+            copy_context().run, request_thread(generate_section_questions),
+            section["kind"], count, topic, difficulty, context, include_answers, extra_instructions
+        ))
+    
+    results = []
+    for taken, shortfall, future in zip(banked, shortfalls, futures):
+        if future is None:
+            results.append(taken)
+            continue
+        questions = future.result()
+        if pool:
+            questions = pool.claim(questions, shortfall)
+        if bank is not None:
+            count_bank_questions("llm", len(questions))
+        results.append(taken + questions if taken else questions)
+    
+    return _assemble_paper(topic, instructions, plan, results)
 
-Generate {num_long} long answer questions now:"""
 
-        long_response = llm.invoke(long_prompt).content
-        long_response = clean_llm_response(long_response)
-        long_questions = parse_theory_response(long_response, include_answers)
-        
-        sections = [
-            {
-                "name": "Section A: Multiple Choice Questions (1 Mark Each)",
-                "marks_per_question": 1,
-                "questions": mcq_questions
-            },
-            {
-                "name": "Section B: Short Answer Questions (2 Marks Each)",
-                "marks_per_question": 2,
-                "questions": short_questions
-            },
-            {
-                "name": "Section C: Long Answer Questions (5 Marks Each)",
-                "marks_per_question": 5,
-                "questions": long_questions
-            }
-        ]
-        total_marks = (len(mcq_questions) * 1) + (len(short_questions) * 2) + (len(long_questions) * 5)
-        instructions = "Answer all questions. Section A: 1 mark each, Section B: 2 marks each, Section C: 5 marks each."
-    
-    # Recalculate total marks from sections to ensure accuracy
+def _assemble_paper(topic: str, instructions: str, plan: List[dict], questions: List[list]) -> dict:
+    """Build the paper dict from the questions of each planned section."""
+    sections = []
+    for section, section_questions in zip(plan, questions):
+        sections.append({
+            "name": section["name"],
+            "marks_per_question": QUESTION_KINDS[section["kind"]]["marks"],
+            "questions": [{**q, "number": number} for number, q in enumerate(section_questions, start=1)]
+        })
+    
+    # Calculate total marks from sections
     total_marks = 0
     for section in sections:
         marks_per_q = section.get("marks_per_question", 1)
@@ -332,332 +575,3 @@ Generate {num_long} long answer questions now:"""
         "duration": duration,
         "sections": sections
     }
-
-
-def clean_llm_response(response: str) -> str:
-    """
-    Remove trailing notes/commentary and markdown formatting that LLM often adds.
-    """
-    # Remove markdown bold/italic formatting
-    response = response.replace('**', '')
-    response = response.replace('__', '')
-    
-    # Common patterns LLMs add at the start (intro text to skip)
-    skip_start_patterns = [
-        "here are",
-        "here is",
-        "okay,",
-        "sure,",
-        "below are",
-        "i'll create",
-        "i will create",
-    ]
-    
-    # Common patterns LLMs add at the end (notes to stop at)
-    stop_patterns = [
-        "note that",
-        "note:",
-        "i have",
-        "i've used",
-        "please note",
-        "the above",
-        "these questions",
-        "based on the",
-        "let me know",
-        "hope this helps",
-        "this question assesses",
-        "this tests",
-    ]
-    
-    lines = response.strip().split('\n')
-    clean_lines = []
-    started = False
-    
-    for line in lines:
-        line_lower = line.lower().strip()
-        
-        # Skip intro lines at the start
-        if not started:
-            if any(line_lower.startswith(pattern) for pattern in skip_start_patterns):
-                continue
-            # Check if this line starts a question (number pattern)
-            if line_lower and (line_lower[0].isdigit() or line_lower.startswith('q')):
-                started = True
-        
-        # Stop if we hit a trailing note
-        if started and any(line_lower.startswith(pattern) for pattern in stop_patterns):
-            break
-            
-        if started or (line_lower and line_lower[0].isdigit()):
-            started = True
-            clean_lines.append(line)
-    
-    return '\n'.join(clean_lines).strip()
-
-
-def parse_mcq_response(response: str, include_answers: bool) -> list:
-    """
-    Parse MCQ questions from LLM response.
-    """
-    import re
-    
-    questions = []
-    lines = response.strip().split('\n')
-    
-    current_question = None
-    current_options = []
-    question_number = 0
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Detect question pattern (e.g., "1.", "1)", "Q1:", "Question 1:")
-        question_match = re.match(r'^(?:Q(?:uestion)?\s*)?(\d+)[\.\:\)]\s*(.+)', line, re.IGNORECASE)
-        
-        if question_match:
-            # Save previous question
-            if current_question and current_options:
-                current_question["options"] = current_options
-                questions.append(current_question)
-            
-            question_number = int(question_match.group(1))
-            question_text = question_match.group(2).strip()
-            current_question = {
-                "number": question_number,
-                "question": question_text
-            }
-            current_options = []
-            continue
-        
-        # Detect options (A), B), C), D) or A. B. C. D.
-        option_match = re.match(r'^([A-D])[\.\)\:\s]+(.+)', line, re.IGNORECASE)
-        if option_match:
-            option_letter = option_match.group(1).upper()
-            option_text = option_match.group(2).strip()
-            current_options.append(f"{option_letter}) {option_text}")
-            continue
-        
-        # Detect answer line
-        answer_match = re.match(r'^(?:Answer|Correct Answer|Ans)[\:\s]+([A-D])', line, re.IGNORECASE)
-        if answer_match and current_question:
-            current_question["answer"] = answer_match.group(1).upper()
-            continue
-        
-        # If line continues question text
-        if current_question and not current_options and len(line) > 5:
-            current_question["question"] += " " + line
-    
-    # Don't forget the last question
-    if current_question and current_options:
-        current_question["options"] = current_options
-        questions.append(current_question)
-    
-    # Fallback if parsing failed
-    if not questions:
-        questions = [{
-            "number": 1,
-            "question": response[:500] if len(response) > 500 else response,
-            "options": ["A) Option A", "B) Option B", "C) Option C", "D) Option D"]
-        }]
-    
-    return questions
-
-
-def parse_theory_response(response: str, include_answers: bool) -> list:
-    """
-    Parse theory (short/long answer) questions from LLM response.
-    """
-    import re
-    
-    questions = []
-    lines = response.strip().split('\n')
-    
-    current_question = None
-    current_answer = []
-    question_number = 0
-    in_answer = False
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Detect question pattern (e.g., "1.", "1)", "Q1:")
-        question_match = re.match(r'^(?:Q(?:uestion)?\.?\s*)?(\d+)[.\)]\s*(.+)', line, re.IGNORECASE)
-        
-        if question_match:
-            # Save previous question
-            if current_question:
-                if in_answer and current_answer:
-                    current_question["answer"] = ' '.join(current_answer)
-                questions.append(current_question)
-            
-            question_number = int(question_match.group(1))
-            question_text = question_match.group(2).strip()
-            current_question = {
-                "number": question_number,
-                "question": question_text
-            }
-            current_answer = []
-            in_answer = False
-            continue
-        
-        # Detect answer line
-        answer_match = re.match(r'^(?:Answer|Ans)[:\s]+(.+)', line, re.IGNORECASE)
-        if answer_match and current_question:
-            in_answer = True
-            current_answer.append(answer_match.group(1).strip())
-            continue
-        
-        # If we're collecting answer text
-        if in_answer and current_question:
-            current_answer.append(line)
-            continue
-        
-        # Continue question text
-        if current_question and not in_answer:
-            current_question["question"] += " " + line
-    
-    # Don't forget the last question
-    if current_question:
-        if in_answer and current_answer:
-            current_question["answer"] = ' '.join(current_answer)
-        questions.append(current_question)
-    
-    # Fallback if parsing failed
-    if not questions:
-        questions = [{
-            "number": 1,
-            "question": response[:500] if len(response) > 500 else response
-        }]
-    
-    return questions
-
-
-def parse_question_paper_response(response: str, mcq_count: int, short_count: int, long_count: int, include_answers: bool) -> list:
-    """
-    Parse the LLM response into structured sections.
-    """
-    sections = []
-    
-    # Split response into lines for processing
-    lines = response.strip().split('\n')
-    
-    current_section = None
-    current_questions = []
-    current_question = None
-    current_options = []
-    question_number = 0
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Detect section headers
-        if 'SECTION A' in line.upper() or 'MULTIPLE CHOICE' in line.upper():
-            if current_section and current_questions:
-                sections.append(current_section)
-            current_section = {
-                "name": "Section A - Multiple Choice Questions",
-                "marks_per_question": 1,
-                "questions": []
-            }
-            current_questions = []
-            question_number = 0
-            continue
-        elif 'SECTION B' in line.upper() or 'SHORT ANSWER' in line.upper():
-            if current_section:
-                if current_question:
-                    if current_options:
-                        current_question["options"] = current_options
-                    current_section["questions"].append(current_question)
-                sections.append(current_section)
-            current_section = {
-                "name": "Section B - Short Answer Questions",
-                "marks_per_question": 2,
-                "questions": []
-            }
-            current_question = None
-            current_options = []
-            question_number = 0
-            continue
-        elif 'SECTION C' in line.upper() or 'LONG ANSWER' in line.upper():
-            if current_section:
-                if current_question:
-                    current_section["questions"].append(current_question)
-                sections.append(current_section)
-            current_section = {
-                "name": "Section C - Long Answer Questions",
-                "marks_per_question": 5,
-                "questions": []
-            }
-            current_question = None
-            current_options = []
-            question_number = 0
-            continue
-        
-        # Detect question patterns (e.g., "1.", "Q1:", "Question 1")
-        import re
-        question_match = re.match(r'^(?:Q(?:uestion)?\s*)?(\d+)[\.\:\)]\s*(.+)', line, re.IGNORECASE)
-        
-        if question_match:
-            # Save previous question
-            if current_question and current_section:
-                if current_options:
-                    current_question["options"] = current_options
-                current_section["questions"].append(current_question)
-            
-            question_number = int(question_match.group(1))
-            question_text = question_match.group(2).strip()
-            current_question = {
-                "number": question_number,
-                "question": question_text
-            }
-            current_options = []
-            continue
-        
-        # Detect options (A), B), C), D) or A. B. C. D.
-        option_match = re.match(r'^([A-D])[\.\)\:]\s*(.+)', line, re.IGNORECASE)
-        if option_match and current_question:
-            option_letter = option_match.group(1).upper()
-            option_text = option_match.group(2).strip()
-            current_options.append(f"{option_letter}) {option_text}")
-            continue
-        
-        # Detect answer line
-        answer_match = re.match(r'^(?:Answer|Correct Answer|Ans)[\:\s]+(.+)', line, re.IGNORECASE)
-        if answer_match and current_question:
-            current_question["answer"] = answer_match.group(1).strip()
-            continue
-        
-        # If we have a current question, append to its text
-        if current_question and line and not line.startswith(('*', '-', '•')):
-            # Could be continuation of question
-            if len(current_question.get("question", "")) < 200:
-                current_question["question"] = current_question.get("question", "") + " " + line
-    
-    # Don't forget the last question and section
-    if current_question and current_section:
-        if current_options:
-            current_question["options"] = current_options
-        current_section["questions"].append(current_question)
-    if current_section:
-        sections.append(current_section)
-    
-    # If parsing failed or got empty sections, create a simple fallback
-    if not sections or all(len(s.get("questions", [])) == 0 for s in sections):
-        # Return raw response as a single section
-        sections = [{
-            "name": "Questions",
-            "marks_per_question": 2,
-            "questions": [{
-                "number": 1,
-                "question": response[:2000] if len(response) > 2000 else response
-            }]
-        }]
-    
-    return sections
-
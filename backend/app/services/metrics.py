@@ -0,0 +1,246 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# Labels attached to every stage observation made while serving a request.
+# The timing middleware sets the route, the teacher router sets the test mode.
+_route: ContextVar[str] = ContextVar("metrics_route", default="none")
+_test_mode: ContextVar[str] = ContextVar("metrics_test_mode", default="none")
+
+# Buckets sized for this pipeline: sub-millisecond parses up to multi-minute LLM calls
+_STAGE_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0, 120.0, 300.0
+)
+
+REQUEST_SECONDS = Histogram(
+    "studygenius_request_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=_STAGE_BUCKETS,
+)
+
+STAGE_SECONDS = Histogram(
+    "studygenius_stage_seconds",
+    "Time spent in each pipeline stage",
+    ["stage", "route", "test_mode"],
+    buckets=_STAGE_BUCKETS,
+)
+
+PAGES_TOTAL = Counter(
+    "studygenius_pdf_pages_total",
+    "PDF pages read during extraction",
+    ["route"],
+)
+
+CHUNKS_TOTAL = Counter(
+    "studygenius_chunks_total",
+    "Text chunks produced by the splitter",
+    ["route"],
+)
+
+TOKENS_TOTAL = Counter(
+    "studygenius_llm_tokens_total",
+    "Estimated LLM tokens sent (in) and received (out)",
+    ["direction", "route", "test_mode"],
+)
+
+CACHE_LOOKUPS_TOTAL = Counter(
+    "studygenius_cache_lookups_total",
+    "Cache lookups by cache name and result (hit/miss)",
+    ["cache", "result"],
+)
+
+SESSION_EVICTIONS_TOTAL = Counter(
+    "studygenius_session_evictions_total",
+    "Sessions removed by reason (ttl, user_quota, disk_quota, deleted)",
+    ["reason"],
+)
+
+STRUCTURED_ITEMS_TOTAL = Counter(
+    "studygenius_structured_items_total",
+    "Questions returned in structured output mode by validation result",
+    ["kind", "result"],
+)
+
+RERANK_TOKENS_SAVED_TOTAL = Counter(
+    "studygenius_rerank_tokens_saved_total",
+    "Estimated prompt tokens saved by sending only the reranked top chunks",
+    ["route"],
+)
+
+UNANSWERABLE_TOTAL = Counter(
+    "studygenius_unanswerable_total",
+    "Questions given the not-available reply without an LLM call (retrieval score below threshold)",
+    ["route"],
+)
+
+QUESTION_BANK_QUESTIONS_TOTAL = Counter(
+    "studygenius_question_bank_questions_total",
+    "Paper questions by source (bank: pre-generated, llm: top-up when the bank ran out)",
+    ["source"],
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "studygenius_admission_queue_depth",
+    "Requests waiting for an admission slot by endpoint group",
+    ["gate"],
+    multiprocess_mode="livesum",
+)
+
+ADMISSION_SHED_TOTAL = Counter(
+    "studygenius_admission_shed_total",
+    "Requests rejected by admission control (queue_full: 429, timeout: 503)",
+    ["gate", "reason"],
+)
+
+_encoding = None
+
+
+def set_request_labels(route: Optional[str] = None, test_mode: Optional[str] = None):
+    """Set the labels used by stage metrics for the current request context."""
+    if route is not None:
+        _route.set(route)
+    if test_mode is not None:
+        _test_mode.set(test_mode)
+
+
+def get_route_label() -> str:
+    """Return the route label of the current request context."""
+    return _route.get()
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record a duration for a pipeline stage."""
+    STAGE_SECONDS.labels(stage, _route.get(), _test_mode.get()).observe(seconds)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """
+    Time the enclosed block as a pipeline stage.
+
+    Args:
+        stage: Stage name, e.g. "pdf_extract", "embed", "retrieval"
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def count_pages(n: int):
+    """Count PDF pages read."""
+    PAGES_TOTAL.labels(_route.get()).inc(n)
+
+
+def count_chunks(n: int):
+    """Count chunks produced."""
+    CHUNKS_TOTAL.labels(_route.get()).inc(n)
+
+
+def count_tokens(direction: str, text: str):
+    """Count (estimated) tokens for text sent to or received from the LLM."""
+    TOKENS_TOTAL.labels(direction, _route.get(), _test_mode.get()).inc(estimate_tokens(text))
+
+
+def count_cache(cache: str, hit: bool):
+    """Count a cache lookup."""
+    CACHE_LOOKUPS_TOTAL.labels(cache, "hit" if hit else "miss").inc()
+
+
+def count_session_eviction(reason: str):
+    """Count a session removed from disk."""
+    SESSION_EVICTIONS_TOTAL.labels(reason).inc()
+
+
+def count_structured_items(kind: str, valid: int, invalid: int):
+    """Count structured-output items that passed or failed validation."""
+    if valid:
+        STRUCTURED_ITEMS_TOTAL.labels(kind, "valid").inc(valid)
+    if invalid:
+        STRUCTURED_ITEMS_TOTAL.labels(kind, "invalid").inc(invalid)
+
+
+def count_rerank_savings(tokens: int):
+    """Count prompt tokens saved by reranking."""
+    if tokens > 0:
+        RERANK_TOKENS_SAVED_TOTAL.labels(_route.get()).inc(tokens)
+
+
+def count_unanswerable():
+    """Count a question short-circuited by the retrieval score threshold."""
+    UNANSWERABLE_TOTAL.labels(_route.get()).inc()
+
+
+def count_bank_questions(source: str, n: int):
+    """Count paper questions taken from the question bank or generated to top it up."""
+    if n:
+        QUESTION_BANK_QUESTIONS_TOTAL.labels(source).inc(n)
+
+
+def set_admission_depth(gate: str, depth: int):
+    """Record the number of requests queued at an admission gate."""
+    ADMISSION_QUEUE_DEPTH.labels(gate).set(depth)
+
+
+def count_shed(gate: str, reason: str):
+    """Count a request rejected by admission control."""
+    ADMISSION_SHED_TOTAL.labels(gate, reason).inc()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a piece of text.
+
+    Uses tiktoken's cl100k_base encoding when it is available, otherwise
+    falls back to the usual ~4 characters per token approximation.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4) if text else 0
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    Return the registry that /metrics should expose.
+
+    In a multi-worker deployment PROMETHEUS_MULTIPROC_DIR is set and the
+    values written by every worker are aggregated on each scrape.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+
+    from prometheus_client import REGISTRY
+    return REGISTRY
+
+
+def render_metrics() -> tuple:
+    """
+    Render all metrics in the Prometheus text exposition format.
+
+    Returns:
+        Tuple of (body bytes, content type)
+    """
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
@@ -0,0 +1,156 @@
+import json
+import os
+from typing import List, Optional
+import numpy as np
+
+# all-MiniLM-L6-v2 on onnxruntime instead of PyTorch. The model directory is
+# written by `python -m scripts.onnx_embeddings export`: model.onnx (and
+# model_int8.onnx with --quantize), tokenizer.json and verification.json,
+# which records how close each model's vectors are to the torch vectors. A
+# model is only used if it was verified within ONNX_MIN_COSINE, so its
+# vectors can be searched against existing indexes.
+
+MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+VERIFICATION_FILE = "verification.json"
+
+# all-MiniLM-L6-v2 truncates inputs at 256 word pieces
+MAX_LENGTH = 256
+
+# Threads per inference session (0 = onnxruntime default, all cores); set per worker after fork
+_threads = 0
+
+
+def configure_threads(threads: int):
+    """Set the thread count of inference sessions created from now on."""
+    global _threads
+    _threads = threads
+
+
+class OnnxEmbeddings:
+    """
+    Sentence embeddings from an exported ONNX model: the transformer runs in
+    onnxruntime, then mean pooling over the attention mask and L2
+    normalization, as in the sentence-transformers pipeline.
+
+    Exposes embed_documents()/embed_query() like the LangChain embeddings.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        quantized: bool = False,
+        min_cosine: Optional[float] = 0.99,
+        batch_size: int = 32
+    ):
+        """
+        Args:
+            model_dir: Directory written by the export script
+            quantized: Use the int8 model (model_int8.onnx)
+            min_cosine: Minimum verified cosine similarity to the torch vectors
+                (None skips the check, for the verification itself)
+            batch_size: Texts per inference call
+
+        Raises:
+            FileNotFoundError: If the model or tokenizer is missing
+            ValueError: If the model was not verified within min_cosine
+        """
+        from tokenizers import Tokenizer
+
+        self.model_file = INT8_MODEL_FILE if quantized else MODEL_FILE
+        self.model_path = os.path.join(model_dir, self.model_file)
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"ONNX model not found: {self.model_path}")
+
+        self.verification = read_verification(model_dir).get(self.model_file)
+        if min_cosine is None:
+            pass
+        elif self.verification is None:
+            raise ValueError(f"{self.model_path} has not been verified against the torch model")
+        elif self.verification["min_cosine"] < min_cosine:
+            raise ValueError(
+                f"{self.model_path} differs from the torch model "
+                f"(min cosine {self.verification['min_cosine']:.4f} < {min_cosine})"
+            )
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(MAX_LENGTH)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+        self.batch_size = batch_size
+
+        self._session = None
+        self._session_pid = None
+        self._session_inputs = ()
+
+    def _get_session(self):
+        """The inference session of this process (created again after a fork)."""
+        if self._session is None or self._session_pid != os.getpid():
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if _threads:
+                options.intra_op_num_threads = _threads
+                options.inter_op_num_threads = 1
+            self._session = onnxruntime.InferenceSession(
+                self.model_path, options, providers=["CPUExecutionProvider"]
+            )
+            self._session_inputs = {item.name for item in self._session.get_inputs()}
+            self._session_pid = os.getpid()
+        return self._session
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts as a (len(texts), 384) float32 matrix of unit vectors.
+        """
+        session = self._get_session()
+        vectors = np.empty((len(texts), 0), dtype="float32")
+
+        # Batch texts of similar length together to reduce padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch])
+            mask = np.array([e.attention_mask for e in encodings], dtype="int64")
+            feed = {
+                "input_ids": np.array([e.ids for e in encodings], dtype="int64"),
+                "attention_mask": mask,
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype="int64"),
+            }
+            hidden = session.run(None, {name: value for name, value in feed.items() if name in self._session_inputs})[0]
+
+            # Mean pooling over real tokens, then normalize
+            weights = mask[:, :, None].astype("float32")
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), pooled.shape[1]), dtype="float32")
+            vectors[batch] = pooled
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([text])[0].tolist()
+
+
+def read_verification(model_dir: str) -> dict:
+    """Verification results by model file name ({} if none)."""
+    try:
+        with open(os.path.join(model_dir, VERIFICATION_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_verification(model_dir: str, model_file: str, result: dict):
+    """Record the verification result of one model file."""
+    results = read_verification(model_dir)
+    results[model_file] = result
+    path = os.path.join(model_dir, VERIFICATION_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    os.replace(path + ".tmp", path)
@@ -1,24 +1,43 @@
+import re
 import tempfile
-from PyPDF2 import PdfReader
-from langchain.text_splitter import CharacterTextSplitter
-from typing import List
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple
 import os
+from app.config import settings
+from app.services.metrics import time_stage, count_pages, count_chunks
 
+# Heading lines: "Chapter 3", "Section 2: Title", "1.2 Cell Structure", "INTRODUCTION"
+_HEADING = re.compile(
+    r"(?:(?i:chapter|section|unit|part|module|lesson)\s+[0-9IVXLC]+\b.*"
+    r"|\d+(?:\.\d+)*\.?\s+[A-Z][^.!?]*"
+    r"|[A-Z][A-Z0-9 ,:&()'/-]{3,})"
+)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
 
-def extract_text_from_pdf(file_content: bytes) -> str:
+# Chunks are embedded by all-MiniLM-L6-v2, which truncates its input at 256
+# WordPiece tokens, so chunk sizes are counted with the embedding model's own
+# tokenizer rather than the LLM's (numbers, formulas and non-English words
+# take many more WordPiece tokens).
+_token_counter: Optional[Callable[[str], int]] = None
+_token_counter_lock = threading.Lock()
+
+
+def extract_pages_from_pdf(file_content: bytes) -> List[str]:
     """
-    Extract text content from a PDF file.
+    Extract the text of each page of a PDF file.
     
     Args:
         file_content: Raw bytes of the PDF file
         
     Returns:
-        Extracted text as a single string
+        List of page texts in page order (empty string for pages without text)
         
     Raises:
         ValueError: If no text could be extracted (image-based PDF)
     """
-    text = ""
+    from PyPDF2 import PdfReader
+    
+    pages = []
     
     # Write bytes to a temporary file for PyPDF2 to read
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
@@ -26,19 +45,20 @@ def extract_text_from_pdf(file_content: bytes) -> str:
         tmp_path = tmp.name
     
     try:
-        reader = PdfReader(tmp_path)
-        
-        if len(reader.pages) == 0:
-            raise ValueError("PDF has no pages")
-        
-        for page_num, page in enumerate(reader.pages):
-            try:
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
-            except Exception as e:
-                print(f"Warning: Could not extract text from page {page_num + 1}: {e}")
-                continue
+        with time_stage("pdf_extract"):
+            reader = PdfReader(tmp_path)
+            
+            if len(reader.pages) == 0:
+                raise ValueError("PDF has no pages")
+            
+            count_pages(len(reader.pages))
+            
+            for page_num, page in enumerate(reader.pages):
+                try:
+                    pages.append(page.extract_text() or "")
+                except Exception as e:
+                    print(f"Warning: Could not extract text from page {page_num + 1}: {e}")
+                    pages.append("")
                 
     except Exception as e:
         raise ValueError(f"Could not read PDF file: {str(e)}")
@@ -47,8 +67,10 @@ def extract_text_from_pdf(file_content: bytes) -> str:
         if os.path.exists(tmp_path):
             os.remove(tmp_path)
     
+    text = pages_to_text(pages)
+    
     # Check if we got any meaningful text
-    if not text.strip():
+    if not text:
         raise ValueError(
             "No text could be extracted from this PDF. "
             "This usually happens with scanned documents or image-based PDFs. "
@@ -56,39 +78,194 @@ def extract_text_from_pdf(file_content: bytes) -> str:
         )
     
     # Check if text is too short to be useful
-    if len(text.strip()) < 50:
+    if len(text) < 50:
         raise ValueError(
-            f"Very little text extracted ({len(text.strip())} characters). "
+            f"Very little text extracted ({len(text)} characters). "
             "This PDF may contain mostly images. Please use a text-based PDF."
         )
     
-    return text.strip()
+    return pages
+
 
+def pages_to_text(pages: List[str]) -> str:
+    """Join page texts into the document text used for chunking."""
+    return "".join(page + "\n" for page in pages if page).strip()
 
-def split_text_into_chunks(
-    text: str,
-    chunk_size: int = 1000,
-    chunk_overlap: int = 200
-) -> List[str]:
+
+def extract_text_from_pdf(file_content: bytes) -> str:
     """
-    Split text into overlapping chunks for vector storage.
+    Extract text content from a PDF file.
     
     Args:
-        text: The full text to split
-        chunk_size: Maximum size of each chunk
-        chunk_overlap: Number of characters to overlap between chunks
+        file_content: Raw bytes of the PDF file
         
     Returns:
-        List of text chunks
+        Extracted text as a single string
+        
+    Raises:
+        ValueError: If no text could be extracted (image-based PDF)
+    """
+    return pages_to_text(extract_pages_from_pdf(file_content))
+
+
+def embedding_tokens(text: str) -> int:
+    """Count the WordPiece tokens of a piece of text as the embedding model sees it ([CLS]/[SEP] excluded)."""
+    global _token_counter
+    if _token_counter is None:
+        with _token_counter_lock:
+            if _token_counter is None:
+                _token_counter = _load_token_counter()
+    return _token_counter(text)
+
+
+def _load_token_counter() -> Callable[[str], int]:
+    """
+    Count tokens with the tokenizer of the loaded embedding model (torch or
+    ONNX), so chunk sizes always match what the model sees.
+
+    Raises:
+        RuntimeError: If the embedding model has no fast tokenizer
     """
-    splitter = CharacterTextSplitter(
-        separator="\n",
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len
-    )
-    
-    chunks = splitter.split_text(text)
+    from tokenizers import Tokenizer
+    from app.services.vector_store import get_embeddings
+    
+    embeddings = get_embeddings()
+    tokenizer = getattr(embeddings, "tokenizer", None)  # OnnxEmbeddings
+    if tokenizer is None:
+        # HuggingFaceEmbeddings: the SentenceTransformer's fast tokenizer
+        tokenizer = getattr(getattr(getattr(embeddings, "client", None), "tokenizer", None), "backend_tokenizer", None)
+    if not isinstance(tokenizer, Tokenizer):
+        raise RuntimeError(f"{type(embeddings).__name__} has no fast tokenizer to size chunks with")
+    
+    # A copy without the model's truncation and padding
+    tokenizer = Tokenizer.from_str(tokenizer.to_str())
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def is_heading(line: str) -> bool:
+    """Check if a (stripped) line looks like a section heading."""
+    if len(line) > 80 or line[-1] in ".,;" or not any(c.isalpha() for c in line):
+        return False
+    # Numbered headings are short; longer numbered lines are list items
+    max_words = 6 if line[0].isdigit() else 10
+    return len(line.split()) <= max_words and _HEADING.fullmatch(line) is not None
+
+
+def _split_long_line(line: str, start: int, max_tokens: int) -> Iterator[Tuple[int, str, int]]:
+    """Split a line longer than max_tokens at sentence ends, then at words."""
+    tokens = embedding_tokens(line)
+    if tokens <= max_tokens:
+        yield start, line, tokens
+        return
+    
+    pieces = []
+    position = 0
+    for match in _SENTENCE_END.finditer(line):
+        pieces.append((position, line[position:match.start()]))
+        position = match.end()
+    pieces.append((position, line[position:]))
+    if len(pieces) == 1:
+        pieces = [(m.start(), m.group()) for m in re.finditer(r"\S+", line)]
+    
+    # Pack the pieces greedily; a single word longer than max_tokens is kept whole
+    piece_start, piece_end, size = None, 0, 0
+    for offset, piece in pieces:
+        piece_tokens = embedding_tokens(piece)
+        if piece_start is not None and size + piece_tokens > max_tokens:
+            yield start + piece_start, line[piece_start:piece_end], size
+            piece_start, size = None, 0
+        if piece_start is None:
+            piece_start = offset
+        piece_end = offset + len(piece)
+        size += piece_tokens
+    if piece_start is not None:
+        yield start + piece_start, line[piece_start:piece_end], size
+
+
+def split_pages_into_chunks(
+    pages: List[str],
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None
+) -> List[dict]:
+    """
+    Split page texts into token-sized chunks that keep their position in the document.
+    
+    Lines are packed into chunks of at most max_tokens embedding-model
+    tokens (see embedding_tokens()). A new chunk is
+    started at every heading, so chunks never mix two sections; a chunk may
+    continue across a page break within a section. Long lines are split at
+    sentence ends. Only overlap_tokens worth of trailing lines (default 0)
+    are repeated in the next chunk of the same section.
+    
+    Args:
+        pages: Page texts from extract_pages_from_pdf()
+        max_tokens: Maximum embedding tokens per chunk (default CHUNK_TOKENS)
+        overlap_tokens: Tokens of trailing lines repeated in the next chunk
+            (default CHUNK_OVERLAP_TOKENS)
+        
+    Returns:
+        List of chunk dicts: {"text", "page", "page_end", "heading", "start", "end"}
+        with 1-based page numbers and character offsets into the start page
+        ("start") and end page ("end")
+    """
+    max_tokens = max_tokens or settings.CHUNK_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    
+    chunks = []
+    heading = None
+    lines = []  # (page, start, end, text, tokens) of the open chunk
+    
+    def flush(keep_overlap: bool):
+        nonlocal lines
+        if not lines:
+            return
+        chunks.append({
+            "text": "\n".join(line[3] for line in lines),
+            "page": lines[0][0],
+            "page_end": lines[-1][0],
+            "heading": heading,
+            "start": lines[0][1],
+            "end": lines[-1][2]
+        })
+        
+        # Carry the trailing lines that fit in the overlap budget
+        tail, size = [], 0
+        if keep_overlap and overlap_tokens > 0:
+            for line in reversed(lines[1:]):
+                if size + line[4] > overlap_tokens:
+                    break
+                tail.insert(0, line)
+                size += line[4]
+        lines = tail
+    
+    with time_stage("chunk"):
+        for page_number, page in enumerate(pages, start=1):
+            offset = 0
+            for raw in page.split("\n"):
+                line_start = offset + len(raw) - len(raw.lstrip())
+                offset += len(raw) + 1
+                text = raw.strip()
+                if not text:
+                    continue
+                
+                if is_heading(text):
+                    flush(keep_overlap=False)
+                    heading = text
+                
+                for start, piece, tokens in _split_long_line(text, line_start, max_tokens):
+                    size = sum(line[4] for line in lines)
+                    if lines and size + tokens > max_tokens:
+                        flush(keep_overlap=True)
+                        # Drop the overlap if it would not leave room for this piece
+                        if sum(line[4] for line in lines) + tokens > max_tokens:
+                            lines = []
+                    lines.append((page_number, start, start + len(piece), piece, tokens))
+        
+        flush(keep_overlap=False)
+    
+    count_chunks(len(chunks))
     return chunks
 
 
@@ -102,6 +279,8 @@ def get_pdf_metadata(file_content: bytes) -> dict:
     Returns:
         Dictionary containing PDF metadata
     """
+    from PyPDF2 import PdfReader
+    
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
         tmp.write(file_content)
         tmp_path = tmp.name
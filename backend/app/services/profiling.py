@@ -0,0 +1,334 @@
+import functools
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+
+# Slow-request entry of the request running in the current context
+_tracked_request: ContextVar[Optional[dict]] = ContextVar("tracked_request", default=None)
+
+
+# -------------------------
+# Stack sampling
+# -------------------------
+
+def _format_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def thread_stacks(idents: Optional[set] = None, exclude: Optional[set] = None) -> Dict[int, str]:
+    """
+    Take one sample of the current Python stack of some or all threads.
+
+    Args:
+        idents: Thread idents to sample (default: all threads)
+        exclude: Thread idents to skip (e.g. the sampling thread itself)
+
+    Returns:
+        Collapsed stack ("thread;outer;...;inner") by thread ident
+    """
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = {}
+    for ident, frame in sys._current_frames().items():
+        if (idents is not None and ident not in idents) or (exclude and ident in exclude):
+            continue
+        frames = []
+        while frame is not None:
+            frames.append(_format_frame(frame))
+            frame = frame.f_back
+        frames.append(names.get(ident, f"thread-{ident}"))
+        stacks[ident] = ";".join(reversed(frames))
+    return stacks
+
+
+def collect_stacks(exclude: Optional[set] = None) -> Counter:
+    """
+    Take one sample of every thread's current Python stack.
+
+    Args:
+        exclude: Thread idents to skip (e.g. the sampling thread itself)
+
+    Returns:
+        Counter of collapsed stacks ("thread;outer;...;inner") -> 1
+    """
+    return Counter(thread_stacks(exclude=exclude).values())
+
+
+def capture_cpu_profile(seconds: float, interval: float = 0.01) -> Counter:
+    """
+    Sample all threads of this worker for a fixed duration (py-spy style).
+
+    Args:
+        seconds: How long to sample for
+        interval: Time between samples in seconds
+
+    Returns:
+        Counter of collapsed stacks -> sample count
+    """
+    me = {threading.get_ident()}
+    samples = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        samples.update(collect_stacks(exclude=me))
+        time.sleep(interval)
+    return samples
+
+
+def format_collapsed(samples: Counter, header: Optional[dict] = None) -> str:
+    """
+    Render samples in the collapsed-stack format read by flamegraph.pl / speedscope.
+
+    Args:
+        samples: Counter of collapsed stacks -> sample count
+        header: Optional key/value pairs written as leading comment lines
+    """
+    lines = [f"# {key}: {value}" for key, value in (header or {}).items()]
+    lines += [f"{stack} {count}" for stack, count in samples.most_common()]
+    return "\n".join(lines) + "\n"
+
+
+def save_profile(name: str, content: str) -> str:
+    """
+    Write a profile to PROFILE_DIR, pruning the oldest files beyond PROFILE_MAX_FILES.
+
+    Returns:
+        Path of the written file
+    """
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_DIR, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+    files = sorted((entry["created"], entry["name"]) for entry in list_profiles())
+    for _, old in files[:-settings.PROFILE_MAX_FILES]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, old))
+        except OSError:
+            pass
+
+    return path
+
+
+def list_profiles() -> list:
+    """List stored profiles, newest first."""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(settings.PROFILE_DIR):
+        # Other workers may prune the directory concurrently
+        try:
+            stat = os.stat(os.path.join(settings.PROFILE_DIR, name))
+        except FileNotFoundError:
+            continue
+        entries.append({"name": name, "size": stat.st_size, "created": stat.st_mtime})
+    return sorted(entries, key=lambda e: e["created"], reverse=True)
+
+
+# -------------------------
+# Heap snapshots
+# -------------------------
+
+_heap_baseline = None
+
+
+def start_heap_tracking(frames: int = 10) -> bool:
+    """Start tracemalloc and take the baseline snapshot."""
+    global _heap_baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _heap_baseline = tracemalloc.take_snapshot()
+    return True
+
+
+def stop_heap_tracking() -> bool:
+    """Stop tracemalloc and drop the baseline."""
+    global _heap_baseline
+    _heap_baseline = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return True
+
+
+def heap_snapshot(limit: int = 25, reset_baseline: bool = False) -> dict:
+    """
+    Report heap growth since the baseline snapshot.
+
+    Args:
+        limit: Number of allocation sites to return
+        reset_baseline: Make this snapshot the new baseline
+
+    Returns:
+        Dictionary with current/peak traced memory and the top growth sites
+    """
+    global _heap_baseline
+    if not tracemalloc.is_tracing():
+        raise ValueError("Heap tracking is not running. Start it first.")
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    stats = snapshot.compare_to(_heap_baseline, "lineno") if _heap_baseline else snapshot.statistics("lineno")
+    current, peak = tracemalloc.get_traced_memory()
+
+    top = []
+    for stat in stats[:limit]:
+        frame = stat.traceback[0]
+        top.append({
+            "location": f"{frame.filename}:{frame.lineno}",
+            "size": stat.size,
+            "size_diff": getattr(stat, "size_diff", stat.size),
+            "count": stat.count,
+            "count_diff": getattr(stat, "count_diff", stat.count),
+        })
+
+    if reset_baseline:
+        _heap_baseline = snapshot
+
+    return {"current_bytes": current, "peak_bytes": peak, "top": top}
+
+
+# -------------------------
+# Slow-request sampler
+# -------------------------
+
+class SlowRequestSampler:
+    """
+    Samples stacks while a tracked request runs longer than a threshold.
+
+    Requests register themselves with track(). A single background thread
+    wakes every interval; only when some request has crossed the threshold
+    does it sample stacks, so normal requests pay nothing but a dict insert.
+    Only the threads working for a request are sampled into its profile: the
+    event loop thread that tracks it and the threads running functions
+    wrapped with request_thread(). When a slow request finishes its samples
+    are written to PROFILE_DIR.
+    """
+
+    def __init__(self, threshold: float, interval: float):
+        self.threshold = threshold
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="slow-request-sampler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            with self._lock:
+                slow = [
+                    (e, list(e["threads"])) for e in self._active.values()
+                    if now - e["start"] >= self.threshold
+                ]
+            if not slow:
+                continue
+            stacks = thread_stacks(idents={ident for _, idents in slow for ident in idents})
+            for entry, idents in slow:
+                entry["samples"].update(stacks[ident] for ident in idents if ident in stacks)
+
+    @asynccontextmanager
+    async def track(self, label: str):
+        """
+        Track a request; its profile is saved if it turns out to be slow.
+
+        Yields:
+            The request's entry (None when the sampler is off); pass it to
+            finish() to stop sampling before the block exits
+        """
+        if self.threshold <= 0:
+            yield None
+            return
+
+        entry = {
+            "label": label,
+            "start": time.perf_counter(),
+            "end": None,
+            "samples": Counter(),
+            "threads": Counter({threading.get_ident(): 1})
+        }
+        with self._lock:
+            self._active[id(entry)] = entry
+            self._ensure_thread()
+        context_token = _tracked_request.set(entry)
+        try:
+            yield entry
+        finally:
+            _tracked_request.reset(context_token)
+            self.finish(entry)
+            if entry["samples"]:
+                await run_in_threadpool(self._dump, entry, entry["end"] - entry["start"])
+
+    def finish(self, entry: Optional[dict]):
+        """Stop sampling a tracked request (e.g. once its response is sent)."""
+        if entry is None:
+            return
+        with self._lock:
+            if self._active.pop(id(entry), None) is not None:
+                entry["end"] = time.perf_counter()
+
+    def request_thread(self, func: Callable) -> Callable:
+        """
+        Wrap a function so the thread running it is sampled for the request
+        tracked in the caller's context (contextvars follow run_in_threadpool
+        and copy_context().run into the thread).
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            entry = _tracked_request.get()
+            if entry is None:
+                return func(*args, **kwargs)
+            ident = threading.get_ident()
+            with self._lock:
+                entry["threads"][ident] += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    entry["threads"][ident] -= 1
+                    if entry["threads"][ident] <= 0:
+                        del entry["threads"][ident]
+
+        return wrapper
+
+    def _dump(self, entry: dict, duration: float):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", entry["label"]).strip("_")
+        name = f"slow-{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{duration:.1f}s.folded"
+        content = format_collapsed(entry["samples"], header={
+            "request": entry["label"],
+            "duration_seconds": f"{duration:.3f}",
+            "threshold_seconds": self.threshold,
+            "interval_seconds": self.interval,
+            "pid": os.getpid(),
+        })
+        try:
+            save_profile(name, content)
+        except OSError as e:
+            print(f"Error saving slow request profile: {e}")
+
+
+slow_request_sampler = SlowRequestSampler(
+    threshold=settings.SLOW_REQUEST_THRESHOLD,
+    interval=settings.SLOW_REQUEST_SAMPLE_INTERVAL
+)
+
+
+def request_thread(func: Callable) -> Callable:
+    """Attribute the thread that runs func to the slow-request profile of the current request."""
+    return slow_request_sampler.request_thread(func)
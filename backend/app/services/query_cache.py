@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+from app.config import settings
+from app.services.metrics import count_cache
+
+# Query text -> embedding, and (session, index version, search, query, k) ->
+# retrieved rows. Retrieval entries are keyed by the backend's index
+# version, so a created, appended, reloaded or deleted index never serves
+# results cached for its previous contents.
+
+
+class LRUCache:
+    """
+    Bounded mapping that drops the least recently used entry when full.
+
+    Shared by all threads of a process. Lookups are counted in
+    studygenius_cache_lookups_total under the cache's name. A size of 0
+    disables the cache.
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = max(0, maxsize)
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        """Get a cached value (and mark it as recently used), or None."""
+        if not self.maxsize:
+            return None
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+        count_cache(self.name, value is not None)
+        return value
+
+    def put(self, key: Hashable, value):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Drop the entries whose key matches a predicate.
+
+        Returns:
+            Number of entries dropped
+        """
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def stats(self) -> dict:
+        """Size and hit rate since the process started."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+def normalize_query(text: str) -> str:
+    """Cache key of a query: case and whitespace do not change the embedding (the model is uncased)."""
+    return " ".join(text.split()).lower()
+
+
+embedding_cache = LRUCache("query_embedding", settings.QUERY_CACHE_SIZE)
+retrieval_cache = LRUCache("retrieval", settings.RETRIEVAL_CACHE_SIZE)
+
+
+def retrieval_key(session_id: str, version: int, search: str, query: str, k: int) -> tuple:
+    """Key of a retrieval result: session, index version, search kind, normalized query and k."""
+    return (session_id, version, search, normalize_query(query), k)
+
+
+def forget_session_results(session_id: str) -> int:
+    """Drop a session's cached retrieval results (e.g. when it is deleted)."""
+    return retrieval_cache.discard(lambda key: key[0] == session_id)
+
+
+def cache_stats() -> dict:
+    """Size and hit rate of the query embedding and retrieval caches."""
+    return {
+        "query_embedding": embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats()
+    }
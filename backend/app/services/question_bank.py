@@ -0,0 +1,292 @@
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Dict, List, Optional
+import numpy as np
+from app.config import settings
+from app.services.metrics import time_stage
+from app.services.session_manager import session_lease
+from app.services.session_registry import session_dir, get_documents
+from app.services.tracing import span
+
+BANK_FILE = "question_bank.json"
+
+# Question kinds kept in the bank (see llm_service.QUESTION_KINDS)
+BANK_KINDS = ("mcq", "short", "long")
+
+# A bank still "building" after this long was abandoned (e.g. the worker
+# building it was restarted) and is reported as failed
+_STALE_BUILD_SECONDS = 3600
+
+# Question banks by session_id (only "ready" banks are cached)
+_banks: dict = {}
+_banks_lock = threading.Lock()
+
+_NON_WORD = re.compile(r"\W+")
+
+
+def _store_path(session_id: str) -> str:
+    return os.path.join(session_dir(session_id), BANK_FILE)
+
+
+def _write_bank(session_id: str, bank: dict):
+    """Write the bank atomically so readers never see a partial file."""
+    path = _store_path(session_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(bank, f)
+    os.replace(tmp_path, path)
+
+
+def bank_difficulties() -> List[str]:
+    """Difficulties pre-generated for each kind (QUESTION_BANK_DIFFICULTIES)."""
+    return [d.strip().lower() for d in settings.QUESTION_BANK_DIFFICULTIES.split(",") if d.strip()]
+
+
+def chunk_groups(labels: Optional[np.ndarray], count: int, size: int, max_groups: int) -> List[List[int]]:
+    """
+    Split a document's chunks into the contexts questions are generated from.
+
+    Chunks of one k-means cluster stay together (in document order), so each
+    context is about one part of the material; clusters larger than `size`
+    are split. Without clusters, consecutive runs of `size` chunks are used.
+    When there are more than max_groups contexts, an evenly spaced subset
+    is kept so the whole document is still covered.
+
+    Args:
+        labels: Cluster label per chunk row, or None
+        count: Number of chunks in the session
+        size: Maximum chunks per context
+        max_groups: Maximum number of contexts
+
+    Returns:
+        Lists of chunk rows
+    """
+    size = max(1, size)
+    if labels is None:
+        runs = [list(range(count))]
+    else:
+        runs = [np.flatnonzero(labels == label).tolist() for label in np.unique(labels)]
+
+    groups = [run[i:i + size] for run in runs for i in range(0, len(run), size)]
+    groups.sort(key=lambda group: group[0])
+    if len(groups) > max_groups > 0:
+        groups = [groups[(i * len(groups)) // max_groups] for i in range(max_groups)]
+    return groups
+
+
+def build_question_bank(session_id: str) -> Optional[dict]:
+    """
+    Pre-generate a tagged question bank for a teacher session.
+
+    The document is split into contexts (chunk_groups), and for every
+    context, question kind and difficulty in QUESTION_BANK_DIFFICULTIES the
+    LLM writes a share of QUESTION_BANK_SIZE questions, answers included.
+    Each question is tagged with its kind, difficulty and the chunk rows it
+    was written from. Runs as a background task after upload; the bank is
+    stored as question_bank.json in the session directory.
+
+    Args:
+        session_id: Session identifier (its vector store must already exist)
+
+    Returns:
+        The bank, or None if building failed
+    """
+    try:
+        with session_lease(session_id):
+            return _build_bank(session_id)
+    except ValueError as e:
+        print(f"Warning: Skipping question bank for session {session_id}: {e}")
+        return None
+
+
+def _build_bank(session_id: str) -> Optional[dict]:
+    # Imported here: llm_service imports this module
+    from app.services.llm_service import generate_section_questions
+    from app.services.vector_store import get_clusters, load_vector_store
+    from app.services.backends import get_backend
+
+    try:
+        _write_bank(session_id, {"status": "building", "started": time.time()})
+    except OSError as e:
+        print(f"Warning: Could not start question bank for session {session_id}: {e}")
+        return None
+
+    try:
+        if not load_vector_store(session_id):
+            raise ValueError("vector store not found")
+        backend = get_backend()
+        clusters = get_clusters(session_id)
+        groups = chunk_groups(
+            clusters[0] if clusters is not None else None,
+            backend.stats(session_id)["vectors"],
+            settings.PAPER_CONTEXT_CHUNKS,
+            settings.QUESTION_BANK_GROUPS
+        )
+        contexts = [
+            "\n\n".join(doc["text"] for doc in backend.documents(session_id, group))
+            for group in groups
+        ]
+
+        documents = get_documents(session_id)
+        filename = documents[0]["filename"] if documents and documents[0]["filename"] else ""
+        topic = os.path.splitext(filename)[0] or "the uploaded material"
+        per_context = max(1, math.ceil(settings.QUESTION_BANK_SIZE / max(1, len(groups))))
+
+        jobs = [
+            (kind, difficulty, index)
+            for kind in BANK_KINDS
+            for difficulty in bank_difficulties()
+            for index in range(len(groups))
+        ]
+        with span("question_bank.build", session_id=session_id, calls=len(jobs)), time_stage("question_bank_build"):
+            with ThreadPoolExecutor(
+                max_workers=max(1, settings.QUESTION_BANK_PARALLEL),
+                thread_name_prefix="question-bank"
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        copy_context().run, generate_section_questions,
+                        kind, per_context, topic, difficulty, contexts[index], True
+                    )
+                    for kind, difficulty, index in jobs
+                ]
+
+                questions, seen = [], set()
+                for (kind, difficulty, index), future in zip(jobs, futures):
+                    try:
+                        generated = future.result()
+                    except Exception as e:
+                        print(f"Warning: Question bank generation failed ({kind}, {difficulty}): {e}")
+                        continue
+                    for question in generated:
+                        key = _NON_WORD.sub(" ", question.get("question", "").lower()).strip()
+                        if not key or key in seen:
+                            continue
+                        seen.add(key)
+                        question = {k: v for k, v in question.items() if k != "number"}
+                        questions.append({
+                            "id": len(questions),
+                            "kind": kind,
+                            "difficulty": difficulty,
+                            "chunks": groups[index],
+                            **question
+                        })
+
+        if not questions:
+            raise ValueError("no questions were generated")
+
+        bank = {
+            "status": "ready",
+            "difficulties": bank_difficulties(),
+            "contexts": len(groups),
+            "questions": questions
+        }
+        _write_bank(session_id, bank)
+    except Exception as e:
+        print(f"Warning: Could not build question bank for session {session_id}: {e}")
+        try:
+            _write_bank(session_id, {"status": "failed", "error": str(e)})
+        except OSError:
+            pass
+        return None
+
+    with _banks_lock:
+        _banks[session_id] = bank
+    return bank
+
+
+def get_question_bank(session_id: str) -> Optional[dict]:
+    """
+    Get the question bank of a session.
+
+    Returns:
+        The bank dict (its "status" is "building", "ready" or "failed"),
+        or None if no bank was started for the session. A build that has
+        not finished within _STALE_BUILD_SECONDS is reported as failed.
+    """
+    # Check in-memory cache first
+    bank = _banks.get(session_id)
+    if bank is not None:
+        return bank
+
+    path = _store_path(session_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            bank = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read question bank for session {session_id}: {e}")
+        return None
+
+    if bank.get("status") == "ready":
+        with _banks_lock:
+            _banks[session_id] = bank
+    elif bank.get("status") == "building":
+        # Banks written before "started" was recorded: use the file time
+        started = bank.get("started") or os.path.getmtime(path)
+        if time.time() - started > _STALE_BUILD_SECONDS:
+            return {"status": "failed", "error": "build did not finish (the worker building it stopped)"}
+    return bank
+
+
+def forget_question_bank(session_id: str):
+    """Drop a session's question bank from the in-memory cache."""
+    with _banks_lock:
+        _banks.pop(session_id, None)
+
+
+def bank_topic_scores(session_id: str, bank: dict, topic: str) -> Dict[int, float]:
+    """
+    Cosine similarity of the topic to each chunk bank questions were written from.
+
+    Computed once per paper, for the bank's chunks only, so backends that
+    keep float vectors outside memory (binary precision) read as few as
+    possible.
+
+    Returns:
+        Score by chunk row
+    """
+    from app.services.vector_store import embed_query
+    from app.services.backends import get_backend
+
+    rows = sorted({row for q in bank["questions"] for row in q["chunks"]})
+    if not rows:
+        return {}
+    with time_stage("question_bank_sample"):
+        scores = get_backend().vectors(session_id, rows) @ embed_query(topic)
+    return dict(zip(rows, scores.tolist()))
+
+
+def bank_candidates(bank: dict, kind: str, difficulty: str, scores: Dict[int, float]) -> List[dict]:
+    """
+    Bank questions usable in a paper section, in random order.
+
+    A question is relevant to the topic when one of the chunks it was
+    written from has cosine similarity of at least QUESTION_BANK_MIN_SCORE
+    with the topic.
+
+    Args:
+        bank: Ready bank from get_question_bank()
+        kind: "mcq", "short" or "long"
+        difficulty: Paper difficulty
+        scores: Topic score by chunk row from bank_topic_scores()
+
+    Returns:
+        Copies of the matching questions (with their tags)
+    """
+    difficulty = difficulty.lower()
+    relevant = [
+        dict(q) for q in bank["questions"]
+        if q["kind"] == kind and q["difficulty"] == difficulty and q["chunks"]
+        and max(scores.get(row, -1.0) for row in q["chunks"]) >= settings.QUESTION_BANK_MIN_SCORE
+    ]
+    random.shuffle(relevant)
+    return relevant
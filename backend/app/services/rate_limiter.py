@@ -0,0 +1,46 @@
+import threading
+import time
+from contextlib import contextmanager
+from app.config import settings
+from app.services.metrics import observe_stage
+
+
+class UpstreamLimiter:
+    """
+    Bounds calls to the upstream LLM API across all requests in this process.
+
+    Limits both the number of calls in flight and, optionally, the rate at
+    which calls start (evenly spaced to stay under a requests-per-minute quota).
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: int = 0):
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+        self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self):
+        """Wait for permission to make one upstream call."""
+        start = time.perf_counter()
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            if self._interval:
+                with self._lock:
+                    now = time.monotonic()
+                    wait = max(0.0, self._next_start - now)
+                    self._next_start = max(now, self._next_start) + self._interval
+                if wait:
+                    time.sleep(wait)
+            observe_stage("llm_queue", time.perf_counter() - start)
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+
+upstream_limiter = UpstreamLimiter(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE
+)
@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import List, Optional, Tuple
+from app.config import settings
+from app.services.metrics import observe_stage, estimate_tokens, count_rerank_savings
+from app.services.tracing import span
+
+# The cross-encoder (sentence-transformers, CPU) is loaded on first use.
+# If it cannot be loaded, questions are answered without reranking.
+_model = None
+_model_failed = False
+_model_lock = threading.Lock()
+
+
+def get_reranker():
+    """Get the shared cross-encoder, or None if it is unavailable."""
+    global _model, _model_failed
+    if _model is None and not _model_failed:
+        with _model_lock:
+            if _model is None and not _model_failed:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    
+                    _model = CrossEncoder(settings.RERANK_MODEL, device="cpu", max_length=512)
+                except Exception as e:
+                    print(f"Warning: Could not load reranker {settings.RERANK_MODEL}, reranking disabled: {e}")
+                    _model_failed = True
+    return _model
+
+
+def rerank(
+    query: str,
+    candidates: List[dict],
+    top_k: int,
+    baseline_k: Optional[int] = None
+) -> Tuple[List[dict], Optional[dict]]:
+    """
+    Rescore retrieved chunks with the cross-encoder and keep the best ones.
+    
+    Args:
+        query: The user's question
+        candidates: Retrieved chunks (dicts with "text"), in bi-encoder order
+        top_k: Number of chunks to keep
+        baseline_k: Chunks the LLM would get without reranking, to report
+            the prompt tokens saved (defaults to top_k)
+        
+    Returns:
+        Tuple of (kept chunks, best first; report dict with candidates, kept,
+        latency_ms, context_tokens, baseline_tokens and tokens_saved).
+        Without a reranker this is (the first baseline_k candidates, None).
+    """
+    baseline_k = baseline_k or top_k
+    model = get_reranker() if candidates else None
+    if model is None:
+        return candidates[:baseline_k], None
+    
+    with span("rerank", candidates=len(candidates), top_k=top_k) as s:
+        start = time.perf_counter()
+        scores = model.predict(
+            [(query, candidate["text"]) for candidate in candidates],
+            batch_size=settings.RERANK_BATCH_SIZE,
+            show_progress_bar=False
+        )
+        order = sorted(range(len(candidates)), key=lambda i: float(scores[i]), reverse=True)
+        kept = [candidates[i] for i in order[:top_k]]
+        seconds = time.perf_counter() - start
+        
+        context_tokens = sum(estimate_tokens(chunk["text"]) for chunk in kept)
+        baseline_tokens = sum(estimate_tokens(chunk["text"]) for chunk in candidates[:baseline_k])
+        report = {
+            "candidates": len(candidates),
+            "kept": len(kept),
+            "latency_ms": round(seconds * 1000, 1),
+            "context_tokens": context_tokens,
+            "baseline_tokens": baseline_tokens,
+            "tokens_saved": baseline_tokens - context_tokens
+        }
+        if s is not None:
+            for key, value in report.items():
+                s.set_attribute(f"rerank.{key}", value)
+    
+    observe_stage("rerank", seconds)
+    count_rerank_savings(report["tokens_saved"])
+    return kept, report
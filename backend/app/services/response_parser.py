@@ -0,0 +1,339 @@
+import re
+from typing import List
+
+# -------------------------
+# Precompiled patterns
+# -------------------------
+
+# Intro lines LLMs add before the first question
+_SKIP_START = re.compile(
+    r"(?:here are|here is|okay,|sure,|below are|i'll create|i will create)"
+)
+
+# Trailing notes LLMs add after the last question
+_STOP = re.compile(
+    r"(?:note that|note:|i have|i've used|please note|the above|these questions"
+    r"|based on the|let me know|hope this helps|this question assesses|this tests)"
+)
+
+# Question line: "1.", "1)", "Q1:", "Question 1:"
+_MCQ_QUESTION = re.compile(r"^(?:Q(?:uestion)?\s*)?(\d+)[\.\:\)]\s*(.+)", re.IGNORECASE)
+_THEORY_QUESTION = re.compile(r"^(?:Q(?:uestion)?\.?\s*)?(\d+)[.\)]\s*(.+)", re.IGNORECASE)
+
+# Option line: "A)", "B.", "C:" (MCQ mode also accepts "A " separators)
+_MCQ_OPTION = re.compile(r"^([A-D])[\.\)\:\s]+(.+)", re.IGNORECASE)
+_PAPER_OPTION = re.compile(r"^([A-D])[\.\)\:]\s*(.+)", re.IGNORECASE)
+
+# Answer line
+_MCQ_ANSWER = re.compile(r"^(?:Answer|Correct Answer|Ans)[\:\s]+([A-D])", re.IGNORECASE)
+_THEORY_ANSWER = re.compile(r"^(?:Answer|Ans)[:\s]+(.+)", re.IGNORECASE)
+_PAPER_ANSWER = re.compile(r"^(?:Answer|Correct Answer|Ans)[\:\s]+(.+)", re.IGNORECASE)
+
+# Section headers of a combined question paper
+_SECTIONS = (
+    (re.compile(r"SECTION A|MULTIPLE CHOICE"), "Section A - Multiple Choice Questions", 1),
+    (re.compile(r"SECTION B|SHORT ANSWER"), "Section B - Short Answer Questions", 2),
+    (re.compile(r"SECTION C|LONG ANSWER"), "Section C - Long Answer Questions", 5),
+)
+
+MODES = ("mcq", "theory", "paper")
+
+
+class ResponseParser:
+    """
+    Single-pass parser for LLM question output.
+
+    Cleans the response (markdown markers, intro lines, trailing notes) and
+    parses MCQ, theory or sectioned question papers in one linear scan.
+    Text can be fed incrementally as it streams from the LLM; feed() returns
+    the questions completed by that chunk, close() returns the final result.
+
+    Usage:
+        parser = ResponseParser("mcq", include_answers=True)
+        for token in stream:
+            for question in parser.feed(token):
+                ...
+        questions = parser.close()
+    """
+
+    def __init__(self, mode: str = "mcq", include_answers: bool = False, clean: bool = True):
+        """
+        Args:
+            mode: "mcq", "theory" or "paper" (sectioned MCQ/short/long)
+            include_answers: Whether answers were requested (kept for API symmetry;
+                answer lines are parsed whenever present)
+            clean: Strip markdown markers, intro lines and trailing notes while parsing
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown parser mode: {mode}")
+        self.mode = mode
+        self.include_answers = include_answers
+        self.clean = clean
+
+        self._buffer = ""
+        self._started = not clean
+        self._stopped = False
+        self._clean_lines = []
+
+        self.questions = []
+        self.sections = []
+        self._question = None
+        self._options = []
+        self._answer = []
+        self._in_answer = False
+        self._section = None
+
+    # -------------------------
+    # Input
+    # -------------------------
+
+    def feed(self, text: str) -> List[dict]:
+        """
+        Consume a chunk of streamed text.
+
+        Returns:
+            Questions completed by this chunk (possibly empty)
+        """
+        if self._stopped or not text:
+            return []
+        self._buffer += text
+        if "\n" not in text:
+            return []
+
+        *lines, self._buffer = self._buffer.split("\n")
+        completed = []
+        for line in lines:
+            self._feed_line(line, completed)
+            if self._stopped:
+                break
+        return completed
+
+    def close(self) -> list:
+        """
+        Flush the remaining input and return the parsed result.
+
+        Returns:
+            List of questions (mcq/theory) or list of sections (paper)
+        """
+        self._close()
+        return self.sections if self.mode == "paper" else self.questions
+
+    def _close(self) -> List[dict]:
+        completed = []
+        if not self._stopped:
+            self._feed_line(self._buffer, completed)
+        self._buffer = ""
+        self._stopped = True
+        self._finish(completed)
+        return completed
+
+    @property
+    def cleaned_text(self) -> str:
+        """The cleaned response text seen so far."""
+        return "\n".join(self._clean_lines).strip()
+
+    # -------------------------
+    # Cleaning
+    # -------------------------
+
+    def _feed_line(self, raw: str, completed: list):
+        if self.clean:
+            raw = raw.replace("**", "").replace("__", "")
+            lower = raw.lower().strip()
+            if not self._started:
+                if _SKIP_START.match(lower):
+                    return
+                if lower and (lower[0].isdigit() or lower[0] == "q"):
+                    self._started = True
+                else:
+                    return
+            elif _STOP.match(lower):
+                self._stopped = True
+                return
+        self._clean_lines.append(raw)
+
+        line = raw.strip()
+        if not line:
+            return
+        if self.mode == "mcq":
+            self._mcq_line(line, completed)
+        elif self.mode == "theory":
+            self._theory_line(line, completed)
+        else:
+            self._paper_line(line, completed)
+
+    # -------------------------
+    # MCQ
+    # -------------------------
+
+    def _mcq_line(self, line: str, completed: list):
+        match = _MCQ_QUESTION.match(line)
+        if match:
+            self._flush_mcq(completed)
+            self._question = {"number": int(match.group(1)), "question": match.group(2).strip()}
+            self._options = []
+            return
+
+        match = _MCQ_OPTION.match(line)
+        if match:
+            self._options.append(f"{match.group(1).upper()}) {match.group(2).strip()}")
+            return
+
+        match = _MCQ_ANSWER.match(line)
+        if match and self._question:
+            self._question["answer"] = match.group(1).upper()
+            return
+
+        if self._question and not self._options and len(line) > 5:
+            self._question["question"] += " " + line
+
+    def _flush_mcq(self, completed: list):
+        if self._question and self._options:
+            self._question["options"] = self._options
+            self.questions.append(self._question)
+            completed.append(self._question)
+
+    # -------------------------
+    # Theory
+    # -------------------------
+
+    def _theory_line(self, line: str, completed: list):
+        match = _THEORY_QUESTION.match(line)
+        if match:
+            self._flush_theory(completed)
+            self._question = {"number": int(match.group(1)), "question": match.group(2).strip()}
+            self._answer = []
+            self._in_answer = False
+            return
+
+        match = _THEORY_ANSWER.match(line)
+        if match and self._question:
+            self._in_answer = True
+            self._answer.append(match.group(1).strip())
+            return
+
+        if self._in_answer and self._question:
+            self._answer.append(line)
+        elif self._question:
+            self._question["question"] += " " + line
+
+    def _flush_theory(self, completed: list):
+        if self._question:
+            if self._in_answer and self._answer:
+                self._question["answer"] = " ".join(self._answer)
+            self.questions.append(self._question)
+            completed.append(self._question)
+
+    # -------------------------
+    # Sectioned paper
+    # -------------------------
+
+    def _paper_line(self, line: str, completed: list):
+        upper = line.upper()
+        for index, (pattern, name, marks) in enumerate(_SECTIONS):
+            if pattern.search(upper):
+                self._paper_section(index, name, marks, completed)
+                return
+
+        match = _MCQ_QUESTION.match(line)
+        if match:
+            if self._question and self._section:
+                self._flush_paper_question(with_options=True, completed=completed)
+            self._question = {"number": int(match.group(1)), "question": match.group(2).strip()}
+            self._options = []
+            return
+
+        match = _PAPER_OPTION.match(line)
+        if match and self._question:
+            self._options.append(f"{match.group(1).upper()}) {match.group(2).strip()}")
+            return
+
+        match = _PAPER_ANSWER.match(line)
+        if match and self._question:
+            self._question["answer"] = match.group(1).strip()
+            return
+
+        if self._question and not line.startswith(("*", "-", "•")):
+            if len(self._question.get("question", "")) < 200:
+                self._question["question"] = self._question.get("question", "") + " " + line
+
+    def _paper_section(self, index: int, name: str, marks: int, completed: list):
+        # A repeated "Section A" header starts over without closing the open
+        # section or question; B and C close the open section first.
+        if index > 0:
+            if self._section:
+                if self._question:
+                    self._flush_paper_question(with_options=(index == 1), completed=completed)
+                self.sections.append(self._section)
+            self._question = None
+            self._options = []
+        self._section = {"name": name, "marks_per_question": marks, "questions": []}
+
+    def _flush_paper_question(self, with_options: bool, completed: list):
+        if with_options and self._options:
+            self._question["options"] = self._options
+        self._section["questions"].append(self._question)
+        completed.append(self._question)
+
+    # -------------------------
+    # End of input
+    # -------------------------
+
+    def _finish(self, completed: list):
+        text = self.cleaned_text
+
+        if self.mode == "mcq":
+            self._flush_mcq(completed)
+            self._question = None
+            if not self.questions:
+                self.questions = [{
+                    "number": 1,
+                    "question": text[:500],
+                    "options": ["A) Option A", "B) Option B", "C) Option C", "D) Option D"]
+                }]
+
+        elif self.mode == "theory":
+            self._flush_theory(completed)
+            self._question = None
+            if not self.questions:
+                self.questions = [{"number": 1, "question": text[:500]}]
+
+        else:
+            if self._question and self._section:
+                self._flush_paper_question(with_options=True, completed=completed)
+            if self._section:
+                self.sections.append(self._section)
+            self._question = None
+            self._section = None
+            if not self.sections or all(len(s.get("questions", [])) == 0 for s in self.sections):
+                self.sections = [{
+                    "name": "Questions",
+                    "marks_per_question": 2,
+                    "questions": [{"number": 1, "question": text[:2000]}]
+                }]
+
+
+def parse_response(response: str, mode: str, include_answers: bool = False, clean: bool = True) -> list:
+    """
+    Clean and parse a complete LLM response in one pass.
+
+    Args:
+        response: Raw LLM output
+        mode: "mcq", "theory" or "paper"
+        include_answers: Whether answers were requested
+        clean: Strip markdown markers, intro lines and trailing notes while parsing
+
+    Returns:
+        List of questions (mcq/theory) or list of sections (paper)
+    """
+    parser = ResponseParser(mode, include_answers, clean)
+    parser.feed(response)
+    return parser.close()
+
+
+def clean_response(response: str) -> str:
+    """Apply only the cleaning rules and return the cleaned text."""
+    parser = ResponseParser("theory", clean=True)
+    parser.feed(response)
+    parser.close()
+    return parser.cleaned_text
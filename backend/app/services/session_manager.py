@@ -0,0 +1,361 @@
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from app.config import settings
+from app.services.metrics import count_session_eviction
+from app.services.vector_store import delete_vector_store, evict_from_memory, get_index_stats
+from app.services.backends import get_backend
+from app.services import session_registry as registry
+from app.services.session_registry import session_dir
+
+# Sessions stuck in "deleting" this long (e.g. after a crash) are cleaned up by the reaper
+_STALE_DELETE_SECONDS = 3600
+
+# Lease heartbeats are renewed this often (well within registry.LEASE_TIMEOUT)
+_HEARTBEAT_SECONDS = registry.LEASE_TIMEOUT / 5
+
+_lock = threading.Lock()
+_leases: dict = {}  # session_id -> [requests in this process using it, registry leases held for them]
+_persisted: dict = {}  # session_id -> last access time written to the registry
+_accesses: dict = {}  # session_id -> accesses not yet added to the registry heat
+
+_reaper_thread = None
+
+
+class SessionUnavailable(ValueError):
+    """A session does not exist or is being deleted (raised by session_lease)."""
+
+
+def _dir_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return size
+
+
+def register_session(
+    session_id: str,
+    owner: Optional[str],
+    kind: str,
+    filename: str,
+    pages: Optional[int] = None,
+    chunks: Optional[int] = None
+) -> dict:
+    """
+    Record a newly created session in the registry and enforce disk quotas.
+
+    Args:
+        session_id: Session identifier (its vector store must already exist)
+        owner: User id from the X-User-Id header, or None
+        kind: "student" or "teacher"
+        filename: Uploaded file name
+        pages: Number of PDF pages
+        chunks: Number of indexed chunks
+
+    Returns:
+        The session metadata
+    """
+    # Index data kept outside the session directory (shared database) counts too
+    size_bytes = _dir_size(session_dir(session_id))
+    if not get_backend().stores_in_session_dir:
+        size_bytes += get_index_stats(session_id)["disk_bytes"]
+
+    session = registry.add_session(
+        session_id,
+        owner=owner or "anonymous",
+        kind=kind,
+        size_bytes=size_bytes,
+        filename=filename,
+        pages=pages,
+        chunks=chunks
+    )
+    with _lock:
+        _persisted[session_id] = session["last_accessed"]
+
+    enforce_quotas(keep=session_id)
+    return session
+
+
+def get_session(session_id: str) -> Optional[dict]:
+    """
+    Get a session's metadata with its uploaded document.
+
+    Returns:
+        Metadata dict, or None if the session does not exist or is being deleted
+    """
+    session = registry.get_session(session_id)
+    if session is None or session["state"] != registry.READY:
+        return None
+
+    documents = registry.get_documents(session_id)
+    document = documents[0] if documents else {}
+    session.update(
+        filename=document.get("filename"),
+        pages=document.get("pages"),
+        chunks=document.get("chunks")
+    )
+    return session
+
+
+def _due_accesses(session_id: str, now: float) -> int:
+    """Count an access; return the accesses to write to the registry now (0 within SESSION_TOUCH_INTERVAL)."""
+    with _lock:
+        _accesses[session_id] = _accesses.get(session_id, 0) + 1
+        if now - _persisted.get(session_id, 0) < settings.SESSION_TOUCH_INTERVAL:
+            return 0
+        _persisted[session_id] = now
+        return _accesses.pop(session_id)
+
+
+def touch_session(session_id: str):
+    """
+    Mark a session as accessed.
+
+    Accesses are counted in memory and the registry is written at most once
+    per SESSION_TOUCH_INTERVAL, so other workers' reapers see the session as
+    active and startup preloading can rank sessions by access frequency.
+    """
+    now = time.time()
+    count = _due_accesses(session_id, now)
+    if count:
+        registry.record_access(session_id, count, now)
+
+
+@contextmanager
+def session_lease(session_id: str):
+    """
+    Hold a session open while a request uses it.
+
+    The lease is kept in the shared registry, so no worker's reaper or
+    DELETE removes a leased session; a session deleted while leased is
+    removed by whichever worker returns the last lease. Requests using the
+    same session in this process share one registry lease, so the registry
+    is only written when the first of them starts (together with the access
+    count) and when the last one ends. Use it in the threadpool together
+    with the work, not on the event loop.
+
+    Raises:
+        SessionUnavailable: If the session does not exist or is being deleted
+    """
+    with _lock:
+        held = _leases.get(session_id)
+        if held is not None:
+            held[0] += 1
+
+    if held is None:
+        now = time.time()
+        if not registry.acquire_lease(session_id, _due_accesses(session_id, now), now):
+            raise SessionUnavailable(f"Session {session_id} does not exist or is being deleted")
+        with _lock:
+            held = _leases.setdefault(session_id, [0, 0])
+            held[0] += 1
+            held[1] += 1
+    else:
+        # Joined a lease this process already holds: the session may have been deleted since
+        session = registry.get_session(session_id)
+        if session is None or session["state"] != registry.READY:
+            _release_lease(session_id)
+            raise SessionUnavailable(f"Session {session_id} does not exist or is being deleted")
+        touch_session(session_id)
+
+    try:
+        yield
+    finally:
+        _release_lease(session_id)
+
+
+def _release_lease(session_id: str):
+    with _lock:
+        held = _leases[session_id]
+        held[0] -= 1
+        if held[0] > 0:
+            return
+        del _leases[session_id]
+    if registry.release_lease(session_id, held[1]):
+        _remove(session_id, "deleted")
+
+
+def delete_session(session_id: str) -> bool:
+    """
+    Delete a session now, or as soon as the requests using it finish.
+
+    The session is marked "deleting" in the registry first, so no worker
+    starts new requests on it. If requests in any worker still hold leases,
+    the worker returning the last one removes it.
+
+    Returns:
+        False if the session does not exist
+    """
+    if get_session(session_id) is None:
+        return False
+
+    leased = registry.mark_deleting(session_id)
+    if leased is False:
+        _remove(session_id, "deleted")
+    return True
+
+
+def _remove(session_id: str, reason: str):
+    try:
+        delete_vector_store(session_id)
+        registry.remove_session(session_id)
+        count_session_eviction(reason)
+    except Exception as e:
+        print(f"Warning: Could not delete session {session_id}: {e}")
+    finally:
+        with _lock:
+            _persisted.pop(session_id, None)
+            _accesses.pop(session_id, None)
+
+
+def _try_evict(session_id: str, reason: str, stale_before: Optional[float] = None) -> bool:
+    """Remove an idle session; sessions leased in any worker are skipped."""
+    if not registry.claim_for_removal(session_id, stale_before):
+        return False
+    _remove(session_id, reason)
+    return True
+
+
+def list_sessions() -> List[dict]:
+    """Metadata of every servable session, most recently accessed first."""
+    return registry.list_sessions()
+
+
+def enforce_quotas(sessions: Optional[List[dict]] = None, keep: Optional[str] = None) -> int:
+    """
+    Evict least recently used sessions until per-user and global disk quotas hold.
+
+    Args:
+        sessions: Session metadata (default: list_sessions())
+        keep: Session never evicted (e.g. the upload that triggered the check)
+
+    Returns:
+        Number of sessions evicted
+    """
+    user_quota = settings.SESSION_USER_QUOTA_MB * 1024 * 1024
+    disk_quota = settings.SESSION_DISK_QUOTA_MB * 1024 * 1024
+    if user_quota <= 0 and disk_quota <= 0:
+        return 0
+
+    sessions = sorted(
+        list_sessions() if sessions is None else sessions,
+        key=lambda s: s["last_accessed"]
+    )
+    # Sessions leased by a request in any worker count toward usage but are never evicted
+    now = time.time()
+    evictable = {s["session_id"] for s in sessions if s["session_id"] != keep and not registry.is_leased(s, now)}
+    evicted = 0
+
+    if user_quota > 0:
+        usage = {}
+        for session in sessions:
+            usage[session["owner"]] = usage.get(session["owner"], 0) + session["size_bytes"]
+        for session in list(sessions):
+            owner = session["owner"]
+            if usage[owner] > user_quota and session["session_id"] in evictable:
+                if _try_evict(session["session_id"], "user_quota"):
+                    usage[owner] -= session["size_bytes"]
+                    sessions.remove(session)
+                    evicted += 1
+
+    if disk_quota > 0:
+        total = sum(session["size_bytes"] for session in sessions)
+        for session in list(sessions):
+            if total <= disk_quota:
+                break
+            if session["session_id"] in evictable and _try_evict(session["session_id"], "disk_quota"):
+                total -= session["size_bytes"]
+                sessions.remove(session)
+                evicted += 1
+
+    return evicted
+
+
+def reap_sessions(now: Optional[float] = None) -> dict:
+    """
+    Expire idle sessions and enforce disk quotas.
+
+    Sessions idle for more than SESSION_TTL_HOURS are removed, then the
+    least recently used sessions are evicted while a quota is exceeded.
+    Sessions leased by a request in any worker are skipped.
+
+    Returns:
+        Counts: {"expired", "evicted", "remaining"}
+    """
+    now = now or time.time()
+    sessions = list_sessions()
+
+    expired = 0
+    if settings.SESSION_TTL_HOURS > 0:
+        ttl = settings.SESSION_TTL_HOURS * 3600
+        for session in list(sessions):
+            if now - session["last_accessed"] <= ttl or registry.is_leased(session, now):
+                continue
+            if _try_evict(session["session_id"], "ttl"):
+                sessions.remove(session)
+                expired += 1
+
+    evicted = enforce_quotas(sessions)
+
+    # Finish deletions interrupted by a restart
+    for session in registry.list_sessions(state=registry.DELETING):
+        if now - session["updated"] > _STALE_DELETE_SECONDS and not registry.is_leased(session, now):
+            _try_evict(session["session_id"], "deleted", stale_before=now - _STALE_DELETE_SECONDS)
+    if os.path.isdir(settings.VECTOR_STORE_PATH):
+        for entry in os.scandir(settings.VECTOR_STORE_PATH):
+            if entry.name.startswith(".deleted-") and entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    # Drop in-memory indexes of sessions another worker removed
+    evict_from_memory(lambda session_id: get_session(session_id) is None)
+
+    return {"expired": expired, "evicted": evicted, "remaining": len(sessions) - evicted}
+
+
+def renew_leases():
+    """Refresh the registry heartbeat of the sessions leased by requests in this process."""
+    with _lock:
+        session_ids = list(_leases)
+    registry.renew_leases(session_ids)
+
+
+def _reaper_loop():
+    reaping = settings.SESSION_REAP_INTERVAL > 0
+    interval = min(settings.SESSION_REAP_INTERVAL, _HEARTBEAT_SECONDS) if reaping else _HEARTBEAT_SECONDS
+    last_reap = time.time()
+    while True:
+        time.sleep(interval)
+        try:
+            renew_leases()
+        except Exception as e:
+            print(f"Warning: Could not renew session leases: {e}")
+
+        if not reaping or time.time() - last_reap < settings.SESSION_REAP_INTERVAL:
+            continue
+        last_reap = time.time()
+        try:
+            result = reap_sessions()
+            if result["expired"] or result["evicted"]:
+                print(f"Session reaper: {result}")
+        except Exception as e:
+            print(f"Warning: Session reaper failed: {e}")
+
+
+def start_reaper() -> bool:
+    """
+    Start the background thread that renews this process's lease heartbeats
+    and, unless SESSION_REAP_INTERVAL is 0, reaps sessions (once per process).
+    """
+    global _reaper_thread
+    if _reaper_thread is not None:
+        return False
+    _reaper_thread = threading.Thread(target=_reaper_loop, name="session-reaper", daemon=True)
+    _reaper_thread.start()
+    return True
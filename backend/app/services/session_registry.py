@@ -0,0 +1,477 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from app.config import settings
+from app.models.schemas import SESSION_ID_PATTERN
+
+# Session states: ready (servable) and deleting (hidden, files being removed)
+READY = "ready"
+DELETING = "deleting"
+
+# Requests in any worker hold a lease on the session they use (the leases
+# column); holders renew lease_heartbeat, and leases whose heartbeat is older
+# than this (e.g. of a crashed worker) no longer protect the session
+LEASE_TIMEOUT = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    kind TEXT,
+    state TEXT NOT NULL,
+    index_path TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_accessed REAL NOT NULL,
+    updated REAL NOT NULL,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    heat REAL NOT NULL DEFAULT 0,
+    leases INTEGER NOT NULL DEFAULT 0,
+    lease_heartbeat REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_last_accessed ON sessions (last_accessed);
+CREATE TABLE IF NOT EXISTS documents (
+    session_id TEXT NOT NULL REFERENCES sessions (session_id) ON DELETE CASCADE,
+    filename TEXT,
+    pages INTEGER,
+    chunks INTEGER
+);
+CREATE INDEX IF NOT EXISTS documents_session ON documents (session_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_COLUMNS = (
+    "session_id", "owner", "kind", "state", "index_path",
+    "created", "last_accessed", "updated", "size_bytes", "heat",
+    "leases", "lease_heartbeat"
+)
+
+# Columns added after the first release, with their definitions
+_ADDED_COLUMNS = {
+    "heat": "REAL NOT NULL DEFAULT 0",
+    "leases": "INTEGER NOT NULL DEFAULT 0",
+    "lease_heartbeat": "REAL NOT NULL DEFAULT 0",
+}
+
+# One connection per process, shared by all threads under a lock
+_conn = None
+_conn_pid = None
+_lock = threading.RLock()
+
+# Session rows by session_id; dropped whenever another process commits
+_cache: dict = {}
+_data_version = None
+
+
+def is_valid_session_id(session_id: str) -> bool:
+    """Check that a session id has the format generated at upload."""
+    return isinstance(session_id, str) and SESSION_ID_PATTERN.fullmatch(session_id) is not None
+
+
+def session_dir(session_id: str) -> str:
+    """
+    Directory of a session under VECTOR_STORE_PATH.
+
+    Raises:
+        ValueError: If the session id is not a valid id
+    """
+    if not is_valid_session_id(session_id):
+        raise ValueError(f"Invalid session id: {session_id!r}")
+    return os.path.join(settings.VECTOR_STORE_PATH, session_id)
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the registry (again after a fork: connections must not cross processes)."""
+    global _conn, _conn_pid, _data_version
+    if _conn is not None and _conn_pid == os.getpid():
+        return _conn
+
+    directory = os.path.dirname(os.path.abspath(settings.SESSION_DB_PATH))
+    os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(settings.SESSION_DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.create_function("decayed_heat", 3, _decayed_heat, deterministic=True)
+    conn.executescript(_SCHEMA)
+    _add_columns(conn)
+
+    _conn, _conn_pid = conn, os.getpid()
+    _cache.clear()
+    _data_version = None
+    _import_existing_sessions(conn)
+    return conn
+
+
+def _add_columns(conn: sqlite3.Connection):
+    """Add columns missing from registries created by earlier versions (heat, leases)."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+    for name, definition in _ADDED_COLUMNS.items():
+        if name in columns:
+            continue
+        try:
+            conn.execute(f"ALTER TABLE sessions ADD COLUMN {name} {definition}")
+        except sqlite3.OperationalError:
+            pass  # another worker added it first
+
+
+def _import_existing_sessions(conn: sqlite3.Connection):
+    """Register session directories created before the registry existed (runs once)."""
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'imported'").fetchone():
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'imported'").fetchone() is None:
+            imported = 0
+            if os.path.isdir(settings.VECTOR_STORE_PATH):
+                for entry in os.scandir(settings.VECTOR_STORE_PATH):
+                    if entry.is_dir() and is_valid_session_id(entry.name):
+                        _insert(conn, _legacy_metadata(entry.path, entry.name), None)
+                        imported += 1
+            conn.execute("INSERT INTO meta (key, value) VALUES ('imported', ?)", (str(imported),))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _legacy_metadata(path: str, session_id: str) -> dict:
+    """Metadata of an existing directory (from session.json when present)."""
+    mtime = os.path.getmtime(path)
+    metadata = {"owner": "anonymous", "kind": None, "created": mtime, "last_accessed": mtime}
+    try:
+        with open(os.path.join(path, "session.json"), encoding="utf-8") as f:
+            metadata.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+    size = 0
+    for root, _, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+
+    return {
+        "session_id": session_id,
+        "owner": metadata["owner"],
+        "kind": metadata["kind"],
+        "state": READY,
+        "index_path": path,
+        "created": metadata["created"],
+        "last_accessed": metadata["last_accessed"],
+        "updated": time.time(),
+        "size_bytes": size,
+        "heat": 0.0,
+        "leases": 0,
+        "lease_heartbeat": 0.0
+    }
+
+
+def _insert(conn: sqlite3.Connection, session: dict, document: Optional[dict]):
+    conn.execute(
+        f"INSERT OR REPLACE INTO sessions ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+        [session[column] for column in _COLUMNS]
+    )
+    if document is not None:
+        conn.execute(
+            "INSERT INTO documents (session_id, filename, pages, chunks) VALUES (?, ?, ?, ?)",
+            (session["session_id"], document.get("filename"), document.get("pages"), document.get("chunks"))
+        )
+
+
+def _sync(conn: sqlite3.Connection):
+    """Drop the cache if another process has committed since the last check."""
+    global _data_version
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if version != _data_version:
+        _cache.clear()
+        _data_version = version
+
+
+def add_session(
+    session_id: str,
+    owner: str,
+    kind: str,
+    size_bytes: int,
+    filename: Optional[str] = None,
+    pages: Optional[int] = None,
+    chunks: Optional[int] = None
+) -> dict:
+    """
+    Register a new session (its index must already be on disk).
+
+    Returns:
+        The session row
+    """
+    now = time.time()
+    session = {
+        "session_id": session_id,
+        "owner": owner,
+        "kind": kind,
+        "state": READY,
+        "index_path": session_dir(session_id),
+        "created": now,
+        "last_accessed": now,
+        "updated": now,
+        "size_bytes": size_bytes,
+        "heat": 0.0,
+        "leases": 0,
+        "lease_heartbeat": 0.0
+    }
+    with _lock:
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _insert(conn, session, {"filename": filename, "pages": pages, "chunks": chunks})
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _cache[session_id] = session
+    return dict(session)
+
+
+def get_session(session_id: str) -> Optional[dict]:
+    """
+    Look up a session (from the in-memory cache when it is current).
+
+    Returns:
+        Session row (any state), or None for unknown or invalid ids
+    """
+    if not is_valid_session_id(session_id):
+        return None
+
+    with _lock:
+        conn = _connect()
+        _sync(conn)
+
+        # Check in-memory cache first
+        session = _cache.get(session_id)
+        if session is None:
+            row = conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            session = _cache[session_id] = dict(row)
+        return dict(session)
+
+
+def get_documents(session_id: str) -> List[dict]:
+    """Documents uploaded to a session."""
+    with _lock:
+        rows = _connect().execute(
+            "SELECT filename, pages, chunks FROM documents WHERE session_id = ?", (session_id,)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def current_heat(session: dict, now: Optional[float] = None) -> float:
+    """
+    Access frequency of a session: its access count, with each access
+    halving in weight every SESSION_HEAT_HALF_LIFE_HOURS.
+    """
+    now = time.time() if now is None else now
+    half_life = max(1.0, settings.SESSION_HEAT_HALF_LIFE_HOURS * 3600)
+    return session["heat"] * 0.5 ** (max(0.0, now - session["last_accessed"]) / half_life)
+
+
+def _decayed_heat(heat: float, last_accessed: float, now: float) -> float:
+    """current_heat() as the SQL function decayed_heat(heat, last_accessed, now)."""
+    return current_heat({"heat": heat, "last_accessed": last_accessed}, now)
+
+
+def record_access(session_id: str, count: int = 1, now: Optional[float] = None) -> bool:
+    """
+    Add accesses to a session's heat and set its last access time.
+
+    The heat is decayed and incremented in one UPDATE, so concurrent
+    workers don't drop each other's accesses.
+
+    Returns:
+        False if the session does not exist
+    """
+    now = time.time() if now is None else now
+    with _lock:
+        cursor = _connect().execute(
+            "UPDATE sessions SET heat = decayed_heat(heat, last_accessed, ?) + ?, last_accessed = ? "
+            "WHERE session_id = ?",
+            (now, count, now, session_id)
+        )
+        _cache.pop(session_id, None)
+        return cursor.rowcount > 0
+
+
+def hot_sessions(limit: Optional[int] = None) -> List[dict]:
+    """
+    List ready sessions by current heat, hottest first (most recent access breaks ties).
+
+    Args:
+        limit: Maximum number of rows
+    """
+    now = time.time()
+    sessions = list_sessions()
+    sessions.sort(key=lambda session: (current_heat(session, now), session["last_accessed"]), reverse=True)
+    return sessions if limit is None else sessions[:limit]
+
+
+def is_leased(session: dict, now: Optional[float] = None) -> bool:
+    """Check if a request in any worker holds a live lease on a session row."""
+    now = time.time() if now is None else now
+    return session["leases"] > 0 and session["lease_heartbeat"] >= now - LEASE_TIMEOUT
+
+
+def acquire_lease(session_id: str, accesses: int = 0, now: Optional[float] = None) -> bool:
+    """
+    Take a lease on a ready session (state check and increment in one statement).
+
+    Args:
+        session_id: Session identifier
+        accesses: Accesses to record as well (see record_access), in the same statement
+        now: Time of the access
+
+    Returns:
+        False if the session does not exist or is being deleted
+    """
+    now = time.time() if now is None else now
+    query = (
+        "UPDATE sessions SET leases = CASE WHEN lease_heartbeat < ? THEN 1 ELSE leases + 1 END, "
+        "lease_heartbeat = ?"
+    )
+    params = [now - LEASE_TIMEOUT, now]
+    if accesses:
+        query += ", heat = decayed_heat(heat, last_accessed, ?) + ?, last_accessed = ?"
+        params += [now, accesses, now]
+    with _lock:
+        cursor = _connect().execute(query + " WHERE session_id = ? AND state = ?", [*params, session_id, READY])
+        _cache.pop(session_id, None)
+        return cursor.rowcount > 0
+
+
+def release_lease(session_id: str, count: int = 1) -> bool:
+    """
+    Return leases taken with acquire_lease().
+
+    Args:
+        session_id: Session identifier
+        count: Number of leases returned
+
+    Returns:
+        True if the session is being deleted and these were its last leases
+        (the caller removes it)
+    """
+    with _lock:
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE sessions SET leases = MAX(leases - ?, 0) WHERE session_id = ?", (count, session_id))
+            row = conn.execute("SELECT state, leases FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _cache.pop(session_id, None)
+    return row is not None and row["state"] == DELETING and row["leases"] == 0
+
+
+def renew_leases(session_ids: List[str]):
+    """Refresh the lease heartbeat of sessions this worker still holds leases on."""
+    if not session_ids:
+        return
+    with _lock:
+        _connect().execute(
+            f"UPDATE sessions SET lease_heartbeat = ? WHERE leases > 0 AND session_id IN ({', '.join('?' * len(session_ids))})",
+            [time.time(), *session_ids]
+        )
+        for session_id in session_ids:
+            _cache.pop(session_id, None)
+
+
+def mark_deleting(session_id: str) -> Optional[bool]:
+    """
+    Hide a session from new requests (state "deleting").
+
+    Returns:
+        Whether a live lease still holds the session, or None if it does
+        not exist or was already being deleted
+    """
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "UPDATE sessions SET state = ?, updated = ? WHERE session_id = ? AND state = ?",
+                (DELETING, now, session_id, READY)
+            )
+            row = conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _cache.pop(session_id, None)
+    if cursor.rowcount == 0:
+        return None
+    return is_leased(dict(row), now)
+
+
+def claim_for_removal(session_id: str, stale_before: Optional[float] = None) -> bool:
+    """
+    Mark an unleased session "deleting" so that only the caller removes it.
+
+    Args:
+        session_id: Session identifier
+        stale_before: Also claim a session already in "deleting" since before this time
+
+    Returns:
+        False if the session is leased by a request in any worker, already
+        being deleted, or does not exist
+    """
+    now = time.time()
+    query = (
+        "UPDATE sessions SET state = ?, updated = ? WHERE session_id = ? "
+        "AND (leases = 0 OR lease_heartbeat < ?) AND (state = ?"
+    )
+    params = [DELETING, now, session_id, now - LEASE_TIMEOUT, READY]
+    if stale_before is not None:
+        query += " OR (state = ? AND updated < ?)"
+        params += [DELETING, stale_before]
+    with _lock:
+        cursor = _connect().execute(query + ")", params)
+        _cache.pop(session_id, None)
+        return cursor.rowcount > 0
+
+
+def remove_session(session_id: str):
+    """Delete a session row and its documents."""
+    with _lock:
+        _connect().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        _cache.pop(session_id, None)
+
+
+def list_sessions(state: Optional[str] = READY, limit: Optional[int] = None) -> List[dict]:
+    """
+    List sessions, most recently accessed first.
+
+    Args:
+        state: Only sessions in this state (None for all)
+        limit: Maximum number of rows
+    """
+    query = "SELECT * FROM sessions"
+    params = []
+    if state is not None:
+        query += " WHERE state = ?"
+        params.append(state)
+    query += " ORDER BY last_accessed DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    with _lock:
+        rows = _connect().execute(query, params).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,281 @@
+import json
+import re
+import time
+from typing import List, Optional, Tuple
+from pydantic import ValidationError
+from app.config import settings
+from app.models.schemas import GeneratedMCQ, GeneratedTheoryQuestion
+from app.services.metrics import time_stage, count_structured_items
+
+# Models that rejected response_format while STRUCTURED_OUTPUT=auto, with
+# the time they did; they are tried again after _UNSUPPORTED_TTL seconds
+_unsupported_models: dict = {}
+_UNSUPPORTED_TTL = 3600
+
+# Error text of a provider rejecting the response_format parameter (other
+# 400s, e.g. context length, must not disable structured output)
+_RESPONSE_FORMAT_PARAM = re.compile(r"response_format|json_schema|json_object|structured output", re.IGNORECASE)
+_UNSUPPORTED_WORDING = re.compile(r"not supported|unsupported|does not support|invalid|unknown|unrecognized", re.IGNORECASE)
+
+_DESCRIPTIONS = {
+    "mcq": "multiple choice questions, each with exactly four options",
+    "short": "short answer questions (2 marks each) that can be answered in 2-3 lines or a brief explanation",
+    "long": "long answer questions (5 marks each) requiring detailed explanations, comparisons, or comprehensive answers",
+}
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_NON_WORD = re.compile(r"\W+")
+
+
+def structured_output_enabled() -> bool:
+    """Check if question generation should use structured JSON output."""
+    mode = settings.STRUCTURED_OUTPUT
+    if mode == "off":
+        return False
+    if mode == "auto":
+        marked = _unsupported_models.get(settings.OPENROUTER_MODEL)
+        if marked is not None and time.monotonic() - marked < _UNSUPPORTED_TTL:
+            return False
+    return True
+
+
+def _rejects_response_format(error: Exception) -> bool:
+    """Check if an LLM error is a 400 saying response_format is not supported."""
+    if getattr(error, "status_code", None) != 400:
+        return False
+    message = f"{error} {getattr(error, 'body', '') or ''}"
+    return bool(_RESPONSE_FORMAT_PARAM.search(message) and _UNSUPPORTED_WORDING.search(message))
+
+
+def section_schema(kind: str, include_answers: bool) -> dict:
+    """
+    JSON schema for one section's output: {"questions": [...]}.
+
+    Args:
+        kind: "mcq", "short" or "long"
+        include_answers: Require an answer for every question
+    """
+    properties = {"question": {"type": "string"}}
+    if kind == "mcq":
+        # Length is checked by GeneratedMCQ: strict mode does not accept minItems/maxItems
+        properties["options"] = {"type": "array", "items": {"type": "string"}}
+    if include_answers:
+        properties["answer"] = (
+            {"type": "string", "enum": ["A", "B", "C", "D"]} if kind == "mcq" else {"type": "string"}
+        )
+
+    return {
+        "type": "object",
+        "properties": {
+            "questions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": list(properties),
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["questions"],
+        "additionalProperties": False
+    }
+
+
+def _response_format(kind: str, include_answers: bool) -> dict:
+    if settings.STRUCTURED_OUTPUT == "json_object":
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": f"{kind}_questions",
+            "strict": True,
+            "schema": section_schema(kind, include_answers)
+        }
+    }
+
+
+def _example(kind: str, include_answers: bool) -> str:
+    item = {"question": "..."}
+    if kind == "mcq":
+        item["options"] = ["...", "...", "...", "..."]
+    if include_answers:
+        item["answer"] = "B" if kind == "mcq" else "..."
+    return json.dumps({"questions": [item]})
+
+
+def build_structured_prompt(
+    kind: str,
+    count: int,
+    topic: str,
+    difficulty: str,
+    context: str,
+    include_answers: bool,
+    extra_instructions: str = "",
+    existing: Optional[List[str]] = None,
+    problems: Optional[List[str]] = None
+) -> str:
+    """
+    Build the JSON-mode prompt for a section, or a targeted re-ask for missing items.
+
+    Args:
+        extra_instructions: Additional line added after the task (e.g. batch variant hints)
+        existing: Questions already accepted (re-ask must not repeat them)
+        problems: Validation problems from the previous reply
+    """
+    prompt = f"""You are an expert teacher creating {difficulty} difficulty questions on "{topic}".
+
+Based on this content:
+{context}
+
+Create exactly {count} {_DESCRIPTIONS[kind]}."""
+
+    if extra_instructions:
+        prompt += f"\n{extra_instructions}"
+
+    if kind == "mcq" and include_answers:
+        prompt += "\nSet \"answer\" to the letter (A, B, C or D) of the correct option."
+    elif include_answers:
+        prompt += "\nInclude a model answer for every question."
+
+    if existing:
+        prompt += "\n\nDo not repeat any of these questions:\n" + "\n".join(f"- {q}" for q in existing)
+    if problems:
+        prompt += "\n\nYour previous reply had these problems, avoid them:\n" + "\n".join(f"- {p}" for p in problems)
+
+    prompt += f"""
+
+Return ONLY a JSON object of this form, with no markdown and no commentary:
+{_example(kind, include_answers)}"""
+    return prompt
+
+
+def _extract_json(text: str):
+    """Find the JSON value in a model reply (tolerates code fences and leading text)."""
+    fence = _FENCE.search(text)
+    if fence:
+        text = fence.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("reply contained no JSON")
+    value, _ = json.JSONDecoder().raw_decode(text, min(starts))
+    return value
+
+
+def _normalize(question: str) -> str:
+    return _NON_WORD.sub(" ", question.lower()).strip()
+
+
+def parse_structured_questions(
+    text: str,
+    kind: str,
+    include_answers: bool,
+    seen: Optional[set] = None
+) -> Tuple[List[dict], List[str]]:
+    """
+    Validate a JSON reply item by item.
+
+    Args:
+        text: Raw model reply
+        kind: "mcq", "short" or "long"
+        include_answers: Whether an answer is required
+        seen: Normalized question texts already accepted (updated in place)
+
+    Returns:
+        Tuple of (valid question dicts, problem descriptions for the invalid items)
+    """
+    seen = seen if seen is not None else set()
+    try:
+        data = _extract_json(text)
+    except ValueError as e:
+        return [], [f"the reply was not valid JSON ({e})"]
+
+    items = data.get("questions") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return [], ["the reply must be an object with a \"questions\" array"]
+
+    model = GeneratedMCQ if kind == "mcq" else GeneratedTheoryQuestion
+    valid, problems = [], []
+    for index, item in enumerate(items, start=1):
+        try:
+            parsed = model.model_validate(item)
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            problems.append(f"item {index}: {errors}")
+            continue
+
+        if include_answers and not parsed.answer:
+            problems.append(f"item {index}: missing answer")
+            continue
+
+        key = _normalize(parsed.question)
+        if key in seen:
+            problems.append(f"item {index}: duplicate question")
+            continue
+        seen.add(key)
+
+        question = {"question": parsed.question.strip()}
+        if kind == "mcq":
+            question["options"] = [f"{letter}) {option}" for letter, option in zip("ABCD", parsed.options)]
+        if include_answers:
+            question["answer"] = parsed.answer.strip()
+        valid.append(question)
+
+    count_structured_items(kind, len(valid), len(problems))
+    return valid, problems
+
+
+def generate_structured_questions(
+    kind: str,
+    count: int,
+    topic: str,
+    difficulty: str,
+    context: str,
+    include_answers: bool,
+    extra_instructions: str = ""
+) -> List[dict]:
+    """
+    Generate one section with structured JSON output.
+
+    Invalid items are dropped and only the missing number of questions is
+    re-asked (up to STRUCTURED_MAX_REASKS times). The result never has more
+    than `count` questions.
+
+    Returns:
+        Numbered question dicts, or an empty list if the model does not
+        support structured output (caller falls back to free text)
+    """
+    # Imported here: llm_service imports this module
+    from app.services.llm_service import get_llm, invoke_llm
+
+    llm = get_llm(temperature=0.4).bind(response_format=_response_format(kind, include_answers))
+
+    questions, problems, seen = [], [], set()
+    for attempt in range(settings.STRUCTURED_MAX_REASKS + 1):
+        missing = count - len(questions)
+        if missing <= 0:
+            break
+
+        with time_stage("prompt_build"):
+            prompt = build_structured_prompt(
+                kind, missing, topic, difficulty, context, include_answers,
+                extra_instructions=extra_instructions,
+                existing=[q["question"] for q in questions],
+                problems=problems
+            )
+
+        try:
+            reply = invoke_llm(llm, prompt, section=kind if attempt == 0 else f"{kind}_reask")
+        except Exception as e:
+            # The model/provider rejects response_format: fall back to free text for a while
+            if attempt == 0 and settings.STRUCTURED_OUTPUT == "auto" and _rejects_response_format(e):
+                print(f"Structured output not supported by {settings.OPENROUTER_MODEL}, using free text: {e}")
+                _unsupported_models[settings.OPENROUTER_MODEL] = time.monotonic()
+                return []
+            raise
+
+        with time_stage("parse"):
+            valid, problems = parse_structured_questions(reply, kind, include_answers, seen)
+        questions.extend(valid[:missing])
+
+    return [{"number": number, **question} for number, question in enumerate(questions, start=1)]
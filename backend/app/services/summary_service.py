@@ -0,0 +1,329 @@
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import List, Optional, Tuple
+from app.config import settings
+from app.services.metrics import time_stage, count_cache
+from app.services.session_manager import session_lease
+from app.services.session_registry import session_dir
+from app.services.tracing import span
+
+SUMMARY_FILE = "summary.json"
+
+# Summary trees by session_id (only "ready" trees are cached)
+_summaries: dict = {}
+_summaries_lock = threading.Lock()
+
+# Whole-document summary / key point requests, matched against the full
+# normalized question so that "summarize chapter 3" still goes through retrieval
+_DOCUMENT = r"(?:(?:this|the|my|whole|entire|full|uploaded)\s+)*(?:pdf|document|doc|file|notes|text|material|book|chapter)"
+_SUMMARY_QUESTION = re.compile(
+    r"(?:(?:can|could|would)\s+you\s+|please\s+)?"
+    r"(?:(?:summari[sz]e|summary\s+of|give\s+(?:me\s+)?(?:a\s+)?(?:short\s+|brief\s+)?summary(?:\s+of)?"
+    r"|(?:write|provide|make)\s+(?:a\s+)?(?:short\s+|brief\s+)?summary(?:\s+of)?"
+    r"|give\s+(?:me\s+)?(?:an\s+)?overview(?:\s+of)?|overview\s+of"
+    r"|what\s+is\s+(?:this|the)\s+(?:pdf|document|doc|file|chapter)\s+about)"
+    r"(?:\s+(?:this|it|" + _DOCUMENT + r"))?|summary|summarize|summarise|tl\s*dr)"
+    r"(?:\s+please)?"
+)
+_KEY_POINTS_QUESTION = re.compile(
+    r"(?:(?:can|could|would)\s+you\s+|please\s+)?"
+    r"(?:(?:give|list|show|tell)\s+(?:me\s+)?(?:the\s+)?|what\s+are\s+the\s+)?"
+    r"(?:key|main|important|major)\s+(?:points|takeaways|ideas|concepts|highlights)"
+    r"(?:\s+(?:of|in|from)\s+(?:this|it|" + _DOCUMENT + r"))?"
+    r"(?:\s+please)?"
+)
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_KEY_POINT_LINE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*(.+)")
+
+
+def _store_path(session_id: str) -> str:
+    return os.path.join(session_dir(session_id), SUMMARY_FILE)
+
+
+def _write_tree(session_id: str, tree: dict):
+    """Write the tree atomically so readers never see a partial file."""
+    path = _store_path(session_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(tree, f)
+    os.replace(tmp_path, path)
+
+
+def group_pages(pages: List[str], max_chars: int) -> List[Tuple[int, int, str]]:
+    """
+    Group consecutive pages into sections of at most max_chars characters.
+
+    Args:
+        pages: Page texts in page order
+        max_chars: Character budget per section (a longer page is truncated)
+
+    Returns:
+        List of (first_page, last_page, text) with 1-based page numbers
+    """
+    groups = []
+    start, parts, size = None, [], 0
+    for number, page in enumerate(pages, start=1):
+        page = page.strip()[:max_chars]
+        if not page:
+            continue
+        if parts and size + len(page) > max_chars:
+            groups.append((start, last, "\n".join(parts)))
+            start, parts, size = None, [], 0
+        if start is None:
+            start = number
+        parts.append(page)
+        size += len(page)
+        last = number
+    if parts:
+        groups.append((start, last, "\n".join(parts)))
+    return groups
+
+
+def _map_prompt(first: int, last: int, text: str) -> str:
+    pages = f"page {first}" if first == last else f"pages {first}-{last}"
+    return f"""Summarize the following text from {pages} of a document for a student.
+Keep every important definition, fact and argument. Write 4-8 sentences of plain text.
+
+Text:
+{text}
+
+Summary:"""
+
+
+def _reduce_prompt(summaries: List[str]) -> str:
+    joined = "\n\n".join(summaries)
+    return f"""These are summaries of consecutive parts of a document.
+Combine them into one summary of 5-10 sentences that keeps the most important points, in document order.
+
+Summaries:
+{joined}
+
+Combined summary:"""
+
+
+def _document_prompt(summaries: List[str]) -> str:
+    joined = "\n\n".join(summaries)
+    return f"""These are summaries of consecutive parts of a document.
+Write an overall summary of the whole document for a student, then its key points.
+
+Summaries:
+{joined}
+
+Answer in exactly this format:
+SUMMARY:
+<2-4 paragraphs>
+
+KEY POINTS:
+- <point>
+- <point>"""
+
+
+def parse_document_summary(text: str) -> Tuple[str, List[str]]:
+    """Split the final reduce output into (summary, key points)."""
+    summary, _, points = text.partition("KEY POINTS:")
+    summary = summary.replace("SUMMARY:", "", 1).strip()
+    key_points = []
+    for line in points.splitlines():
+        match = _KEY_POINT_LINE.match(line)
+        if match:
+            key_points.append(match.group(1).strip())
+    return summary, key_points
+
+
+def build_summary_tree(session_id: str, pages: List[str]) -> Optional[dict]:
+    """
+    Build the map-reduce summary tree of a document (page -> section -> document).
+
+    Pages are grouped into sections of up to SUMMARY_MAP_CHARS characters and
+    summarized in parallel (map); section summaries are then combined
+    SUMMARY_REDUCE_FANOUT at a time until one document summary with key
+    points remains (reduce). Runs as a background task after upload; the
+    tree is stored as summary.json in the session directory.
+
+    Args:
+        session_id: Session identifier (its vector store must already exist)
+        pages: Page texts from extract_pages_from_pdf()
+
+    Returns:
+        The summary tree, or None if building failed
+    """
+    try:
+        with session_lease(session_id):
+            return _build_tree(session_id, pages)
+    except ValueError as e:
+        print(f"Warning: Skipping summary for session {session_id}: {e}")
+        return None
+
+
+def _build_tree(session_id: str, pages: List[str]) -> Optional[dict]:
+    # Imported here: llm_service imports this module
+    from app.services.llm_service import get_llm, invoke_llm
+
+    try:
+        _write_tree(session_id, {"status": "building"})
+    except OSError as e:
+        print(f"Warning: Could not start summary for session {session_id}: {e}")
+        return None
+
+    llm = get_llm(temperature=0)
+    fanout = max(2, settings.SUMMARY_REDUCE_FANOUT)
+
+    def summarize(prompt: str, section: str) -> str:
+        return invoke_llm(llm, prompt, section=section).strip()
+
+    try:
+        with span("summary.build", session_id=session_id, pages=len(pages)), time_stage("summary_build"):
+            # Map: one summary per page group
+            groups = group_pages(pages, settings.SUMMARY_MAP_CHARS)
+            if not groups:
+                raise ValueError("document has no text")
+
+            with ThreadPoolExecutor(
+                max_workers=max(1, settings.SUMMARY_PARALLEL),
+                thread_name_prefix="summary"
+            ) as executor:
+                futures = [
+                    executor.submit(copy_context().run, summarize, _map_prompt(first, last, text), "summary_map")
+                    for first, last, text in groups
+                ]
+                level = [
+                    {"pages": [first, last], "summary": future.result()}
+                    for (first, last, _), future in zip(groups, futures)
+                ]
+                levels = [level]
+
+                # Reduce: combine `fanout` nodes at a time until one call can cover them all
+                while len(level) > fanout:
+                    batches = [level[i:i + fanout] for i in range(0, len(level), fanout)]
+                    futures = [
+                        executor.submit(
+                            copy_context().run, summarize,
+                            _reduce_prompt([node["summary"] for node in batch]), "summary_reduce"
+                        )
+                        for batch in batches
+                    ]
+                    level = [
+                        {"pages": [batch[0]["pages"][0], batch[-1]["pages"][1]], "summary": future.result()}
+                        for batch, future in zip(batches, futures)
+                    ]
+                    levels.append(level)
+
+            summary, key_points = parse_document_summary(
+                summarize(_document_prompt([node["summary"] for node in level]), "summary_document")
+            )
+
+        tree = {
+            "status": "ready",
+            "pages": len(pages),
+            "sections": levels[0],
+            "levels": levels[1:],
+            "document": {"summary": summary, "key_points": key_points}
+        }
+        _write_tree(session_id, tree)
+    except Exception as e:
+        print(f"Warning: Could not build summary for session {session_id}: {e}")
+        try:
+            _write_tree(session_id, {"status": "failed", "error": str(e)})
+        except OSError:
+            pass
+        return None
+
+    with _summaries_lock:
+        _summaries[session_id] = tree
+    return tree
+
+
+def get_summary_tree(session_id: str) -> Optional[dict]:
+    """
+    Get the summary tree of a session.
+
+    Returns:
+        The tree dict (its "status" is "building", "ready" or "failed"),
+        or None if no summary was started for the session
+    """
+    # Check in-memory cache first
+    tree = _summaries.get(session_id)
+    if tree is not None:
+        return tree
+
+    path = _store_path(session_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            tree = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read summary for session {session_id}: {e}")
+        return None
+
+    if tree.get("status") == "ready":
+        with _summaries_lock:
+            _summaries[session_id] = tree
+    return tree
+
+
+def forget_summary(session_id: str):
+    """Drop a session's summary from the in-memory cache."""
+    with _summaries_lock:
+        _summaries.pop(session_id, None)
+
+
+def summary_question_kind(question: str) -> Optional[str]:
+    """
+    Classify a whole-document summary request.
+
+    Returns:
+        "summary", "key_points", or None for any other question
+    """
+    normalized = _NON_WORD.sub(" ", question.lower()).strip()
+    if _KEY_POINTS_QUESTION.fullmatch(normalized):
+        return "key_points"
+    if _SUMMARY_QUESTION.fullmatch(normalized):
+        return "summary"
+    return None
+
+
+def answer_from_summary(session_id: str, question: str) -> Optional[dict]:
+    """
+    Answer a whole-document summary question from the precomputed tree.
+
+    Args:
+        session_id: Session identifier
+        question: User's question
+
+    Returns:
+        Dictionary with answer and sources (section summaries with their page
+        ranges), or None if the
+        question is not a summary request or the tree is not ready yet
+    """
+    kind = summary_question_kind(question)
+    if kind is None:
+        return None
+
+    tree = get_summary_tree(session_id)
+    ready = tree is not None and tree.get("status") == "ready"
+    count_cache("summary", ready)
+    if not ready:
+        return None
+
+    document = tree["document"]
+    if kind == "key_points" and document["key_points"]:
+        answer = "\n".join(f"- {point}" for point in document["key_points"])
+    else:
+        answer = document["summary"]
+        if document["key_points"]:
+            answer += "\n\nKey points:\n" + "\n".join(f"- {point}" for point in document["key_points"])
+
+    sources = [
+        f"Pages {node['pages'][0]}-{node['pages'][1]}: {node['summary']}"
+        for node in tree["sections"]
+    ]
+    source_details = [
+        {"text": node["summary"], "page": node["pages"][0], "page_end": node["pages"][1]}
+        for node in tree["sections"]
+    ]
+    return {"answer": answer, "sources": sources, "source_details": source_details}
@@ -0,0 +1,29 @@
+import os
+import threading
+from typing import Sequence
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+
+class FileSpanExporter(SpanExporter):
+    """Append finished spans to a local file as JSON lines (one span per line)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        try:
+            lines = [span.to_json(indent=None) + "\n" for span in spans]
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+            return SpanExportResult.SUCCESS
+        except OSError as e:
+            print(f"Error exporting spans: {e}")
+            return SpanExportResult.FAILURE
+
+    def shutdown(self) -> None:
+        pass
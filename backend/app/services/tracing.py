@@ -0,0 +1,133 @@
+import functools
+from contextlib import contextmanager, nullcontext
+from app.config import settings
+
+# Tracer is only created when tracing is enabled; while it is None every
+# span() call returns the same no-op context manager.
+_tracer = None
+_NOOP_SPAN = nullcontext()
+
+
+def init_tracing() -> bool:
+    """
+    Configure OpenTelemetry tracing if enabled in settings.
+
+    Returns:
+        True if tracing was enabled
+
+    Raises:
+        RuntimeError: If tracing is enabled but opentelemetry-sdk is missing
+    """
+    global _tracer
+    if not settings.TRACING_ENABLED or _tracer is not None:
+        return _tracer is not None
+
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError as e:
+        raise RuntimeError(
+            "TRACING_ENABLED is set but opentelemetry-sdk is not installed. "
+            "Install it with: pip install opentelemetry-sdk"
+        ) from e
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": "pdf-study-companion"}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATE))
+    )
+    provider.add_span_processor(BatchSpanProcessor(_build_exporter()))
+    trace.set_tracer_provider(provider)
+
+    _tracer = trace.get_tracer("app")
+    return True
+
+
+def _build_exporter():
+    """Create the span exporter selected by TRACING_EXPORTER."""
+    exporter = settings.TRACING_EXPORTER.lower()
+
+    if exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError as e:
+            raise RuntimeError(
+                "TRACING_EXPORTER=otlp requires opentelemetry-exporter-otlp-proto-http"
+            ) from e
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+
+    if exporter == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+
+    if exporter == "file":
+        from app.services.trace_file_exporter import FileSpanExporter
+        return FileSpanExporter(settings.TRACING_FILE_PATH)
+
+    raise ValueError(f"Unknown TRACING_EXPORTER: {settings.TRACING_EXPORTER}")
+
+
+def span(name: str, **attributes):
+    """
+    Start a span around a block of code.
+
+    Usage:
+        with span("similarity_search", k=k) as s:
+            ...
+            if s is not None:
+                s.set_attribute("results", len(docs))
+
+    Args:
+        name: Span name
+        **attributes: Span attributes (str, bool, int or float values)
+
+    Returns:
+        A context manager yielding the span, or None when tracing is off
+    """
+    if _tracer is None:
+        return _NOOP_SPAN
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def request_span(name: str, **attributes):
+    """
+    Start a span that is current inside the block but may end earlier.
+
+    Used for HTTP requests, whose span should end once the response is
+    sent even though the block also runs the response's background tasks.
+
+    Args:
+        name: Span name
+        **attributes: Span attributes (str, bool, int or float values)
+
+    Yields:
+        The span (call end() on it to end it early), or None when tracing is off
+    """
+    if _tracer is None:
+        yield None
+        return
+
+    from opentelemetry import trace
+    s = _tracer.start_span(name, attributes=attributes)
+    try:
+        with trace.use_span(s, end_on_exit=False):
+            yield s
+    finally:
+        if s.is_recording():
+            s.end()
+
+
+def traced(name: str):
+    """Decorator that wraps a function call in a span when tracing is enabled."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.start_as_current_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,43 +1,126 @@
 import os
-from typing import List, Optional
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import threading
+from typing import Callable, List, Optional, Tuple
+import numpy as np
 from app.config import settings
+from app.services.metrics import time_stage, count_cache
+from app.services.tracing import span, traced
+from app.services import session_registry as registry
+from app.services.session_registry import session_dir
+from app.services.backends import get_backend
+from app.services.query_cache import (
+    embedding_cache, retrieval_cache, normalize_query, retrieval_key, forget_session_results
+)
 
-# In-memory store for session vector databases
-_vector_stores: dict = {}
+# The embedding model (torch via sentence-transformers, or onnxruntime with
+# EMBEDDING_BACKEND=onnx) is loaded on first use so the app can start
+# accepting connections without it.
+
+# Dimension of all-MiniLM-L6-v2 vectors (used to estimate index memory before loading)
+EMBEDDING_DIM = 384
+
+# Chunk clusters per session: (labels, centroids), built at ingestion
+_clusters: dict = {}
+
+# Shared embedding model (loaded once per process, or once in a pre-fork master)
+_embeddings = None
+_embeddings_lock = threading.Lock()
 
 
 def get_embeddings():
-    """Get HuggingFace embeddings instance (local, free, works offline)."""
-    return HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'}
-    )
+    """Get the embedding model (local, free, works offline)."""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                if settings.EMBEDDING_BACKEND == "onnx":
+                    _embeddings = _load_onnx_embeddings()
+                if _embeddings is None:
+                    from langchain_community.embeddings import HuggingFaceEmbeddings
+                    
+                    _embeddings = HuggingFaceEmbeddings(
+                        model_name="all-MiniLM-L6-v2",
+                        model_kwargs={'device': 'cpu'}
+                    )
+    return _embeddings
+
+
+def _load_onnx_embeddings():
+    """Load the exported ONNX model, or None (torch is used) if it is missing or unverified."""
+    try:
+        from app.services.onnx_embeddings import OnnxEmbeddings
+        
+        return OnnxEmbeddings(settings.ONNX_MODEL_DIR, settings.ONNX_QUANTIZED, settings.ONNX_MIN_COSINE)
+    except Exception as e:
+        print(f"Warning: Could not load the ONNX embedding model, using torch: {e}")
+        return None
+
+
+def embed_query(query: str) -> np.ndarray:
+    """Embed a search query as a float32 vector (cached; the returned array is read-only)."""
+    key = normalize_query(query)
+    vector = embedding_cache.get(key)
+    if vector is None:
+        vector = np.asarray(get_embeddings().embed_query(query), dtype="float32")
+        vector.flags.writeable = False
+        embedding_cache.put(key, vector)
+    return vector
+
+
+def embed_queries(queries: List[str]) -> np.ndarray:
+    """Embed several search queries as a float32 matrix (cache misses in one batch)."""
+    vectors = [embedding_cache.get(normalize_query(query)) for query in queries]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        embedded = np.asarray(get_embeddings().embed_documents([queries[i] for i in missing]), dtype="float32")
+        for i, vector in zip(missing, embedded.reshape(len(missing), -1)):
+            vector.flags.writeable = False
+            embedding_cache.put(normalize_query(queries[i]), vector)
+            vectors[i] = vector
+    return np.vstack(vectors) if vectors else np.empty((0, 0), dtype="float32")
 
 
-def create_vector_store(chunks: List[str], session_id: str) -> bool:
+def create_vector_store(chunks: List[str], session_id: str, metadatas: Optional[List[dict]] = None) -> bool:
     """
-    Create a FAISS vector store from text chunks.
+    Create the vector index of a session from text chunks.
     
     Args:
         chunks: List of text chunks to embed
         session_id: Unique session identifier
+        metadatas: Optional metadata per chunk (page, heading, offsets), stored
+            with the chunk and returned with it by the similarity searches
         
     Returns:
         True if successful
     """
     try:
         embeddings = get_embeddings()
-        db = FAISS.from_texts(chunks, embedding=embeddings)
         
-        # Store in memory for quick access
-        _vector_stores[session_id] = db
+        # Embed and index separately so each stage is timed on its own
+        with time_stage("embed"):
+            vectors = np.asarray(embeddings.embed_documents(chunks), dtype="float32")
         
-        # Also save to disk for persistence
-        store_path = os.path.join(settings.VECTOR_STORE_PATH, session_id)
+        # The backend keeps the index in memory and persists it
+        store_path = session_dir(session_id)
         os.makedirs(store_path, exist_ok=True)
-        db.save_local(store_path)
+        with time_stage("index_build"):
+            get_backend().create(session_id, chunks, vectors, metadatas)
+        
+        # Cluster the chunks once so papers can sample across the whole document
+        clusters = None
+        try:
+            from app.services.clustering import build_clusters
+            
+            with time_stage("cluster"):
+                clusters = build_clusters(vectors)
+        except Exception as e:
+            print(f"Warning: Could not cluster chunks: {e}")
+        
+        if clusters is not None:
+            _clusters[session_id] = clusters
+            with time_stage("persist"):
+                from app.services.clustering import save_clusters
+                save_clusters(store_path, *clusters)
         
         return True
     except Exception as e:
@@ -45,86 +128,329 @@ def create_vector_store(chunks: List[str], session_id: str) -> bool:
         raise e
 
 
-def load_vector_store(session_id: str) -> Optional[FAISS]:
+@traced("load_vector_store")
+def load_vector_store(session_id: str) -> bool:
     """
-    Load a vector store for a session.
+    Load the vector index of a session into memory.
     
     Args:
         session_id: Unique session identifier
         
     Returns:
-        FAISS vector store or None if not found
+        True if the index is loaded, False if the session is not found
     """
+    backend = get_backend()
+    
     # Check in-memory cache first
-    if session_id in _vector_stores:
-        return _vector_stores[session_id]
+    if backend.is_loaded(session_id):
+        count_cache("vector_store", hit=True)
+        return True
+    
+    count_cache("vector_store", hit=False)
+    
+    # The registry knows which sessions exist; unknown sessions never touch storage
+    session = registry.get_session(session_id)
+    if session is None or session["state"] != registry.READY:
+        return False
+    
+    try:
+        with time_stage("index_load"):
+            return backend.load(session_id)
+    except Exception as e:
+        print(f"Error loading vector store: {e}")
+        return False
+
+
+def _search(session_id: str, query: str, k: int) -> List[dict]:
+    if not load_vector_store(session_id):
+        raise ValueError(f"No vector store found for session: {session_id}")
+    
+    # Repeated queries on an unchanged index reuse the retrieved rows
+    backend = get_backend()
+    key = retrieval_key(session_id, backend.version(session_id), "search", query, k)
+    cached = retrieval_cache.get(key)
+    if cached is not None:
+        return _cached_results(backend, session_id, cached)
+    
+    with span("similarity_search", k=k), time_stage("retrieval"):
+        results = backend.search(session_id, embed_query(query), k)
+    retrieval_cache.put(key, [(result["row"], result["distance"]) for result in results])
+    return results
+
+
+def _cached_results(backend, session_id: str, cached: List[Tuple[int, float]]) -> List[dict]:
+    """Rebuild search results from cached (row, distance) pairs."""
+    documents = backend.documents(session_id, [row for row, _ in cached])
+    return [{**doc, "distance": distance} for doc, (_, distance) in zip(documents, cached)]
+
+
+def similarity_search_with_score(session_id: str, query: str, k: int = 4) -> List[Tuple[dict, float]]:
+    """
+    Perform similarity search and return each source with its relevance score.
+    
+    The score is the cosine similarity between the query and the chunk
+    (embeddings are unit length, so it is 1 - squared L2 distance / 2);
+    higher is more relevant.
+    
+    Returns:
+        List of (source dict as returned by to_source(), score), best first
+    """
+    return [
+        (to_source(result["text"], result["metadata"]), distance_to_score(result["distance"]))
+        for result in _search(session_id, query, k)
+    ]
+
+
+def similarity_search_batch_with_score(session_id: str, queries: List[str], k: int = 4) -> List[List[Tuple[dict, float]]]:
+    """
+    Run similarity_search_with_score() for several queries at once.
+    
+    The queries are embedded in one batch and searched with one backend
+    call (a single multi-query FAISS search or matrix product).
+    
+    Returns:
+        One list of (source dict, score) per query, best first
+    """
+    if not queries:
+        return []
+    if not load_vector_store(session_id):
+        raise ValueError(f"No vector store found for session: {session_id}")
+    
+    backend = get_backend()
+    version = backend.version(session_id)
+    keys = [retrieval_key(session_id, version, "search", query, k) for query in queries]
+    results = [retrieval_cache.get(key) for key in keys]
+    results = [None if cached is None else _cached_results(backend, session_id, cached) for cached in results]
+    
+    # Embed and search only the queries without cached results
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        with time_stage("embed"):
+            vectors = embed_queries([queries[i] for i in missing])
+        with span("similarity_search_batch", k=k, queries=len(missing)), time_stage("retrieval"):
+            searched = backend.search_batch(session_id, vectors, k)
+        for i, batch in zip(missing, searched):
+            retrieval_cache.put(keys[i], [(result["row"], result["distance"]) for result in batch])
+            results[i] = batch
     
-    # Try loading from disk
-    store_path = os.path.join(settings.VECTOR_STORE_PATH, session_id)
-    if os.path.exists(store_path):
+    return [
+        [(to_source(result["text"], result["metadata"]), distance_to_score(result["distance"])) for result in batch]
+        for batch in results
+    ]
+
+
+def distance_to_score(distance: float) -> float:
+    """Cosine similarity of two unit vectors from their squared L2 distance."""
+    return 1.0 - distance / 2.0
+
+
+def to_source(text: str, metadata: Optional[dict] = None) -> dict:
+    """Build a source dict from a chunk's text and stored metadata."""
+    metadata = metadata or {}
+    return {
+        "text": text,
+        "page": metadata.get("page"),
+        "page_end": metadata.get("page_end"),
+        "heading": metadata.get("heading"),
+        "start": metadata.get("start"),
+        "end": metadata.get("end")
+    }
+
+
+def get_clusters(session_id: str) -> Optional[tuple]:
+    """
+    Get the chunk clusters of a session, building them for older sessions
+    that were ingested before clustering existed.
+    
+    Returns:
+        Tuple of (labels, centroids) or None if clustering is unavailable
+    """
+    if session_id in _clusters:
+        return _clusters[session_id]
+    
+    from app.services.clustering import build_clusters, load_clusters, save_clusters
+    
+    store_path = session_dir(session_id)
+    clusters = load_clusters(store_path)
+    if clusters is None:
         try:
-            embeddings = get_embeddings()
-            db = FAISS.load_local(
-                store_path,
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
-            _vector_stores[session_id] = db
-            return db
+            with time_stage("cluster"):
+                clusters = build_clusters(get_backend().vectors(session_id))
+            save_clusters(store_path, *clusters)
         except Exception as e:
-            print(f"Error loading vector store: {e}")
+            print(f"Warning: Could not cluster chunks: {e}")
             return None
     
-    return None
+    _clusters[session_id] = clusters
+    return clusters
 
 
-def similarity_search(session_id: str, query: str, k: int = 4) -> List[str]:
+def coverage_search(session_id: str, query: str, k: int, strategy: str = "stratified") -> List[str]:
     """
-    Perform similarity search on the vector store.
+    Retrieve a diverse set of chunks covering as much of the document as k allows.
     
     Args:
         session_id: Unique session identifier
-        query: Search query
-        k: Number of results to return
+        query: Search query (e.g. the paper topic)
+        k: Number of chunks to return
+        strategy: "stratified" (round-robin over k-means clusters, nearest
+            clusters first), "mmr" (maximal marginal relevance) or
+            "similarity" (plain top-k)
         
     Returns:
-        List of relevant document chunks
+        List of document chunks
     """
-    db = load_vector_store(session_id)
-    if db is None:
+    if not load_vector_store(session_id):
         raise ValueError(f"No vector store found for session: {session_id}")
     
-    docs = db.similarity_search(query, k=k)
-    return [doc.page_content for doc in docs]
+    # Papers on the same topic reuse the selected rows while the index is unchanged
+    backend = get_backend()
+    key = retrieval_key(session_id, backend.version(session_id), f"coverage:{strategy}", query, k)
+    rows = retrieval_cache.get(key)
+    if rows is None:
+        with span("coverage_search", k=k, strategy=strategy), time_stage("retrieval"):
+            rows = _coverage_rows(backend, session_id, embed_query(query), k, strategy)
+        retrieval_cache.put(key, rows)
+    return [doc["text"] for doc in backend.documents(session_id, rows)]
+
+
+def _coverage_rows(backend, session_id: str, query_vector: np.ndarray, k: int, strategy: str) -> List[int]:
+    if strategy == "mmr":
+        from app.services.clustering import mmr_select
+        
+        candidates = backend.search(session_id, query_vector, max(4 * k, 20))
+        vectors = backend.vectors(session_id, [c["row"] for c in candidates])
+        return [candidates[i]["row"] for i in mmr_select(query_vector, vectors, k)]
+    
+    clusters = get_clusters(session_id) if strategy == "stratified" else None
+    if clusters is None:
+        return [result["row"] for result in backend.search(session_id, query_vector, k)]
+    
+    from app.services.clustering import stratified_select
+    
+    vectors = backend.vectors(session_id)
+    return [int(row) for row in stratified_select(vectors, clusters[0], clusters[1], query_vector, k)]
+
+
+def get_index_stats(session_id: str) -> Optional[dict]:
+    """Size of a session's index ({"backend", "precision", "vectors", "dim", "memory_bytes", "disk_bytes"})."""
+    if not load_vector_store(session_id):
+        return None
+    return get_backend().stats(session_id)
 
 
 def delete_vector_store(session_id: str) -> bool:
     """
     Delete a vector store for a session.
     
+    The directory is renamed before it is removed, so concurrent loads see
+    either the complete index or no session at all.
+    
     Args:
         session_id: Unique session identifier
         
     Returns:
         True if successful
     """
-    # Remove from memory
-    if session_id in _vector_stores:
-        del _vector_stores[session_id]
+    # Remove from memory and the backend's storage
+    get_backend().delete(session_id)
+    _clusters.pop(session_id, None)
+    
+    from app.services.summary_service import forget_summary
+    from app.services.answerability import forget_answer_threshold
+    from app.services.question_bank import forget_question_bank
+    forget_summary(session_id)
+    forget_answer_threshold(session_id)
+    forget_question_bank(session_id)
+    forget_session_results(session_id)
     
     # Remove from disk
-    store_path = os.path.join(settings.VECTOR_STORE_PATH, session_id)
-    if os.path.exists(store_path):
-        import shutil
-        shutil.rmtree(store_path)
+    store_path = session_dir(session_id)
+    trash_path = os.path.join(settings.VECTOR_STORE_PATH, f".deleted-{session_id}-{os.getpid()}")
+    try:
+        os.rename(store_path, trash_path)
+    except FileNotFoundError:
+        return True
+    
+    import shutil
+    shutil.rmtree(trash_path, ignore_errors=True)
     
     return True
 
 
+def evict_from_memory(predicate: Callable[[str], bool]) -> int:
+    """
+    Drop cached indexes of sessions matching a predicate (e.g. removed from disk).
+    
+    Returns:
+        Number of sessions dropped
+    """
+    backend = get_backend()
+    evicted = 0
+    for session_id in backend.loaded_sessions():
+        if predicate(session_id):
+            backend.evict(session_id)
+            _clusters.pop(session_id, None)
+            evicted += 1
+    return evicted
+
+
 def session_exists(session_id: str) -> bool:
-    """Check if a session has an active vector store."""
-    if session_id in _vector_stores:
-        return True
+    """Check if a session has an active vector store (registry lookup, no disk access)."""
+    session = registry.get_session(session_id)
+    return session is not None and session["state"] == registry.READY
+
+
+def preload_hot_sessions(limit: int, memory_budget: int = 0, progress: Optional[dict] = None) -> int:
+    """
+    Load the hottest session indexes into the in-memory cache.
+    
+    Sessions are taken in order of access frequency (registry heat, most
+    recent access breaking ties). A session whose estimated index memory
+    (chunk count x dimension at the configured precision, plus chunk text)
+    would take the loaded indexes past the memory budget is skipped, and
+    smaller ones further down the list are still tried.
     
-    store_path = os.path.join(settings.VECTOR_STORE_PATH, session_id)
-    return os.path.exists(store_path)
+    Called in the pre-fork master so workers inherit the hot indexes
+    copy-on-write, and in the background when a worker starts.
+    
+    Args:
+        limit: Maximum number of sessions to load
+        memory_budget: Bytes of index memory to fill (0 = no budget)
+        progress: Dict updated in place with "sessions_planned",
+            "sessions_loaded" and "memory_bytes" as loading proceeds
+        
+    Returns:
+        Number of sessions loaded (including ones already in memory)
+    """
+    if limit <= 0:
+        return 0
+    
+    progress = {} if progress is None else progress
+    sessions = registry.hot_sessions(limit)
+    progress.update(sessions_planned=len(sessions), sessions_loaded=0, memory_bytes=0)
+    
+    backend = get_backend()
+    for session in sessions:
+        session_id = session["session_id"]
+        if memory_budget and not backend.is_loaded(session_id) \
+                and progress["memory_bytes"] + _estimated_memory(backend, session) > memory_budget:
+            continue
+        try:
+            if not load_vector_store(session_id):
+                continue
+            progress["memory_bytes"] += backend.stats(session_id)["memory_bytes"]
+        except Exception as e:
+            print(f"Warning: Could not preload session {session_id}: {e}")
+            continue
+        progress["sessions_loaded"] += 1
+    return progress["sessions_loaded"]
+
+
+def _estimated_memory(backend, session: dict) -> int:
+    """In-memory size a session's index will have once loaded (compared with stats()["memory_bytes"])."""
+    chunks = sum(document["chunks"] or 0 for document in registry.get_documents(session["session_id"]))
+    if not chunks:
+        # Sessions registered without chunk counts: fall back to their size on disk
+        return session["size_bytes"]
+    return backend.estimate_memory(chunks, EMBEDDING_DIM, text_bytes=chunks * 4 * settings.CHUNK_TOKENS)
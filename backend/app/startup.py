@@ -0,0 +1,268 @@
+"""
+Startup helpers: preloading heavy modules and import-time reporting.
+
+The services import LangChain, FAISS, PyPDF2 and the embedding runtime
+(sentence-transformers or onnxruntime) lazily, so `app.main` imports quickly and uvicorn can accept connections
+right away. In a pre-fork deployment (gunicorn.conf.py) the master calls
+warm_master() instead, so the modules, the embedding model and the hot
+session indexes are loaded once and shared copy-on-write by every worker.
+
+Import-time report (run from the backend directory):
+    python -m app.startup
+    python -m app.startup --preload --top 30
+"""
+import argparse
+import gc
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List
+
+# Modules the request path needs, in dependency order
+HEAVY_MODULES = [
+    "PyPDF2",
+    "langchain.prompts",
+    "langchain_openai",
+    "faiss",
+]
+
+# Modules of each embedding runtime (EMBEDDING_BACKEND)
+EMBEDDING_MODULES = {
+    "torch": ["langchain_community.embeddings", "sentence_transformers"],
+    "onnx": ["onnxruntime", "tokenizers"],
+}
+
+# Background warm-up of this process (see start_warmup)
+_warmup: dict = {"state": "disabled", "model_ready": False, "sessions_planned": 0, "sessions_loaded": 0, "memory_bytes": 0}
+_warmup_thread = None
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def preload_heavy_modules(modules: List[str] = None) -> Dict[str, float]:
+    """
+    Import the heavy modules used on the request path.
+
+    Args:
+        modules: Module names to import (defaults to HEAVY_MODULES and
+            the modules of the configured embedding runtime)
+
+    Returns:
+        Dictionary of module name -> seconds spent importing it
+        (modules that fail to import are reported with -1)
+    """
+    if modules is None:
+        from app.config import settings
+        
+        modules = HEAVY_MODULES + EMBEDDING_MODULES.get(settings.EMBEDDING_BACKEND, EMBEDDING_MODULES["torch"])
+    
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            timings[name] = time.perf_counter() - start
+        except ImportError as e:
+            print(f"Warning: Could not preload {name}: {e}")
+            timings[name] = -1
+    return timings
+
+
+def warm_master(preload_sessions: int = 0) -> dict:
+    """
+    Prepare a pre-fork master so workers share read-only memory.
+
+    Imports the heavy modules, loads the embedding model (and the reranker
+    when enabled), loads the most frequently used session indexes within
+    PRELOAD_MEMORY_MB, then freezes the GC so collections in the workers do
+    not touch (and copy) the inherited pages.
+
+    Args:
+        preload_sessions: Number of hot session indexes to load
+
+    Returns:
+        Dictionary with timing and count details
+    """
+    from app.config import settings
+    from app.services.vector_store import get_embeddings, preload_hot_sessions
+    from app.services.pdf_service import embedding_tokens
+
+    start = time.perf_counter()
+    timings = preload_heavy_modules()
+
+    # Keep torch single-threaded in the master: an OpenMP pool started
+    # before fork is not usable in the children. (onnxruntime sessions are
+    # created again in each worker.)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(1)
+
+    model_start = time.perf_counter()
+    get_embeddings().embed_query("warm up")
+    embedding_tokens("warm up")
+    if settings.RERANK_ENABLED:
+        from app.services.reranker import get_reranker
+        get_reranker()
+    model_seconds = time.perf_counter() - model_start
+
+    sessions = preload_hot_sessions(preload_sessions, settings.PRELOAD_MEMORY_MB * 1024 * 1024)
+
+    gc.collect()
+    gc.freeze()
+
+    return {
+        "modules": timings,
+        "model_seconds": round(model_seconds, 3),
+        "sessions_loaded": sessions,
+        "total_seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def start_warmup() -> bool:
+    """
+    Warm a worker in a background thread: load the embedding model (and the
+    reranker when enabled), then the hottest PRELOAD_SESSIONS indexes within
+    PRELOAD_MEMORY_MB. Requests are served meanwhile; progress is reported
+    by warmup_status() on /health. After warm_master() most of this is
+    already in memory and the thread finishes quickly.
+
+    Returns:
+        True if the thread was started (once per process, when WARMUP_ON_START)
+    """
+    global _warmup_thread
+    from app.config import settings
+
+    if not settings.WARMUP_ON_START or _warmup_thread is not None:
+        return False
+    _warmup.update(state="running", started=time.time())
+    _warmup_thread = threading.Thread(target=_run_warmup, name="warmup", daemon=True)
+    _warmup_thread.start()
+    return True
+
+
+def _run_warmup():
+    from app.config import settings
+    from app.services.vector_store import get_embeddings, preload_hot_sessions
+    from app.services.pdf_service import embedding_tokens
+
+    start = time.perf_counter()
+    try:
+        get_embeddings().embed_query("warm up")
+        embedding_tokens("warm up")
+        if settings.RERANK_ENABLED:
+            from app.services.reranker import get_reranker
+            get_reranker()
+        _warmup["model_ready"] = True
+
+        preload_hot_sessions(settings.PRELOAD_SESSIONS, settings.PRELOAD_MEMORY_MB * 1024 * 1024, _warmup)
+        _warmup["state"] = "done"
+    except Exception as e:
+        print(f"Warning: Warm-up failed: {e}")
+        _warmup.update(state="failed", error=str(e))
+    _warmup["seconds"] = round(time.perf_counter() - start, 3)
+
+
+def warmup_status() -> dict:
+    """
+    Progress of the background warm-up.
+
+    Returns:
+        {"state" ("disabled", "running", "done" or "failed"), "model_ready",
+        "sessions_planned", "sessions_loaded", "memory_bytes", ...}
+    """
+    return dict(_warmup)
+
+
+def configure_worker(workers: int, threads: int = 0):
+    """
+    Per-worker setup after fork: size the embedding runtime's thread pool
+    (torch or onnxruntime) so workers do not oversubscribe the CPU.
+
+    Args:
+        workers: Number of workers sharing the machine
+        threads: Explicit thread count (0 = cores / workers)
+    """
+    threads = threads or max(1, (os.cpu_count() or 1) // max(1, workers))
+    from app.config import settings
+    if settings.EMBEDDING_BACKEND == "onnx":
+        from app.services.onnx_embeddings import configure_threads
+        configure_threads(threads)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def import_time_report(target: str = "app.main", preload: bool = False, top: int = 20) -> dict:
+    """
+    Measure import cost of the app in a fresh interpreter using `python -X importtime`.
+
+    Args:
+        target: Module to import
+        preload: Also import HEAVY_MODULES (the pre-fork master's cost)
+        top: Number of most expensive modules to report
+
+    Returns:
+        Dictionary with total wall time and the top modules by cumulative time
+    """
+    code = f"import {target}"
+    if preload:
+        code += "; from app.startup import preload_heavy_modules; preload_heavy_modules()"
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True
+    )
+    wall = time.perf_counter() - start
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {target} failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            modules.append({
+                "module": match.group(4),
+                "self_ms": int(match.group(1)) / 1000,
+                "cumulative_ms": int(match.group(2)) / 1000,
+                "depth": len(match.group(3)) // 2,
+            })
+
+    # Top-level imports only count once toward the total
+    total_ms = sum(m["cumulative_ms"] for m in modules if m["depth"] == 0)
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+
+    return {
+        "target": target,
+        "preload": preload,
+        "wall_seconds": round(wall, 3),
+        "import_ms": round(total_ms, 1),
+        "modules_imported": len(modules),
+        "top": modules[:top],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report app import time")
+    parser.add_argument("--target", default="app.main", help="Module to import")
+    parser.add_argument("--preload", action="store_true", help="Include heavy module preload")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules to list")
+    args = parser.parse_args()
+
+    report = import_time_report(args.target, args.preload, args.top)
+    print(f"Import of {report['target']}{' + preload' if report['preload'] else ''}: "
+          f"{report['import_ms']:.1f} ms ({report['modules_imported']} modules, "
+          f"{report['wall_seconds']:.2f} s wall incl. interpreter start)")
+    print(f"{'cumulative ms':>14} {'self ms':>10}  module")
+    for m in report["top"]:
+        print(f"{m['cumulative_ms']:>14.1f} {m['self_ms']:>10.1f}  {'  ' * m['depth']}{m['module']}")
+
+
+if __name__ == "__main__":
+    main()
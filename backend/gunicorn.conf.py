@@ -0,0 +1,59 @@
+# Gunicorn config for the pre-fork multi-worker deployment.
+#
+#   gunicorn -c gunicorn.conf.py app.main:app
+#
+# The app is imported in the master (preload_app), which then loads the
+# embedding model and the hottest session indexes before forking, so
+# every worker shares those pages copy-on-write. Sessions are not pinned to
+# a worker: indexes live on disk under VECTOR_STORE_PATH and any worker
+# loads a session it has not seen yet on first use.
+import os
+import shutil
+import tempfile
+
+# Must be set before prometheus_client is imported by the app
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), "studygenius-prometheus")
+)
+# Tokenizers must not start their own thread pool before fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+from app.config import settings  # noqa: E402
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = max(1, settings.WORKERS)
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Large PDFs and multi-section papers can take a while
+timeout = 300
+graceful_timeout = 30
+
+
+def on_starting(server):
+    # Start every deployment with clean multiprocess metric files
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    from app.startup import warm_master
+
+    report = warm_master(preload_sessions=settings.PRELOAD_SESSIONS)
+    server.log.info(
+        "Master warmed in %.2fs (model %.2fs, %d sessions preloaded)",
+        report["total_seconds"], report["model_seconds"], report["sessions_loaded"]
+    )
+
+
+def post_fork(server, worker):
+    from app.startup import configure_worker
+
+    configure_worker(workers, settings.TORCH_THREADS_PER_WORKER)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1 @@
+# Scripts Package
@@ -0,0 +1,173 @@
+"""
+Calibrate the retrieval score below which questions are not sent to the LLM.
+
+Reads a labelled question set (JSON lines), scores every question against
+its session's index (best cosine similarity, as answer_question does) and
+picks the highest threshold that wrongly short-circuits at most
+--max-false-skip of the answerable questions.
+
+    {"session_id": "...", "question": "What is osmosis?", "answerable": true}
+    {"session_id": "...", "question": "Who won the 2018 World Cup?", "answerable": false}
+
+The overall threshold is printed (set it as ANSWER_MIN_SCORE). With --write,
+sessions with at least --min-per-session labelled questions of both kinds
+also get their own threshold in calibration.json, which overrides it.
+
+Run from the backend directory, with the same environment as the server:
+    python -m scripts.calibrate_answer_threshold questions.jsonl
+    python -m scripts.calibrate_answer_threshold questions.jsonl --max-false-skip 0.01 --write
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional
+import numpy as np
+from app.services.answerability import save_answer_threshold
+from app.services.vector_store import similarity_search_with_score
+
+
+def load_questions(path: str, default_session: Optional[str] = None) -> List[dict]:
+    """Read the labelled set, skipping blank lines."""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            session_id = item.get("session_id") or default_session
+            if not session_id or "question" not in item or "answerable" not in item:
+                raise ValueError(f"{path}:{line_number}: expected session_id, question and answerable")
+            questions.append({
+                "session_id": session_id,
+                "question": item["question"],
+                "answerable": bool(item["answerable"])
+            })
+    return questions
+
+
+def score_questions(questions: List[dict]) -> List[dict]:
+    """Add the best retrieval score of each question (questions of missing sessions are dropped)."""
+    scored = []
+    missing = set()
+    for item in questions:
+        if item["session_id"] in missing:
+            continue
+        try:
+            results = similarity_search_with_score(item["session_id"], item["question"], k=1)
+        except ValueError:
+            print(f"Warning: Session {item['session_id']} not found, skipping its questions")
+            missing.add(item["session_id"])
+            continue
+        scored.append({**item, "score": results[0][1] if results else 0.0})
+    return scored
+
+
+def evaluate(threshold: float, answerable: np.ndarray, unanswerable: np.ndarray) -> Dict[str, float]:
+    """Effect of a threshold on the labelled scores."""
+    total = len(answerable) + len(unanswerable)
+    skipped_answerable = int((answerable < threshold).sum())
+    skipped_unanswerable = int((unanswerable < threshold).sum())
+    return {
+        "threshold": round(float(threshold), 4),
+        "false_skip_rate": skipped_answerable / len(answerable) if len(answerable) else 0.0,
+        "unanswerable_caught": skipped_unanswerable / len(unanswerable) if len(unanswerable) else 0.0,
+        "llm_calls_saved": (skipped_answerable + skipped_unanswerable) / total if total else 0.0,
+    }
+
+
+def choose_threshold(answerable: List[float], unanswerable: List[float], max_false_skip: float) -> Dict[str, float]:
+    """
+    Pick the threshold that catches the most unanswerable questions while
+    short-circuiting at most max_false_skip of the answerable ones.
+
+    Among thresholds that catch the same questions, the one halfway between
+    the highest caught unanswerable score and the limit is used, leaving a
+    margin on both sides. Returns threshold 0 (off) if nothing is caught.
+    """
+    answerable = np.sort(np.asarray(answerable, dtype="float64"))
+    unanswerable = np.asarray(unanswerable, dtype="float64")
+    if len(answerable) == 0 or len(unanswerable) == 0:
+        return {**evaluate(0.0, answerable, unanswerable), "threshold": 0.0}
+
+    # At most `allowed` answerable scores fall strictly below answerable[allowed]
+    allowed = int(np.floor(max_false_skip * len(answerable)))
+    limit = answerable[min(allowed, len(answerable) - 1)]
+
+    caught = unanswerable[unanswerable < limit]
+    if len(caught) == 0:
+        return {**evaluate(0.0, answerable, unanswerable), "threshold": 0.0}
+    return evaluate((caught.max() + limit) / 2, answerable, unanswerable)
+
+
+def calibrate(scored: List[dict], max_false_skip: float) -> Dict[str, float]:
+    answerable = [item["score"] for item in scored if item["answerable"]]
+    unanswerable = [item["score"] for item in scored if not item["answerable"]]
+    result = choose_threshold(answerable, unanswerable, max_false_skip)
+    result.update({"answerable": len(answerable), "unanswerable": len(unanswerable)})
+    return result
+
+
+def sweep(scored: List[dict], steps: int = 9) -> List[Dict[str, float]]:
+    """Effect of thresholds spread over the observed score range, for the report."""
+    answerable = np.asarray([item["score"] for item in scored if item["answerable"]])
+    unanswerable = np.asarray([item["score"] for item in scored if not item["answerable"]])
+    scores = np.asarray([item["score"] for item in scored])
+    return [evaluate(t, answerable, unanswerable) for t in np.linspace(scores.min(), scores.max(), steps)]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Calibrate the answerability score threshold")
+    parser.add_argument("questions", help="JSON lines with session_id, question and answerable")
+    parser.add_argument("--session", help="Session for lines without a session_id")
+    parser.add_argument("--max-false-skip", type=float, default=0.02,
+                        help="Largest fraction of answerable questions that may be short-circuited")
+    parser.add_argument("--min-per-session", type=int, default=20,
+                        help="Labelled questions a session needs for its own threshold")
+    parser.add_argument("--write", action="store_true", help="Save per-session thresholds (calibration.json)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    scored = score_questions(load_questions(args.questions, args.session))
+    if not scored:
+        print("No questions could be scored")
+        return 1
+
+    by_session = defaultdict(list)
+    for item in scored:
+        by_session[item["session_id"]].append(item)
+
+    overall = calibrate(scored, args.max_false_skip)
+    sessions = {}
+    for session_id, items in by_session.items():
+        result = calibrate(items, args.max_false_skip)
+        enough = result["answerable"] and result["unanswerable"] and len(items) >= args.min_per_session
+        if enough and result["threshold"] > 0:
+            sessions[session_id] = result
+            if args.write:
+                save_answer_threshold(session_id, result["threshold"], {
+                    **result, "max_false_skip": args.max_false_skip
+                })
+
+    if args.json:
+        print(json.dumps({"overall": overall, "sessions": sessions, "sweep": sweep(scored)}, indent=2))
+        return 0
+
+    print(f"{len(scored)} questions ({overall['answerable']} answerable, {overall['unanswerable']} not), "
+          f"max false skip {args.max_false_skip:.1%}\n")
+    print(f"{'threshold':>10} {'false skip':>11} {'caught':>8} {'saved':>8}")
+    for row in sweep(scored):
+        print(f"{row['threshold']:>10.4f} {row['false_skip_rate']:>11.1%} "
+              f"{row['unanswerable_caught']:>8.1%} {row['llm_calls_saved']:>8.1%}")
+
+    print(f"\nANSWER_MIN_SCORE={overall['threshold']}  "
+          f"(false skip {overall['false_skip_rate']:.1%}, unanswerable caught {overall['unanswerable_caught']:.1%})")
+    for session_id, result in sessions.items():
+        print(f"  {session_id}: {result['threshold']} "
+              f"(false skip {result['false_skip_rate']:.1%}, caught {result['unanswerable_caught']:.1%})"
+              f"{' - saved' if args.write else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Export, verify and benchmark the ONNX version of the embedding model.
+
+    export  Export all-MiniLM-L6-v2 from sentence-transformers to ONNX
+            (--quantize also writes a dynamic int8 model), then verify it
+    verify  Compare the ONNX vectors with the torch vectors and record the
+            result in verification.json; the app only loads verified models
+    bench   Chunks/sec and query latency of torch, onnx and onnx-int8
+
+Export and verify need torch and sentence-transformers; the app itself
+only needs onnxruntime and tokenizers. Run from the backend directory:
+    python -m scripts.onnx_embeddings export --quantize
+    python -m scripts.onnx_embeddings verify --pdf notes.pdf
+    python -m scripts.onnx_embeddings bench --chunks 500 --queries 200
+"""
+import argparse
+import inspect
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import numpy as np
+from app.config import settings
+from app.services.onnx_embeddings import (
+    INT8_MODEL_FILE, MODEL_FILE, OnnxEmbeddings, configure_threads, write_verification
+)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+RUNTIMES = ("torch", "onnx", "onnx-int8")
+
+_SENTENCES = [
+    "The mitochondria is the powerhouse of the cell and produces ATP through respiration.",
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "Newton's second law states that force equals mass times acceleration.",
+    "The French Revolution began in 1789 and transformed European politics.",
+    "A binary search tree keeps its keys in sorted order for fast lookup.",
+    "Supply and demand determine the market price of goods in a free economy.",
+    "The derivative of a function measures its instantaneous rate of change.",
+    "Shakespeare wrote Hamlet, a tragedy about the prince of Denmark.",
+    "Covalent bonds form when two atoms share a pair of electrons.",
+    "Plate tectonics explains earthquakes, volcanoes and mountain building.",
+    "In 1945 the United Nations was founded to maintain international peace.",
+    "Gradient descent minimizes a loss function by following its negative gradient.",
+    "Chapter 3: Cell Structure and Function",
+    "Q4. Explain the difference between mitosis and meiosis. (5 marks)",
+    "Table 2.1 lists the boiling points of common organic solvents at sea level.",
+    "Enzymes lower the activation energy of biochemical reactions.",
+]
+
+
+def sample_texts(count: int, seed: int = 0) -> List[str]:
+    """
+    Synthetic chunks of 1 to 40 sentences (the longest exceed the 256-token
+    limit, so truncation is compared too).
+    """
+    rng = np.random.default_rng(seed)
+    texts = []
+    for i in range(count):
+        sentences = rng.choice(_SENTENCES, size=int(rng.integers(1, 41)))
+        texts.append(f"Section {i}. " + " ".join(sentences))
+    return texts
+
+
+def pdf_texts(path: str) -> List[str]:
+    """Chunks of a PDF, split as at upload."""
+    from app.services.pdf_service import extract_pages_from_pdf, split_pages_into_chunks
+
+    with open(path, "rb") as f:
+        pages = extract_pages_from_pdf(f.read())
+    return [chunk["text"] for chunk in split_pages_into_chunks(pages)]
+
+
+def load_runtime(runtime: str, model_dir: str, model_name: str = MODEL_NAME):
+    """Embeddings object of a runtime (ONNX models are loaded without the verification check)."""
+    if runtime == "torch":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": "cpu"})
+    return OnnxEmbeddings(model_dir, quantized=runtime == "onnx-int8", min_cosine=None)
+
+
+# -------------------------
+# Export
+# -------------------------
+
+def export_model(model_dir: str, model_name: str = MODEL_NAME, opset: int = 14, quantize: bool = False) -> List[str]:
+    """
+    Export the transformer of the sentence-transformers model to ONNX.
+
+    Pooling and normalization stay in NumPy (OnnxEmbeddings), so the graph
+    has inputs input_ids, attention_mask and token_type_ids and one output,
+    last_hidden_state, with dynamic batch and sequence axes.
+
+    Returns:
+        Names of the written model files
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer.save_pretrained(model_dir)  # writes tokenizer.json
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.inner(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            )[0]
+
+    inputs = ["input_ids", "attention_mask", "token_type_ids"]
+    sample = tokenizer(["An example sentence to trace the graph."], return_tensors="pt")
+
+    # Use the TorchScript exporter (dynamic_axes) on versions where dynamo is the default
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    path = os.path.join(model_dir, MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            _HiddenStates(transformer),
+            tuple(sample[name] for name in inputs),
+            path,
+            input_names=inputs,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in inputs + ["last_hidden_state"]},
+            opset_version=opset,
+            do_constant_folding=True,
+            **kwargs
+        )
+    written = [MODEL_FILE]
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(path, os.path.join(model_dir, INT8_MODEL_FILE), weight_type=QuantType.QInt8)
+        written.append(INT8_MODEL_FILE)
+    return written
+
+
+# -------------------------
+# Verification
+# -------------------------
+
+def compare_vectors(reference: np.ndarray, candidate: np.ndarray, k: int = 5) -> Dict[str, float]:
+    """
+    How close candidate vectors are to the reference vectors: per-text cosine
+    similarity, largest element difference, and top-k retrieval agreement
+    when each text is used as a query against all others.
+    """
+    cosines = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    k = min(k, len(reference) - 1)
+    reference_scores = reference @ reference.T
+    candidate_scores = candidate @ reference.T
+    np.fill_diagonal(reference_scores, -np.inf)
+    np.fill_diagonal(candidate_scores, -np.inf)
+    reference_top = np.argsort(-reference_scores, axis=1)[:, :k]
+    candidate_top = np.argsort(-candidate_scores, axis=1)[:, :k]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(reference_top, candidate_top)]) if k > 0 else 1.0
+    return {
+        "min_cosine": round(float(cosines.min()), 6),
+        "mean_cosine": round(float(cosines.mean()), 6),
+        "max_abs_diff": round(float(np.abs(reference - candidate).max()), 6),
+        f"top{k}_agreement": round(float(overlap), 4),
+    }
+
+
+def verify_models(model_dir: str, texts: List[str], model_name: str = MODEL_NAME) -> Dict[str, dict]:
+    """
+    Compare every exported model in model_dir with the torch model on texts
+    and record the results in verification.json.
+    """
+    reference = np.asarray(load_runtime("torch", model_dir, model_name).embed_documents(texts), dtype="float32")
+    results = {}
+    for runtime, model_file in (("onnx", MODEL_FILE), ("onnx-int8", INT8_MODEL_FILE)):
+        if not os.path.exists(os.path.join(model_dir, model_file)):
+            continue
+        candidate = load_runtime(runtime, model_dir).embed(texts)
+        result = compare_vectors(reference, candidate)
+        result.update({"texts": len(texts), "verified_at": datetime.now(timezone.utc).isoformat()})
+        write_verification(model_dir, model_file, result)
+        results[model_file] = result
+    return results
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def benchmark_runtime(embeddings, texts: List[str], queries: List[str]) -> Dict[str, float]:
+    """Chunks/sec of embed_documents and latency of single embed_query calls."""
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+
+    return {
+        "chunks_per_sec": len(texts) / seconds,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def run_benchmark(
+    model_dir: str,
+    runtimes: List[str],
+    texts: List[str],
+    queries: List[str],
+    model_name: str = MODEL_NAME
+) -> Dict[str, dict]:
+    results = {}
+    reference = None
+    for runtime in runtimes:
+        start = time.perf_counter()
+        try:
+            embeddings = load_runtime(runtime, model_dir, model_name)
+            embeddings.embed_query("warm up")
+        except (ImportError, OSError) as e:
+            print(f"Skipping {runtime}: {e}")
+            continue
+        result = {"load_seconds": time.perf_counter() - start}
+        result.update(benchmark_runtime(embeddings, texts, queries))
+
+        # Vectors of the first 200 texts, compared with torch when it ran
+        vectors = np.asarray(embeddings.embed_documents(texts[:200]), dtype="float32")
+        if runtime == "torch":
+            reference = vectors
+        elif reference is not None:
+            result["min_cosine_vs_torch"] = compare_vectors(reference, vectors)["min_cosine"]
+        results[runtime] = result
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ONNX embedding model: export, verify, benchmark")
+    parser.add_argument("command", choices=("export", "verify", "bench"))
+    parser.add_argument("--model-dir", default=settings.ONNX_MODEL_DIR)
+    parser.add_argument("--model", default=MODEL_NAME, help="sentence-transformers model name or local path")
+    parser.add_argument("--quantize", action="store_true", help="export: also write the int8 model")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--pdf", help="Use the chunks of this PDF instead of synthetic texts")
+    parser.add_argument("--chunks", type=int, default=500, help="Texts to verify / embed")
+    parser.add_argument("--queries", type=int, default=200, help="bench: single queries to time")
+    parser.add_argument("--runtimes", default=",".join(RUNTIMES), help="bench: comma-separated runtimes")
+    parser.add_argument("--threads", type=int, default=0, help="Threads per runtime (0 = library default)")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        configure_threads(args.threads)
+        try:
+            import torch
+            torch.set_num_threads(args.threads)
+        except ImportError:
+            pass
+
+    texts = pdf_texts(args.pdf)[:args.chunks] if args.pdf else sample_texts(args.chunks)
+
+    if args.command == "export":
+        written = export_model(args.model_dir, args.model, args.opset, args.quantize)
+        print(f"Exported {', '.join(written)} to {args.model_dir}")
+
+    if args.command in ("export", "verify"):
+        results = verify_models(args.model_dir, texts, args.model)
+        if not results:
+            print(f"No ONNX models found in {args.model_dir}")
+            return 1
+        failed = False
+        for model_file, result in results.items():
+            passed = result["min_cosine"] >= settings.ONNX_MIN_COSINE
+            failed = failed or not passed
+            print(f"{model_file}: {'ok' if passed else 'FAILED'} (ONNX_MIN_COSINE={settings.ONNX_MIN_COSINE})")
+            for key, value in result.items():
+                print(f"  {key:<16} {value}")
+        return 1 if failed else 0
+
+    queries = [text.split(". ")[0] for text in sample_texts(args.queries, seed=1)]
+    runtimes = [runtime.strip() for runtime in args.runtimes.split(",") if runtime.strip()]
+    results = run_benchmark(args.model_dir, runtimes, texts, queries, args.model)
+
+    print(f"{len(texts)} chunks, {len(queries)} queries, threads={args.threads or 'default'}\n")
+    for runtime, result in results.items():
+        print(f"[{runtime}]")
+        for key, value in result.items():
+            print(f"  {key:<22} {value:10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
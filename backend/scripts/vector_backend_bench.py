@@ -0,0 +1,300 @@
+"""
+Conformance checks and benchmark for the vector store backends.
+
+Every backend must give the same answers for the same data: the checks
+compare each one against a NumPy brute-force reference (exactly at float32,
+by recall at reduced precision), then the benchmark reports build, cold
+load and query latency, recall@k and memory per backend and precision on
+synthetic MiniLM-sized vectors (unit vectors clustered by topic).
+
+Run from the backend directory:
+    python -m scripts.vector_backend_bench
+    python -m scripts.vector_backend_bench --backends faiss,sqlite --sessions 50 --chunks 800
+    python -m scripts.vector_backend_bench --precisions float32,int8,binary --rescore-factor 8
+    python -m scripts.vector_backend_bench --check-only
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from app.services.backends import BACKENDS
+from app.services.backends.base import VectorBackend
+from app.services.backends.quantization import PRECISIONS
+
+# Minimum recall@5 against brute force in the conformance checks
+MIN_RECALL = {"float32": 1.0, "float16": 0.95, "int8": 0.8, "binary": 0.8}
+
+
+def make_backend_factory(
+    name: str,
+    root: str,
+    precision: str = "float32",
+    rescore_factor: int = 4
+) -> Callable[[], VectorBackend]:
+    """Factory for a backend storing its data under root (a new instance acts like a new process)."""
+    if name == "faiss":
+        from app.services.backends.faiss_backend import FaissBackend
+        return lambda: FaissBackend(lambda session_id: os.path.join(root, session_id), precision, rescore_factor)
+    if name == "sqlite":
+        from app.services.backends.sqlite_backend import SqliteBackend
+        return lambda: SqliteBackend(os.path.join(root, "vectors.db"), precision, rescore_factor)
+    raise ValueError(f"Unknown vector backend: {name}")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype("float32")
+
+
+def random_vectors(rng: np.random.Generator, n: int, dim: int, topics: int = 16) -> np.ndarray:
+    """Unit vectors grouped around a few topic directions, like the chunk embeddings of one document."""
+    centers = rng.standard_normal((topics, dim))
+    points = centers[rng.integers(0, topics, n)] + 1.2 * rng.standard_normal((n, dim))
+    return _normalize(points)
+
+
+def random_queries(rng: np.random.Generator, vectors: np.ndarray, n: int) -> np.ndarray:
+    """Queries near stored vectors (a question about some passage)."""
+    picked = vectors[rng.integers(0, len(vectors), n)]
+    return _normalize(picked + 0.06 * rng.standard_normal(picked.shape))
+
+
+def reference_search(vectors: np.ndarray, query: np.ndarray, k: int) -> List[int]:
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return np.argsort(distances, kind="stable")[:k].tolist()
+
+
+def _rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# -------------------------
+# Conformance
+# -------------------------
+
+def check_backend(
+    factory: Callable[[], VectorBackend],
+    precision: str = "float32",
+    dim: int = 64,
+    seed: int = 0
+) -> List[str]:
+    """
+    Run the conformance checks against one backend at one precision.
+
+    Returns:
+        List of failure descriptions (empty if the backend conforms)
+    """
+    rng = np.random.default_rng(seed)
+    failures = []
+
+    def expect(condition: bool, message: str):
+        if not condition:
+            failures.append(message)
+
+    backend = factory()
+    session_id = str(uuid.uuid4())
+    vectors = random_vectors(rng, 200, dim)
+    texts = [f"chunk {i}" for i in range(200)]
+    metadatas = [{"page": i // 10 + 1, "heading": None} for i in range(200)]
+    queries = random_queries(rng, vectors, 20)
+
+    backend.create(session_id, texts, vectors, metadatas)
+
+    # Top-k nearest first: the brute-force rows at float32, most of them below
+    exact = precision in ("float32", "binary")
+    tolerance = 1e-4 if exact else 0.05
+    hits = 0
+    for query in queries:
+        results = backend.search(session_id, query, 5)
+        rows = [r["row"] for r in results]
+        reference = reference_search(vectors, query, 5)
+        hits += len(set(rows) & set(reference))
+        if precision == "float32":
+            expect(rows == reference, "search rows differ from brute force")
+        expect(all(a["distance"] <= b["distance"] + 1e-5 for a, b in zip(results, results[1:])), "results not sorted by distance")
+        expected = float(((vectors[rows[0]] - query) ** 2).sum())
+        expect(abs(results[0]["distance"] - expected) < tolerance, "distance is not squared L2")
+        expect(results[0]["text"] == texts[rows[0]], "search text does not match row")
+        expect(results[0]["metadata"] == metadatas[rows[0]], "search metadata does not match row")
+    recall = hits / (5 * len(queries))
+    expect(recall >= MIN_RECALL[precision], f"recall@5 {recall:.2f} below {MIN_RECALL[precision]}")
+
+    expect(len(backend.search(session_id, queries[0], 500)) == 200, "k larger than the index must return every row")
+    atol = 1e-6 if exact else 0.02
+    expect(np.allclose(backend.vectors(session_id), vectors, atol=atol), "vectors() does not return the stored vectors")
+    expect(np.allclose(backend.vectors(session_id, [7, 3]), vectors[[7, 3]], atol=atol), "vectors(rows) order")
+    expect([d["text"] for d in backend.documents(session_id, [3, 1])] == ["chunk 3", "chunk 1"], "documents() order")
+
+    # Append continues the row numbering
+    extra = random_vectors(rng, 5, dim)
+    total = backend.append(session_id, [f"extra {i}" for i in range(5)], extra, [{"page": 9}] * 5)
+    expect(total == 205, f"append returned {total}, expected 205")
+    hit = backend.search(session_id, extra[2], 1)[0]
+    expect(hit["row"] == 202 and hit["text"] == "extra 2", "appended vector not found at row 202")
+
+    stats = backend.stats(session_id)
+    expect(stats["vectors"] == 205 and stats["dim"] == dim, f"stats mismatch: {stats}")
+    expect(stats["precision"] == precision, f"stats precision {stats['precision']}, expected {precision}")
+    expect(stats["memory_bytes"] > 0 and stats["disk_bytes"] > 0, f"stats sizes missing: {stats}")
+
+    # Persistence: a new instance (another worker) loads the same data
+    other = factory()
+    expect(not other.is_loaded(session_id), "new instance should start empty")
+    expect(other.load(session_id), "stored session could not be loaded")
+    reloaded = [r["row"] for r in other.search(session_id, queries[0], 5)]
+    resident = [r["row"] for r in backend.search(session_id, queries[0], 5)]
+    if precision == "float32":
+        expect(reloaded == resident, "reloaded session returns different results")
+    else:
+        # Quantization parameters may be refit over the appended rows on reload
+        expect(len(set(reloaded) & set(resident)) >= 4, "reloaded session returns different results")
+
+    # Evict keeps storage, delete removes it
+    backend.evict(session_id)
+    expect(not backend.is_loaded(session_id), "evict did not drop the session from memory")
+    expect(backend.load(session_id), "evicted session could not be reloaded")
+    backend.delete(session_id)
+    expect(not backend.is_loaded(session_id), "delete did not drop the session from memory")
+    expect(not factory().load(session_id), "deleted session is still stored")
+    try:
+        backend.search(session_id, queries[0], 5)
+        failures.append("search on a deleted session must raise ValueError")
+    except ValueError:
+        pass
+
+    expect(not backend.load(str(uuid.uuid4())), "unknown session must not load")
+    return failures
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def benchmark_backend(
+    factory: Callable[[], VectorBackend],
+    sessions: int,
+    chunks: int,
+    dim: int,
+    queries: int,
+    k: int,
+    seed: int = 0
+) -> Dict[str, float]:
+    """Measure build, cold load and query latency, recall@k and memory for one backend."""
+    rng = np.random.default_rng(seed)
+    data = {str(uuid.uuid4()): random_vectors(rng, chunks, dim) for _ in range(sessions)}
+    session_ids = list(data)
+    query_sessions = [session_ids[i % sessions] for i in range(queries)]
+    query_vectors = np.vstack([random_queries(rng, data[session_id], 1) for session_id in query_sessions])
+    # Short texts, so memory_mb is mostly the vectors
+    texts = [f"chunk {i}" for i in range(chunks)]
+    metadatas = [{"page": i // 4 + 1} for i in range(chunks)]
+
+    backend = factory()
+    start = time.perf_counter()
+    for session_id, vectors in data.items():
+        backend.create(session_id, texts, vectors, metadatas)
+    build = time.perf_counter() - start
+    del backend
+
+    # Cold load in a fresh instance, measuring resident memory growth
+    gc.collect()
+    backend = factory()
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    for session_id in data:
+        backend.load(session_id)
+    load = time.perf_counter() - start
+    rss_after = _rss_bytes()
+
+    latencies = []
+    hits = 0
+    for session_id, query in zip(query_sessions, query_vectors):
+        start = time.perf_counter()
+        results = backend.search(session_id, query, k)
+        latencies.append(time.perf_counter() - start)
+        hits += len({r["row"] for r in results} & set(reference_search(data[session_id], query, k)))
+    latencies = np.array(latencies) * 1000
+
+    stats = [backend.stats(session_id) for session_id in session_ids]
+    return {
+        "build_ms_per_session": build / sessions * 1000,
+        "load_ms_per_session": load / sessions * 1000,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p95_ms": float(np.percentile(latencies, 95)),
+        "recall_at_k": hits / (k * queries),
+        "memory_mb": sum(s["memory_bytes"] for s in stats) / 1e6,
+        "rss_growth_mb": (rss_after - rss_before) / 1e6 if rss_before is not None else float("nan"),
+        "disk_mb": sum(s["disk_bytes"] for s in stats) / 1e6,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Vector backend conformance checks and benchmark")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated backend names")
+    parser.add_argument("--precisions", default=",".join(PRECISIONS), help="Comma-separated storage precisions")
+    parser.add_argument("--rescore-factor", type=int, default=4, help="Binary: candidates rescored per result")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=500, help="Chunks per session")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding size (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=12)
+    parser.add_argument("--check-only", action="store_true", help="Run the conformance checks only")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.backends.split(",") if name.strip()]
+    precisions = [precision.strip() for precision in args.precisions.split(",") if precision.strip()]
+    results = {}
+    failed = False
+
+    for name in names:
+        for precision in precisions:
+            label = f"{name}/{precision}"
+            root = tempfile.mkdtemp(prefix=f"bench-{name}-{precision}-")
+            try:
+                failures = check_backend(
+                    make_backend_factory(name, os.path.join(root, "check"), precision, args.rescore_factor),
+                    precision
+                )
+                failed = failed or bool(failures)
+                results[label] = {"conformance": failures or "ok"}
+                if not args.check_only and not failures:
+                    results[label].update(benchmark_backend(
+                        make_backend_factory(name, os.path.join(root, "bench"), precision, args.rescore_factor),
+                        args.sessions, args.chunks, args.dim, args.queries, args.k
+                    ))
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 1 if failed else 0
+
+    print(
+        f"{args.sessions} sessions x {args.chunks} chunks, dim {args.dim}, {args.queries} queries, "
+        f"k={args.k}, rescore factor {args.rescore_factor}\n"
+    )
+    for label, result in results.items():
+        conformance = result.pop("conformance")
+        print(f"[{label}] conformance: {'ok' if conformance == 'ok' else 'FAILED'}")
+        if conformance != "ok":
+            for failure in conformance:
+                print(f"  - {failure}")
+        for key, value in result.items():
+            print(f"  {key:<22} {value:10.3f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+import pytest
+from app.config import settings
+from app.services import session_registry as registry
+
+
+@pytest.fixture
+def registry_db(tmp_path, monkeypatch):
+    """A fresh session registry (and vector store directory) under tmp_path."""
+    monkeypatch.setattr(settings, "SESSION_DB_PATH", str(tmp_path / "sessions.db"))
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path / "vector_stores"))
+    monkeypatch.setattr(registry, "_conn", None)
+    monkeypatch.setattr(registry, "_cache", {})
+    yield registry
+    if registry._conn is not None:
+        registry._conn.close()
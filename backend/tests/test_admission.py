@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from app.services import admission
+from app.services.admission import AdmissionGate, AdmissionMiddleware, Overloaded, admit
+
+
+def test_full_queue_is_rejected_with_429():
+    async def run():
+        gate = AdmissionGate("ask", limit=1, queue_size=1, timeout=5)
+        await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.waiting == 1
+
+        with pytest.raises(Overloaded) as shed:
+            await gate.acquire()
+        assert shed.value.status_code == 429
+        assert shed.value.retry_after >= 1
+
+        gate.release(0.1)
+        await waiter
+        assert gate.waiting == 0
+
+    asyncio.run(run())
+
+
+def test_queued_request_times_out_with_503():
+    async def run():
+        gate = AdmissionGate("generate", limit=1, queue_size=4, timeout=0.05)
+        await gate.acquire()
+        with pytest.raises(Overloaded) as shed:
+            await gate.acquire()
+        assert shed.value.status_code == 503
+        assert gate.waiting == 0
+
+    asyncio.run(run())
+
+
+def test_retry_after_follows_service_time_and_queue():
+    async def run():
+        gate = AdmissionGate("upload", limit=2, queue_size=8, timeout=30)
+        assert gate.retry_after() == 15  # no service time yet: the queue timeout
+
+        await gate.acquire()
+        gate.release(4.0)
+        gate.waiting = 3
+        assert gate.retry_after() == 8  # 4 s for each of the 4 requests, 2 at a time
+
+    asyncio.run(run())
+
+
+def _asgi_app(sent_body: asyncio.Event, finish: asyncio.Event):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+        sent_body.set()
+        await finish.wait()  # background tasks run after the body is sent
+    return app
+
+
+def _scope(path: str) -> dict:
+    return {"type": "http", "method": "POST", "path": path, "headers": []}
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def test_middleware_frees_the_slot_once_the_body_is_sent():
+    async def run():
+        sent_body, finish = asyncio.Event(), asyncio.Event()
+        gate = AdmissionGate("upload", limit=1, queue_size=0, timeout=1)
+        middleware = AdmissionMiddleware(_asgi_app(sent_body, finish), gates={"upload": gate})
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        first = asyncio.create_task(middleware(_scope("/student/upload"), _receive, send))
+        await sent_body.wait()
+        assert not gate._semaphore.locked()
+
+        finish.set()
+        await first
+        await middleware(_scope("/student/upload"), _receive, send)
+        assert [m["status"] for m in messages if m["type"] == "http.response.start"] == [200, 200]
+
+    asyncio.run(run())
+
+
+def test_middleware_sheds_with_retry_after():
+    async def run():
+        gate = AdmissionGate("upload", limit=1, queue_size=0, timeout=1)
+        await gate.acquire()
+        middleware = AdmissionMiddleware(_asgi_app(asyncio.Event(), asyncio.Event()), gates={"upload": gate})
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await middleware(_scope("/teacher/upload"), _receive, send)
+        start = messages[0]
+        assert start["status"] == 429
+        assert (b"retry-after", b"1") in start["headers"]
+
+    asyncio.run(run())
+
+
+def test_admit_takes_the_named_gate(monkeypatch):
+    async def run():
+        gate = AdmissionGate("ask", limit=1, queue_size=0, timeout=1)
+        monkeypatch.setattr(admission, "_gates", {"ask": gate})
+
+        async with admit("ask"):
+            assert gate._semaphore.locked()
+            with pytest.raises(Overloaded) as shed:
+                async with admit("ask"):
+                    pass
+            assert shed.value.status_code == 429
+        assert not gate._semaphore.locked()
+
+        async with admit("generate"):  # no gate configured
+            pass
+
+    asyncio.run(run())
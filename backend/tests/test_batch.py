@@ -0,0 +1,64 @@
+from app.services.batch_qa import group_questions, split_answers
+from app.services.batch_generation import QuestionPool
+
+
+def _sources(*texts):
+    return [{"text": text} for text in texts]
+
+
+def test_overlapping_questions_share_a_group():
+    contexts = {
+        0: _sources("a", "b", "c"),
+        1: _sources("a", "b", "d"),
+        2: _sources("x", "y", "z"),
+    }
+    assert group_questions(contexts, max_size=4, min_overlap=0.6) == [[0, 1], [2]]
+
+
+def test_groups_respect_size_and_overlap_limits():
+    contexts = {index: _sources("a", "b") for index in range(3)}
+    assert group_questions(contexts, max_size=2, min_overlap=0.5) == [[0, 1], [2]]
+    assert group_questions(contexts, max_size=1, min_overlap=0.5) == [[0], [1], [2]]
+
+    contexts = {0: _sources("a", "b", "c"), 1: _sources("a", "x", "y")}
+    assert group_questions(contexts, max_size=4, min_overlap=0.5) == [[0], [1]]
+
+
+def test_merged_context_growth_is_bounded():
+    # Half of question 2's chunks overlap, but the group would grow past 1.5x its largest context
+    contexts = {
+        0: _sources("a", "b", "c", "d"),
+        1: _sources("a", "b", "c", "e"),
+        2: _sources("a", "b", "x", "y"),
+    }
+    assert group_questions(contexts, max_size=4, min_overlap=0.5) == [[0, 1], [2]]
+
+
+def test_split_answers_by_headers():
+    response = (
+        "**Answer 1:** Paris is the capital.\n\n"
+        "## Answer 2: Jupiter\n"
+        "Answer 3:\n"
+        "Answer 7: out of range\n"
+        "Answer 1: duplicate"
+    )
+    assert split_answers(response, 3) == {1: "Paris is the capital.", 2: "Jupiter"}
+
+
+def test_question_pool_keeps_variants_unique():
+    pool = QuestionPool(overgenerate=0.5)
+    assert pool.request_count(4) == 6
+    assert QuestionPool().request_count(4) == 4
+
+    first = pool.claim([
+        {"number": 1, "question": "What is inertia?"},
+        {"number": 2, "question": "Define force."},
+        {"number": 3, "question": "State Newton's first law."},
+    ], 2)
+    assert [q["question"] for q in first] == ["What is inertia?", "Define force."]
+
+    second = pool.claim([
+        {"number": 1, "question": "what is INERTIA"},
+        {"number": 2, "question": "State Newton's first law."},
+    ], 2)
+    assert second == [{"number": 1, "question": "State Newton's first law."}]
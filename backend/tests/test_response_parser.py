@@ -0,0 +1,175 @@
+import random
+import pytest
+from app.services.response_parser import ResponseParser, parse_response, clean_response
+
+MCQ = """Here are the questions:
+**1. What is the capital of France?**
+A) Paris
+B) London
+C) Berlin
+D) Madrid
+Answer: A
+2) Which planet is the largest
+in the solar system?
+A. Jupiter
+B. Mars
+C. Earth
+D. Venus
+Correct Answer: a
+Note: these questions cover chapter 1.
+3. Ignored after the note
+A) x
+"""
+
+THEORY = """Sure, here you go.
+Q1. Define photosynthesis.
+Answer: The process by which plants
+convert light into chemical energy.
+Question 2) Explain why the sky
+is blue.
+Ans: Rayleigh scattering.
+3. List two uses of water.
+Let me know if you need more.
+"""
+
+PAPER = """SECTION A - MULTIPLE CHOICE
+1. What is 2 + 2?
+A) 3
+B) 4
+C: 5
+D. 6
+Answer: B
+2. Which gas do plants absorb?
+A) Oxygen
+B) Carbon dioxide
+Answer: B
+SECTION B - SHORT ANSWER
+3. Define inertia.
+Answer: Resistance to a change in motion.
+- a bullet note that is skipped
+SECTION C - LONG ANSWER
+4. Discuss the causes of the First World War
+in detail.
+Answer: Alliances, militarism, imperialism and nationalism.
+"""
+
+# Output of the line-by-line clean_llm_response / parse_*_response functions
+# the parser replaced, for the inputs above
+MCQ_EXPECTED = [
+    {
+        "number": 1,
+        "question": "What is the capital of France?",
+        "options": ["A) Paris", "B) London", "C) Berlin", "D) Madrid"],
+        "answer": "A"
+    },
+    {
+        "number": 2,
+        "question": "Which planet is the largest in the solar system?",
+        "options": ["A) Jupiter", "B) Mars", "C) Earth", "D) Venus"],
+        "answer": "A"
+    },
+]
+
+THEORY_EXPECTED = [
+    {
+        "number": 1,
+        "question": "Define photosynthesis.",
+        "answer": "The process by which plants convert light into chemical energy."
+    },
+    {"number": 2, "question": "Explain why the sky is blue.", "answer": "Rayleigh scattering."},
+    {"number": 3, "question": "List two uses of water."},
+]
+
+PAPER_EXPECTED = [
+    {
+        "name": "Section A - Multiple Choice Questions",
+        "marks_per_question": 1,
+        "questions": [
+            {"number": 1, "question": "What is 2 + 2?", "options": ["A) 3", "B) 4", "C) 5", "D) 6"], "answer": "B"},
+            {
+                "number": 2,
+                "question": "Which gas do plants absorb?",
+                "options": ["A) Oxygen", "B) Carbon dioxide"],
+                "answer": "B"
+            },
+        ]
+    },
+    {
+        "name": "Section B - Short Answer Questions",
+        "marks_per_question": 2,
+        "questions": [{"number": 3, "question": "Define inertia.", "answer": "Resistance to a change in motion."}]
+    },
+    {
+        "name": "Section C - Long Answer Questions",
+        "marks_per_question": 5,
+        "questions": [{
+            "number": 4,
+            "question": "Discuss the causes of the First World War in detail.",
+            "answer": "Alliances, militarism, imperialism and nationalism."
+        }]
+    },
+]
+
+
+def test_mcq_matches_previous_parser():
+    assert parse_response(MCQ, "mcq", include_answers=True) == MCQ_EXPECTED
+
+
+def test_theory_matches_previous_parser():
+    assert parse_response(THEORY, "theory", include_answers=True) == THEORY_EXPECTED
+
+
+def test_paper_matches_previous_parser():
+    assert parse_response(PAPER, "paper", include_answers=True, clean=False) == PAPER_EXPECTED
+
+
+def test_clean_response_strips_intro_notes_and_markdown():
+    assert clean_response(THEORY) == (
+        "Q1. Define photosynthesis.\n"
+        "Answer: The process by which plants\n"
+        "convert light into chemical energy.\n"
+        "Question 2) Explain why the sky\n"
+        "is blue.\n"
+        "Ans: Rayleigh scattering.\n"
+        "3. List two uses of water."
+    )
+    assert "**" not in clean_response(MCQ)
+
+
+def test_unparseable_response_falls_back_to_one_question():
+    questions = parse_response("Sorry, I cannot help with that.", "mcq")
+    assert questions == [{
+        "number": 1,
+        "question": "",
+        "options": ["A) Option A", "B) Option B", "C) Option C", "D) Option D"]
+    }]
+
+
+@pytest.mark.parametrize("mode, text, clean, expected", [
+    ("mcq", MCQ, True, MCQ_EXPECTED),
+    ("theory", THEORY, True, THEORY_EXPECTED),
+    ("paper", PAPER, False, PAPER_EXPECTED),
+])
+def test_streamed_chunks_parse_like_whole_response(mode, text, clean, expected):
+    rng = random.Random(0)
+    for _ in range(20):
+        parser = ResponseParser(mode, include_answers=True, clean=clean)
+        position = 0
+        while position < len(text):
+            step = rng.randint(1, 12)
+            parser.feed(text[position:position + step])
+            position += step
+        assert parser.close() == expected
+
+
+def test_feed_returns_questions_once_complete():
+    parser = ResponseParser("theory", include_answers=True)
+    assert parser.feed("1. First question?\nAnswer: one\n") == []
+    completed = parser.feed("2. Second question?\n")
+    assert [question["number"] for question in completed] == [1]
+    assert [question["number"] for question in parser.close()] == [1, 2]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ResponseParser("essay")
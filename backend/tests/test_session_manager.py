@@ -0,0 +1,72 @@
+import threading
+import uuid
+import pytest
+from app.services import session_manager
+from app.services import session_registry as registry
+from app.services.session_manager import SessionUnavailable, session_lease
+
+
+@pytest.fixture
+def session_id(registry_db, monkeypatch):
+    monkeypatch.setattr(session_manager, "_leases", {})
+    session_id = str(uuid.uuid4())
+    registry.add_session(session_id, owner="anonymous", kind="student", size_bytes=100)
+    return session_id
+
+
+def test_concurrent_requests_share_one_registry_lease(session_id, monkeypatch):
+    writes = []
+    for name in ("acquire_lease", "release_lease"):
+        original = getattr(registry, name)
+        monkeypatch.setattr(registry, name, lambda *args, _f=original, _n=name: writes.append(_n) or _f(*args))
+
+    with session_lease(session_id):
+        with session_lease(session_id):
+            assert registry.get_session(session_id)["leases"] == 1
+        assert registry.get_session(session_id)["leases"] == 1
+    assert registry.get_session(session_id)["leases"] == 0
+    assert writes == ["acquire_lease", "release_lease"]
+
+
+def test_first_lease_records_the_access(session_id):
+    before = registry.get_session(session_id)
+    with session_lease(session_id):
+        session = registry.get_session(session_id)
+    assert session["heat"] == pytest.approx(1.0)
+    assert session["last_accessed"] >= before["last_accessed"]
+
+
+def test_lease_on_a_deleted_session_is_refused(session_id):
+    with session_lease(session_id):
+        assert registry.mark_deleting(session_id) is True
+        with pytest.raises(SessionUnavailable):
+            with session_lease(session_id):
+                pass
+    with pytest.raises(SessionUnavailable):
+        with session_lease(str(uuid.uuid4())):
+            pass
+
+
+def test_last_lease_removes_a_deleted_session(session_id, monkeypatch):
+    removed = []
+    monkeypatch.setattr(session_manager, "_remove", lambda session_id, reason: removed.append((session_id, reason)))
+    with session_lease(session_id):
+        with session_lease(session_id):
+            session_manager.delete_session(session_id)
+        assert removed == []
+    assert removed == [(session_id, "deleted")]
+
+
+def test_leases_from_threads_balance(session_id):
+    def work():
+        for _ in range(50):
+            with session_lease(session_id):
+                pass
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.get_session(session_id)["leases"] == 0
+    assert session_manager._leases == {}
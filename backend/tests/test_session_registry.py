@@ -0,0 +1,176 @@
+import multiprocessing
+import time
+import uuid
+import pytest
+from app.config import settings
+from app.services import session_registry as registry
+
+
+def _add(owner: str = "anonymous") -> str:
+    session_id = str(uuid.uuid4())
+    registry.add_session(session_id, owner=owner, kind="student", size_bytes=100, filename="notes.pdf")
+    return session_id
+
+
+def test_lease_is_counted_and_returned(registry_db):
+    session_id = _add()
+    assert registry.acquire_lease(session_id)
+    assert registry.acquire_lease(session_id)
+    assert registry.get_session(session_id)["leases"] == 2
+    assert registry.is_leased(registry.get_session(session_id))
+
+    assert registry.release_lease(session_id) is False
+    assert registry.release_lease(session_id) is False
+    assert registry.get_session(session_id)["leases"] == 0
+
+
+def test_release_returns_several_leases(registry_db):
+    session_id = _add()
+    for _ in range(3):
+        registry.acquire_lease(session_id)
+    assert registry.release_lease(session_id, 2) is False
+    assert registry.get_session(session_id)["leases"] == 1
+
+
+def test_lease_can_record_accesses(registry_db):
+    session_id = _add()
+    now = time.time()
+    assert registry.acquire_lease(session_id, accesses=3, now=now)
+    session = registry.get_session(session_id)
+    assert session["heat"] == pytest.approx(3.0)
+    assert session["last_accessed"] == now
+
+
+def test_heat_decays_by_half_life(registry_db):
+    session_id = _add()
+    now = time.time()
+    registry.record_access(session_id, 4, now)
+    half_life = settings.SESSION_HEAT_HALF_LIFE_HOURS * 3600
+    registry.record_access(session_id, 1, now + half_life)
+    assert registry.get_session(session_id)["heat"] == pytest.approx(3.0)
+    assert not registry.record_access(str(uuid.uuid4()))
+
+
+def test_lease_requires_a_ready_session(registry_db):
+    assert not registry.acquire_lease(str(uuid.uuid4()))
+
+    session_id = _add()
+    assert registry.mark_deleting(session_id) is False
+    assert not registry.acquire_lease(session_id)
+
+
+def test_last_lease_of_a_deleted_session_reports_removal(registry_db):
+    session_id = _add()
+    registry.acquire_lease(session_id)
+    registry.acquire_lease(session_id)
+
+    assert registry.mark_deleting(session_id) is True
+    assert registry.mark_deleting(session_id) is None  # already deleting
+    assert registry.release_lease(session_id) is False
+    assert registry.release_lease(session_id) is True
+
+
+def test_leased_session_is_not_claimed(registry_db):
+    session_id = _add()
+    registry.acquire_lease(session_id)
+    assert not registry.claim_for_removal(session_id)
+    assert registry.get_session(session_id)["state"] == registry.READY
+
+    registry.release_lease(session_id)
+    assert registry.claim_for_removal(session_id)
+    assert not registry.claim_for_removal(session_id)  # only one caller removes it
+    assert registry.get_session(session_id)["state"] == registry.DELETING
+
+
+def test_stale_lease_does_not_pin_a_session(registry_db, monkeypatch):
+    session_id = _add()
+    registry.acquire_lease(session_id)
+
+    later = time.time() + registry.LEASE_TIMEOUT + 1
+    monkeypatch.setattr(registry.time, "time", lambda: later)
+    assert not registry.is_leased(registry.get_session(session_id))
+
+    # A new lease replaces the count left by the crashed holder
+    assert registry.acquire_lease(session_id)
+    assert registry.get_session(session_id)["leases"] == 1
+
+    monkeypatch.setattr(registry.time, "time", lambda: later + registry.LEASE_TIMEOUT + 1)
+    assert registry.claim_for_removal(session_id)
+
+
+def test_stuck_deletion_is_claimed_only_when_stale(registry_db):
+    session_id = _add()
+    assert registry.claim_for_removal(session_id)
+
+    assert not registry.claim_for_removal(session_id, stale_before=time.time() - 60)
+    assert registry.claim_for_removal(session_id, stale_before=time.time() + 1)
+
+
+def test_renew_leases_refreshes_only_leased_rows(registry_db):
+    leased, idle = _add(), _add()
+    registry.acquire_lease(leased)
+    before = registry.get_session(leased)["lease_heartbeat"]
+
+    time.sleep(0.01)
+    registry.renew_leases([leased, idle])
+    assert registry.get_session(leased)["lease_heartbeat"] > before
+    assert registry.get_session(idle)["lease_heartbeat"] == 0
+
+
+# Worker processes inherit the test's registry settings by forking
+needs_fork = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="needs the fork start method"
+)
+
+
+def _lease_many(session_id: str, count: int) -> int:
+    taken = 0
+    for _ in range(count):
+        if registry.acquire_lease(session_id):
+            taken += 1
+            registry.release_lease(session_id)
+    return taken
+
+
+def _record_many(session_id: str, count: int):
+    for _ in range(count):
+        registry.record_access(session_id)
+
+
+def _claim(session_id: str) -> bool:
+    return registry.claim_for_removal(session_id)
+
+
+@needs_fork
+def test_leases_from_several_processes_balance(registry_db):
+    session_id = _add()
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        taken = pool.starmap(_lease_many, [(session_id, 50)] * 4)
+    assert taken == [50] * 4
+    assert registry.get_session(session_id)["leases"] == 0
+
+
+@needs_fork
+def test_one_process_wins_a_removal_race(registry_db):
+    session_id = _add()
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        claimed = pool.map(_claim, [session_id] * 8)
+    assert claimed.count(True) == 1
+
+
+@needs_fork
+def test_lease_blocks_removal_from_another_process(registry_db):
+    session_id = _add()
+    registry.acquire_lease(session_id)
+    with multiprocessing.get_context("fork").Pool(2) as pool:
+        assert pool.map(_claim, [session_id] * 2) == [False, False]
+    registry.release_lease(session_id)
+
+
+@needs_fork
+def test_accesses_from_several_processes_add_up(registry_db, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_HEAT_HALF_LIFE_HOURS", 1e6)
+    session_id = _add()
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        pool.starmap(_record_many, [(session_id, 100)] * 4)
+    assert registry.get_session(session_id)["heat"] == pytest.approx(400, rel=1e-3)